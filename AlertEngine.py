@@ -0,0 +1,162 @@
+from EventBus import AlertEvent, MaUpdatedEvent, TickEvent
+from SimpleMovingAverage import SimpleMovingAverage
+
+import numpy
+
+class AlertEngine(object):
+    """
+    Alerts when prices cross or touch moving average lines, or when the lines of an interval change alignment, for many codes.
+    Current moving averages are kept in a (lines x codes) matrix next to the previous state of every code, so a batch of ticks
+    is evaluated with a few array operations over the whole matrix, and only changes of state become alerts:
+    - CROSS_UP / CROSS_DOWN when price moves to the other side of a line,
+    - TOUCH when price comes within tolerance (a fraction of the line value) of a line,
+    - BULLISH / BEARISH / MIXED when the lines of an interval become ordered by count with shorter lines above (bullish) or
+      below (bearish) longer ones, or lose their order.
+    """
+    CROSS_UP = "cross_up"
+    CROSS_DOWN = "cross_down"
+    TOUCH = "touch"
+    BULLISH = "bullish"
+    BEARISH = "bearish"
+    MIXED = "mixed"
+    ALIGNMENT_KINDS = {1: BULLISH, -1: BEARISH, 0: MIXED}
+
+    def __init__(self, codes = (), params = SimpleMovingAverage.DEFAULT_PARAMS, tolerance = 0.001):
+        self.tolerance = tolerance
+        counts_by_interval = SimpleMovingAverage.counts_by_interval(params)
+        self.intervals = list(counts_by_interval.keys())
+        # Distinct lines of params as (interval, count), row j of the matrices. Lines of an interval are adjacent rows in
+        # increasing order of count, so that alignment only compares adjacent rows.
+        self.lines = [(interval, count) for interval in self.intervals for count in sorted(counts_by_interval[interval])]
+        self.line_rows = dict((line, j) for j, line in enumerate(self.lines))
+        # Rows [start, end) of the lines of every interval.
+        self.interval_rows = []
+        for interval in self.intervals:
+            start = self.lines.index((interval, min(counts_by_interval[interval])))
+            self.interval_rows.append((start, start + len(counts_by_interval[interval])))
+        self.codes = []
+        # code -> column of the matrices.
+        self.columns = {}
+        # Current moving averages, NaN if unknown.
+        self.ma = numpy.zeros((len(self.lines), 0), dtype = numpy.float64)
+        # Side of the last price to every line, 1 above, -1 below, 0 unknown.
+        self.sides = numpy.zeros((len(self.lines), 0), dtype = numpy.int8)
+        # Whether the last price was within tolerance of every line.
+        self.touching = numpy.zeros((len(self.lines), 0), dtype = bool)
+        # (intervals x codes) alignment of the lines of every interval, 1 bullish, -1 bearish, 0 mixed, and whether it's known.
+        self.alignments = numpy.zeros((len(self.intervals), 0), dtype = numpy.int8)
+        self.aligned_known = numpy.zeros((len(self.intervals), 0), dtype = bool)
+        self.add_codes(codes)
+
+    def add_codes(self, codes):
+        codes = [code for code in codes if code not in self.columns]
+        if not codes:
+            return
+        for code in codes:
+            self.columns[code] = len(self.codes)
+            self.codes.append(code)
+        count = len(codes)
+        self.ma = numpy.concatenate((self.ma, numpy.full((len(self.lines), count), numpy.nan)), axis = 1)
+        self.sides = numpy.concatenate((self.sides, numpy.zeros((len(self.lines), count), dtype = numpy.int8)), axis = 1)
+        self.touching = numpy.concatenate((self.touching, numpy.zeros((len(self.lines), count), dtype = bool)), axis = 1)
+        self.alignments = numpy.concatenate((self.alignments, numpy.zeros((len(self.intervals), count), dtype = numpy.int8)), axis = 1)
+        self.aligned_known = numpy.concatenate((self.aligned_known, numpy.zeros((len(self.intervals), count), dtype = bool)), axis = 1)
+
+    """ Set moving averages of code at interval from {count: sma}, e.g. the values of a MaUpdatedEvent. """
+    def update_ma(self, code, interval, values):
+        if code not in self.columns:
+            self.add_codes([code])
+        column = self.columns[code]
+        for count, value in values.items():
+            j = self.line_rows.get((interval, count))
+            if j is not None:
+                self.ma[j, column] = numpy.nan if value is None else value
+
+    """
+    Evaluate prices, {code: price} or an array of prices of all codes in order of codes with NaN for codes without a tick.
+    Return the alerts of state changes since the last evaluation as [AlertEvent, ...].
+    """
+    def evaluate(self, prices):
+        if isinstance(prices, dict):
+            self.add_codes(prices.keys())
+            array = numpy.full(len(self.codes), numpy.nan)
+            for code, price in prices.items():
+                array[self.columns[code]] = price
+            prices = array
+        prices = numpy.asarray(prices, dtype = numpy.float64)
+        ticked = ~numpy.isnan(prices)
+
+        # Comparisons with NaN are false, so unknown lines and codes without a tick keep their previous side, and a price
+        # exactly at a line too, so that moving through the line is one crossing.
+        distances = prices - self.ma
+        above = distances > 0
+        below = distances < 0
+        crossed = (above & (self.sides < 0)) | (below & (self.sides > 0))
+        sides = self.sides.copy()
+        new_sides = above.view(numpy.int8) - below.view(numpy.int8)
+        numpy.copyto(sides, new_sides, where = new_sides != 0)
+        touching = numpy.abs(distances) <= self.tolerance * numpy.abs(self.ma)
+        # Keep the state where either the price or the line is unknown.
+        numpy.copyto(touching, self.touching, where = numpy.isnan(distances))
+        touched = touching & ~self.touching
+
+        alignments, aligned_known = self.alignment()
+        aligned_known &= ticked
+        # The first known alignment of a code is its initial state, not a change.
+        realigned = aligned_known & self.aligned_known & (alignments != self.alignments)
+
+        # Changes are rare, so only look for them when there are any.
+        alerts = []
+        changed = crossed | touched
+        if changed.any():
+            positions = numpy.flatnonzero(changed)
+            rows, columns = numpy.divmod(positions, len(self.codes))
+            for j, i, price, ma, is_crossed, is_up, is_touched in zip(rows.tolist(), columns.tolist(), prices[columns].tolist(),
+                    self.ma.ravel()[positions].tolist(), crossed.ravel()[positions].tolist(), (sides.ravel()[positions] > 0).tolist(),
+                    touched.ravel()[positions].tolist()):
+                interval, count = self.lines[j]
+                if is_crossed:
+                    alerts.append(AlertEvent(self.codes[i], interval, count, AlertEngine.CROSS_UP if is_up else AlertEngine.CROSS_DOWN, price, ma))
+                if is_touched:
+                    alerts.append(AlertEvent(self.codes[i], interval, count, AlertEngine.TOUCH, price, ma))
+        if realigned.any():
+            positions = numpy.flatnonzero(realigned)
+            rows, columns = numpy.divmod(positions, len(self.codes))
+            for k, i, price, alignment in zip(rows.tolist(), columns.tolist(), prices[columns].tolist(), alignments.ravel()[positions].tolist()):
+                alerts.append(AlertEvent(self.codes[i], self.intervals[k], None, AlertEngine.ALIGNMENT_KINDS[alignment], price, None))
+
+        self.sides = sides
+        self.touching = touching
+        numpy.copyto(self.alignments, alignments, where = aligned_known)
+        self.aligned_known |= aligned_known
+        return alerts
+
+    """ Alignment of the lines of every interval for every code as (intervals x codes), and whether all of its lines are known. """
+    def alignment(self):
+        steps = self.ma[1:] - self.ma[:-1]
+        falling = steps < 0
+        rising = steps > 0
+        unknown = numpy.isnan(self.ma)
+        alignments = numpy.zeros((len(self.intervals), len(self.codes)), dtype = numpy.int8)
+        aligned_known = numpy.empty((len(self.intervals), len(self.codes)), dtype = bool)
+        # Rows of a matrix are contiguous, so the reductions over the few lines of an interval are cheap.
+        for k, (start, end) in enumerate(self.interval_rows):
+            if end - start > 1:
+                alignments[k] = falling[start:end - 1].all(axis = 0).view(numpy.int8) - rising[start:end - 1].all(axis = 0).view(numpy.int8)
+            aligned_known[k] = ~unknown[start:end].any(axis = 0)
+        return (alignments, aligned_known)
+
+    """ Evaluate ticks and realtime moving averages published to event_bus, and publish the alerts back to it. """
+    def subscribe(self, event_bus):
+        def handle(events):
+            prices = {}
+            for event in events:
+                if isinstance(event, MaUpdatedEvent):
+                    if event.realtime:
+                        self.update_ma(event.code, event.interval, event.values)
+                else:
+                    prices[event.code] = event.price
+            if prices:
+                for alert in self.evaluate(prices):
+                    event_bus.publish(alert)
+        return event_bus.subscribe(handle, [TickEvent, MaUpdatedEvent], name = "alerts")
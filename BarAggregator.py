@@ -0,0 +1,90 @@
+from TradingDateTime import trading_date_time
+
+import numpy
+import pandas
+
+class BarAggregator(object):
+    """
+    Build coarser price records (15/30/60min and day) from 5min records locally, following A-share session boundaries,
+    so that the data source is only asked for the base interval and all intervals agree with each other.
+    A coarse record is only built when all of its base records are present, so gaps in base data stay gaps.
+    Note that a day record built from 5min records may differ slightly from the official daily close.
+    """
+    BASE_INTERVAL = "5min"
+
+    def __init__(self, base_interval = BASE_INTERVAL):
+        self.base_interval = base_interval
+        self.__mappings = {}
+
+    def __mapping(self, interval):
+        if interval not in self.__mappings:
+            self.__mappings[interval] = trading_date_time.barOfDayMapping(self.base_interval, interval)
+        return self.__mappings[interval]
+
+    """ Bar ordinals in interval of the coarse records containing each base record, -1 for records off the session grid. """
+    def coarse_ordinals(self, interval, base_dates):
+        coarse_bars, counts = self.__mapping(interval)
+        base_ordinals = trading_date_time.intervalCloseOrdinals(self.base_interval, base_dates)
+        day_ordinals, base_bars = numpy.divmod(base_ordinals, len(coarse_bars))
+        return numpy.where(base_ordinals >= 0, day_ordinals * len(counts) + coarse_bars[base_bars], -1)
+
+    """ Build complete records of interval from base price data in increasing order of date. """
+    def aggregate(self, base_data, interval):
+        _, counts = self.__mapping(interval)
+        ordinals = self.coarse_ordinals(interval, base_data.index.to_numpy(dtype = object))
+        on_grid = ordinals >= 0
+        if not on_grid.all():
+            base_data = base_data.iloc[numpy.flatnonzero(on_grid)]
+            ordinals = ordinals[on_grid]
+        if len(ordinals) == 0:
+            return base_data.iloc[:0].copy()
+
+        # Base records of one coarse record are adjacent, so groups start where the coarse ordinal changes.
+        starts = numpy.concatenate(([0], numpy.flatnonzero(numpy.diff(ordinals)) + 1))
+        ends = numpy.concatenate((starts[1:], [len(ordinals)])) - 1
+        group_ordinals = ordinals[starts]
+        complete = (ends - starts + 1) == counts[group_ordinals % len(counts)]
+
+        columns = {}
+        for column in base_data.columns:
+            values = base_data[column].to_numpy()
+            if column == "open":
+                columns[column] = values[starts]
+            elif column == "high":
+                columns[column] = numpy.maximum.reduceat(values.astype(numpy.float64), starts)
+            elif column == "low":
+                columns[column] = numpy.minimum.reduceat(values.astype(numpy.float64), starts)
+            elif column in ("volume", "amount"):
+                columns[column] = numpy.add.reduceat(values.astype(numpy.float64), starts)
+            else:
+                # close and descriptive columns such as code take the last base record.
+                columns[column] = values[ends]
+        dates = trading_date_time.intervalClosesFromOrdinals(interval, group_ordinals[complete])
+        data = pandas.DataFrame(dict((column, values[complete]) for column, values in columns.items()),
+            index = pandas.Index(dates, name = base_data.index.name), columns = base_data.columns)
+        return data
+
+    """
+    Extend records of interval in data with base records after last_base_datetime_str.
+    Only the base records of the coarse records from the one containing the first new base record on are aggregated again.
+    """
+    def extend(self, interval, data, base_data, last_base_datetime_str = None):
+        if data is None or len(data.index) == 0:
+            return self.aggregate(base_data, interval)
+        if last_base_datetime_str is None:
+            aggregated = self.aggregate(base_data, interval)
+        else:
+            first_new = base_data.index.searchsorted(last_base_datetime_str, side = "right")
+            if first_new == len(base_data.index):
+                return data
+            _, counts = self.__mapping(interval)
+            # The coarse record of the first new base record starts at most max(counts) - 1 base records earlier.
+            window = base_data.iloc[max(0, first_new - int(counts.max()) + 1):]
+            aggregated = self.aggregate(window, interval)
+            first_ordinal = self.coarse_ordinals(interval, base_data.index[first_new:first_new + 1].to_numpy(dtype = object))[0]
+            if first_ordinal >= 0:
+                aggregated = aggregated.iloc[aggregated.index.searchsorted(trading_date_time.intervalCloseFromOrdinal(interval, first_ordinal)):]
+        if len(aggregated.index) == 0:
+            return data
+        # Keep records before the aggregated ones, e.g. long history which is not available in base interval.
+        return pandas.concat([data.iloc[:data.index.searchsorted(aggregated.index[0])], aggregated])
@@ -0,0 +1,89 @@
+from TradingDateTime import TradingDateTime, trading_date_time
+
+class BarBuilder(object):
+    """
+    Fold realtime quotes into in-progress OHLC bars of every interval, and finalize a bar once its interval has closed.
+    Volume is the difference of cumulative day volume in quotes, multiplied by volume_scale to match units of history data.
+    Bars are sampled at the polling rate, so high and low may miss extremes between two quotes. Built bars are only provisional
+    records, which PriceData replaces by the downloaded ones, see PriceData.append_built_bars.
+    A bar is only finalized if quotes were folded in since its interval opened: the bar of the interval in which building starts,
+    e.g. polling starts mid-interval, lacks the open and earlier extremes and volume, so it's dropped.
+    """
+
+    def __init__(self, intervals, volume_scale = 1.0):
+        self.intervals = list(intervals)
+        self.volume_scale = volume_scale
+        # interval -> in-progress bar, {"close": close datetime string of the interval, "open", "high", "low", "last", "volume"}.
+        self.bars = {}
+        # interval -> close datetime string of the last bar built, whole or not, to tell whether a new bar follows it.
+        self.last_closes = {}
+        self.last_cumulative_volume = None
+        self.last_day = None
+
+    """
+    Fold a quote at time_str in. cumulative_volume is the volume of the day so far, or None if not available.
+    Return the finalized bars [(interval, close datetime string, bar), ...] whose intervals closed before this quote.
+    """
+    def update(self, price, time_str, cumulative_volume = None):
+        day = time_str.split(' ')[0]
+        if day != self.last_day:
+            self.last_cumulative_volume = None
+            self.last_day = day
+        volume = None
+        if cumulative_volume is not None:
+            if self.last_cumulative_volume is not None and cumulative_volume >= self.last_cumulative_volume:
+                volume = (cumulative_volume - self.last_cumulative_volume) * self.volume_scale
+            self.last_cumulative_volume = cumulative_volume
+
+        finalized = []
+        for interval in self.intervals:
+            this_close = trading_date_time.intervalCloseOfDatetime(interval, time_str)
+            bar = self.bars.get(interval)
+            if bar is not None and bar["close"] != this_close:
+                self.__finalize(interval, finalized)
+                bar = None
+            if bar is None:
+                whole = self.follows_last_bar(interval, this_close) or self.before_open(interval, this_close, time_str)
+                bar = self.bars[interval] = {"close": this_close, "open": price, "high": price, "low": price, "last": price, "volume": None,
+                    "whole": whole}
+                self.last_closes[interval] = this_close
+            else:
+                bar["high"] = max(bar["high"], price)
+                bar["low"] = min(bar["low"], price)
+                bar["last"] = price
+            if volume is not None:
+                bar["volume"] = volume if bar["volume"] is None else bar["volume"] + volume
+        return finalized
+
+    """ Finalize bars whose intervals have closed at nowChina. Return [(interval, close datetime string, bar), ...]. """
+    def flush(self, nowChina):
+        now_str = nowChina.strftime(TradingDateTime.DATETIME_STRFTIME)
+        finalized = []
+        for interval in self.intervals:
+            bar = self.bars.get(interval)
+            if bar is None:
+                continue
+            close_str = bar["close"] if interval.endswith("min") else "%s %02d:%02d:%02d" % ((bar["close"],) + TradingDateTime.CHINA_AFTERNOON_CLOSE)
+            if close_str <= now_str:
+                self.__finalize(interval, finalized)
+        return finalized
+
+    """ Whether a bar closing at this_close follows the last bar built of interval, so that it has quotes since its open. """
+    def follows_last_bar(self, interval, this_close):
+        last_close = self.last_closes.get(interval)
+        return last_close is not None and trading_date_time.previousIntervalClose(interval, this_close) == last_close
+
+    """ Whether a quote at time_str is before the open of the first interval of the day, e.g. in the opening auction. """
+    def before_open(self, interval, this_close, time_str):
+        if time_str[11:] > "%02d:%02d:%02d" % TradingDateTime.CHINA_MORNING_OPEN:
+            return False
+        return not interval.endswith("min") or this_close[11:] == trading_date_time.sessionCloseTimes(int(interval[:-3]))[0]
+
+    """ Remove the bar of interval and add it to finalized unless it isn't whole. """
+    def __finalize(self, interval, finalized):
+        bar = self.bars.pop(interval)
+        if bar["whole"]:
+            finalized.append((interval, bar["close"], self.__record(bar)))
+
+    def __record(self, bar):
+        return {"open": bar["open"], "high": bar["high"], "low": bar["low"], "close": bar["last"], "volume": bar["volume"]}
@@ -0,0 +1,227 @@
+from FakePriceDataLoader import FakePriceDataLoaderChina
+from PriceData import PriceData
+from PriceDataReplay import PriceDataReplay
+from SimpleMovingAverage import SimpleMovingAverage
+from SyntheticPriceData import SyntheticPriceData
+from TradingDateTime import TradingDateTime, trading_date_time
+
+import PriceDataLoader
+
+import numpy
+import pandas
+
+import argparse
+import contextlib
+import datetime
+import io
+import json
+import os
+import platform
+import statistics
+import sys
+import tempfile
+import time
+
+class Benchmark(object):
+    """
+    Time the hot paths on synthetic price data of several years, see SyntheticPriceData. The synthetic trading calendar is
+    installed in trading_date_time and a FakePriceDataLoaderChina serves the data, so no network is needed.
+    Every benchmark is repeated and timed per operation. The report is a JSON document so that results can be compared across releases.
+    """
+    VERSION = 1
+    CODE = "sh000300"
+    DEFAULT_START_DAY = "2015-01-05"
+    DEFAULT_END_DAY = "2017-12-29"
+    # Interval of the sma_append_price_records benchmark, which has moving averages of long windows in DEFAULT_PARAMS.
+    APPEND_INTERVAL = "15min"
+    # Records returned by get_k_data of the fake loader, like the data source.
+    K_DATA_WINDOW = 320
+
+    def __init__(self, start_day = DEFAULT_START_DAY, end_day = DEFAULT_END_DAY, seed = 0, repeat = 3, operations = 200,
+            params = SimpleMovingAverage.DEFAULT_PARAMS):
+        self.start_day = start_day
+        self.end_day = end_day
+        self.seed = seed
+        self.repeat = repeat
+        # Operations per repeat of benchmarks which time many operations, e.g. appended records or replay steps.
+        self.operations = operations
+        self.params = params
+        self.benchmarks = {
+            "sma_load_price_data": self.sma_load_price_data,
+            "sma_append_price_records": self.sma_append_price_records,
+            "sma_print_realtime_summary": self.sma_print_realtime_summary,
+            "previous_interval_close": self.previous_interval_close,
+            "next_interval_close": self.next_interval_close,
+            "merge_tencent_hist_data": self.merge_tencent_hist_data,
+            "replay": self.replay,
+            "replay_through_loader": self.replay_through_loader,
+            }
+        self.csv_base_name = None
+        self.price_data = None
+
+    """ Run benchmarks of names, all if None, and return the report. Console output of the code under test is discarded. """
+    def run(self, names = None):
+        names = list(self.benchmarks.keys()) if names is None else names
+        for name in names:
+            if name not in self.benchmarks:
+                raise Exception("Unknown benchmark %s." % name)
+        previous_loader = PriceDataLoader.price_data_loader_china
+        results = []
+        try:
+            with tempfile.TemporaryDirectory() as directory, contextlib.redirect_stdout(io.StringIO()):
+                self.generate(directory)
+                for name in names:
+                    results.append(self.measure(name, self.benchmarks[name]))
+        finally:
+            PriceDataLoader.price_data_loader_china = previous_loader
+        return {
+            "version": Benchmark.VERSION,
+            "time": datetime.datetime.now().strftime(TradingDateTime.DATETIME_STRFTIME),
+            "environment": {
+                "python": platform.python_version(),
+                "numpy": numpy.__version__,
+                "pandas": pandas.__version__,
+                "platform": platform.platform(),
+                },
+            "parameters": {
+                "start_day": self.start_day,
+                "end_day": self.end_day,
+                "seed": self.seed,
+                "repeat": self.repeat,
+                "operations": self.operations,
+                "records": dict((interval, len(data.index)) for interval, data in self.price_data.items()),
+                },
+            "results": results,
+            }
+
+    """ Install the synthetic trading calendar and save synthetic price data in directory. """
+    def generate(self, directory):
+        trading_date_time.setChinaTradingDates(SyntheticPriceData.trading_dates(self.start_day, self.end_day))
+        synthetic = SyntheticPriceData(self.start_day, self.end_day, Benchmark.CODE, self.seed)
+        self.price_data = synthetic.generate()
+        self.csv_base_name = os.path.join(directory, "synthetic")
+        synthetic.save(self.csv_base_name)
+
+    """
+    Time benchmark repeat times. benchmark() prepares its state untimed and returns (operation, operations), where operation()
+    does all operations of one repeat.
+    """
+    def measure(self, name, benchmark):
+        seconds = []
+        operations = 0
+        for _ in range(self.repeat):
+            operation, operations = benchmark()
+            start_time = time.perf_counter()
+            operation()
+            seconds.append(time.perf_counter() - start_time)
+        best = min(seconds) / operations
+        return {
+            "name": name,
+            "operations": operations,
+            "seconds": seconds,
+            "best_seconds_per_operation": best,
+            "median_seconds_per_operation": statistics.median(seconds) / operations,
+            "operations_per_second": 1.0 / best if best > 0 else None,
+            }
+
+    """ Install a fake loader whose now is the 5min record at position, which is counted from the end when negative. """
+    def install_loader(self, position):
+        start_datetime = datetime.datetime.strptime(self.price_data["5min"].index[position], TradingDateTime.DATETIME_STRFTIME)
+        loader = FakePriceDataLoaderChina(start_datetime, self.csv_base_name, Benchmark.K_DATA_WINDOW)
+        PriceDataLoader.price_data_loader_china = loader
+        return loader
+
+    """ PriceData of the fake loader which never saves over the synthetic data. """
+    def create_price_data(self, loader):
+        price_data = PriceData(Benchmark.CODE, self.csv_base_name, loader.now())
+        price_data.csv_base_name = None
+        return price_data
+
+    def sma_load_price_data(self):
+        def operation():
+            SimpleMovingAverage(self.params).load_price_data(self.price_data)
+        return (operation, 1)
+
+    def sma_append_price_records(self):
+        interval = Benchmark.APPEND_INTERVAL
+        data = self.price_data[interval]
+        first = len(data.index) - self.operations
+        sma = SimpleMovingAverage(self.params)
+        sma.load_price_data(dict(self.price_data, **{interval: data.iloc[:first]}))
+        def operation():
+            for position in range(first, len(data.index)):
+                sma.append_price_records(interval, data.index[position - 1], data.iloc[:position + 1])
+        return (operation, self.operations)
+
+    def sma_print_realtime_summary(self):
+        loader = self.install_loader(-1)
+        price_data = self.create_price_data(loader)
+        price_data.set_simple_moving_average(SimpleMovingAverage(self.params))
+        date, time_of_day = loader.fake_now_str.split()
+        price_data.update_realtime_with_quote({"price": self.price_data["5min"]["close"].iat[-1], "date": date, "time": time_of_day})
+        def operation():
+            for _ in range(self.operations):
+                price_data.print_realtime_sma_summary()
+        return (operation, self.operations)
+
+    """ Sample operations close datetime strings of each interval evenly from the synthetic data. """
+    def sample_closes(self):
+        samples = []
+        for interval, data in self.price_data.items():
+            positions = numpy.linspace(1, len(data.index) - 2, self.operations).astype(int)
+            samples.extend((interval, data.index[position]) for position in positions)
+        return samples
+
+    def previous_interval_close(self):
+        samples = self.sample_closes()
+        def operation():
+            for interval, datetime_str in samples:
+                trading_date_time.previousIntervalClose(interval, datetime_str)
+        return (operation, len(samples))
+
+    def next_interval_close(self):
+        samples = self.sample_closes()
+        def operation():
+            for interval, datetime_str in samples:
+                trading_date_time.nextIntervalClose(interval, datetime_str)
+        return (operation, len(samples))
+
+    """ Merge one new 5min record per operation after the fake now advances. """
+    def merge_tencent_hist_data(self):
+        loader = self.install_loader(-self.operations - 1)
+        price_data = self.create_price_data(loader)
+        def operation():
+            for _ in range(self.operations):
+                loader.advance()
+                price_data.merge_tencent_hist_data("5min")
+        return (operation, self.operations)
+
+    def replay(self, through_loader = False):
+        start_datetime = datetime.datetime.strptime(self.price_data["5min"].index[-self.operations - 1], TradingDateTime.DATETIME_STRFTIME)
+        replay = PriceDataReplay(self.csv_base_name, start_datetime, Benchmark.CODE, self.params, through_loader, Benchmark.K_DATA_WINDOW)
+        # Load price data and moving averages untimed.
+        replay.run(steps = 0)
+        def operation():
+            replay.run(steps = self.operations)
+        return (operation, self.operations)
+
+    def replay_through_loader(self):
+        return self.replay(through_loader = True)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description = "Benchmark hot paths on synthetic price data and print a JSON report.")
+    parser.add_argument("names", nargs = "*", help = "benchmarks to run, all by default")
+    parser.add_argument("--start-day", default = Benchmark.DEFAULT_START_DAY)
+    parser.add_argument("--end-day", default = Benchmark.DEFAULT_END_DAY)
+    parser.add_argument("--seed", type = int, default = 0)
+    parser.add_argument("--repeat", type = int, default = 3)
+    parser.add_argument("--operations", type = int, default = 200)
+    parser.add_argument("--output", help = "write the report to this file instead of stdout")
+    args = parser.parse_args()
+    report = Benchmark(args.start_day, args.end_day, args.seed, args.repeat, args.operations).run(args.names or None)
+    if args.output is None:
+        json.dump(report, sys.stdout, indent = 2)
+        sys.stdout.write("\n")
+    else:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent = 2)
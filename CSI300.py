@@ -1,75 +1,78 @@
-import tushare as ts
-
+from AlertEngine import AlertEngine
+from EventBus import event_bus
+from EventConsole import EventConsole
 from FakePriceDataLoader import FakePriceDataLoaderChina
+from Metrics import metrics
+from PollingScheduler import PollingScheduler
 from PriceData import PriceData
+from PriceDataSnapshot import PriceDataSnapshot
 from SimpleMovingAverage import SimpleMovingAverage
 
 import PriceDataLoader
 
-import time
-import threading
-
 from datetime import datetime
 
 class CSI300(object):
     CSI300_CODE_IFENG = "sh000300"
 
-    def __init__(self, realtime_polling_interval = 20):
+    """
+    Load price data and moving averages of CSI300, from the snapshot at snapshot_path if there is a usable one.
+    Nothing blocks after loading: call update_hist_data for a one-shot update, or run_polling to keep updating.
+    """
+    def __init__(self, realtime_polling_interval = 20, metrics_port = None, csv_base_name = "csi300", snapshot_path = None, console = True, alerts = True):
         start_datetime = datetime(2017, 12, 27, 14, 49, 59)
-        csv_base_name = "csi300"
         # Fake data source to debug realtime data updating and SMA calculation.
         #PriceDataLoader.price_data_loader_china = FakePriceDataLoaderChina(start_datetime, csv_base_name)
 
-        self.price_data = PriceData(CSI300.CSI300_CODE_IFENG, csv_base_name)
-        self.price_data.set_simple_moving_average(SimpleMovingAverage(SimpleMovingAverage.DEFAULT_PARAMS))
+        self.snapshot = None if snapshot_path is None else PriceDataSnapshot(snapshot_path)
+        self.price_data = None
+        if self.snapshot is not None:
+            self.price_data = self.snapshot.load(CSI300.CSI300_CODE_IFENG, csv_base_name, SimpleMovingAverage.DEFAULT_PARAMS)
+        if self.price_data is None:
+            self.price_data = PriceData(CSI300.CSI300_CODE_IFENG, csv_base_name)
+            self.price_data.set_simple_moving_average(SimpleMovingAverage(SimpleMovingAverage.DEFAULT_PARAMS))
+
+        # Print ticks, closed records and moving averages off the polling path.
+        self.console = None
+        if console:
+            self.console = EventConsole()
+            self.console.subscribe(event_bus)
+        # Publish crossings and touches of the moving average lines, and changes of their alignment.
+        self.alert_engine = None
+        if alerts:
+            self.alert_engine = AlertEngine([CSI300.CSI300_CODE_IFENG])
+            self.alert_engine.subscribe(event_bus)
 
-        self.realtime_polling_interval = realtime_polling_interval
-        self.start_realtime_polling()
-        self.start_histdata_polling()
+        # Serve metrics of the poll loops locally, see Metrics.serve.
+        if metrics_port is not None:
+            metrics.serve(metrics_port)
 
-        while True:
-            try:
-                self.realtime_polling_thread.join(timeout = 5)
-                self.histdata_polling_thread.join(timeout = 5)
-                if not self.realtime_polling_thread.is_alive() or not self.histdata_polling_thread.is_alive():
-                    print("At least one of the polling thread finished.")
-                    self.stop_realtime_polling()
-                    self.stop_histdata_polling()
-                    break
-            except (KeyboardInterrupt, SystemExit):
-                print("Ctrl-C or SystemExit.")
-                self.stop_realtime_polling()
-                self.stop_histdata_polling()
+        self.scheduler = PollingScheduler(self.price_data, realtime_polling_interval,
+            on_hist_data_updated = None if self.snapshot is None else self.save_snapshot)
 
-    def start_realtime_polling(self):
-        self.realtime_polling = True
-        self.realtime_polling_thread = threading.Thread(target = self.realtime_price_polling)
-        self.realtime_polling_thread.start()
+    """ Codes of the CSI300 constituents, to be tracked with a PriceDataUniverse. """
+    @staticmethod
+    def constituent_codes():
+        return list(PriceDataLoader.price_data_loader_china.get().get_hs300s()["code"])
 
-    def stop_realtime_polling(self):
-        self.realtime_polling = False
-        # TODO: In order to quit ASAP we need to signal the thread to force sleep to finish.
-        # However we don't care too much about it now.
+    def update_hist_data(self):
+        self.price_data.update_hist_data(PriceDataLoader.price_data_loader_china.get().now())
 
-    def start_histdata_polling(self):
-        self.histdata_polling = True
-        self.histdata_polling_thread = threading.Thread(target = self.history_price_data_polling)
-        self.histdata_polling_thread.start()
+    """ Poll realtime and history data until stop_polling is called or the process is interrupted. Blocks the calling thread. """
+    def run_polling(self):
+        try:
+            self.scheduler.run()
+        finally:
+            self.save_snapshot()
+            self.flush_events()
 
-    def stop_histdata_polling(self):
-        self.histdata_polling = False
-        # TODO: same as above.
+    def stop_polling(self):
+        self.scheduler.stop()
 
-    def realtime_price_polling(self):
-        while self.realtime_polling:
-            self.price_data.update_realtime()
-            self.price_data.print_realtime_price_summary()
-            self.price_data.print_realtime_sma_summary()
-            time.sleep(self.realtime_polling_interval)
+    """ Wait for subscribers such as the console to handle the published events. """
+    def flush_events(self, timeout = 5):
+        event_bus.flush(timeout)
 
-    def history_price_data_polling(self):
-        while self.histdata_polling:
-            time.sleep(1)
-            nowChina = PriceDataLoader.price_data_loader_china.now()
-            self.price_data.update_hist_data(nowChina)
-# bug: update data for day
\ No newline at end of file
+    def save_snapshot(self):
+        if self.snapshot is not None:
+            self.snapshot.save(self.price_data)
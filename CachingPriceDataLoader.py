@@ -0,0 +1,161 @@
+from Metrics import metrics
+from RateLimiter import RateLimiter
+from TradingDateTime import trading_date_time
+
+import PriceDataLoader
+
+import pandas
+
+import collections
+import concurrent.futures
+import threading
+import time
+
+# A price data loader which wraps the installed delegate with a shared response cache.
+# Responses are kept for a time to live per method, and never beyond the next close of the requested interval. Responses of
+# history data without the record of the last closed interval are not kept, so a cached response never hides a closed record. The least recently used responses are evicted beyond max_entries.
+# Concurrent identical requests are coalesced into one request, and requests to each data source are rate limited.
+# Callers get copies of cached responses, so they may modify them.
+class CachingPriceDataLoaderChina(PriceDataLoader.PriceDataLoaderChina):
+    # Seconds to keep responses of each method.
+    DEFAULT_TTLS = {
+        "get_hist_data": 60,
+        "get_k_data": 60,
+        "get_realtime_quotes": 3,
+        "get_hs300s": 24 * 3600,
+        }
+    # Data source of each method, and requests per second to each data source.
+    SOURCE_OF_METHOD = {
+        "get_hist_data": "ifeng",
+        "get_k_data": "tencent",
+        "get_realtime_quotes": "sina",
+        "get_hs300s": "csindex",
+        }
+    DEFAULT_RATE_LIMITS = {"ifeng": 5.0, "tencent": 10.0, "sina": 5.0, "csindex": 1.0}
+
+    def __init__(self, delegate, ttls = DEFAULT_TTLS, max_entries = 1024, rate_limits = DEFAULT_RATE_LIMITS):
+        self.delegate = delegate
+        self.ttls = dict(CachingPriceDataLoaderChina.DEFAULT_TTLS, **ttls)
+        self.max_entries = max_entries
+        self.rate_limiters = dict((source, RateLimiter(rate, burst = max(1, int(rate)))) for source, rate in rate_limits.items())
+        # key -> (expiry time, response), in order of use.
+        self.cache = collections.OrderedDict()
+        # key -> future of the request in flight.
+        self.in_flight = {}
+        self.lock = threading.Lock()
+
+    """ Wrap the installed loader and install the caching loader instead. Return it. """
+    @staticmethod
+    def install(**kwargs):
+        loader = CachingPriceDataLoaderChina(PriceDataLoader.price_data_loader_china.get(), **kwargs)
+        PriceDataLoader.price_data_loader_china = loader
+        return loader
+
+    def get_hist_data(self, code = None, start = None, end = None, ktype= 'D', retry_count = 3, pause = 0.001):
+        return self.request("get_hist_data", (code, ktype, start, end), ktype,
+            lambda: self.delegate.get_hist_data(code, start, end, ktype, retry_count, pause))
+
+    def get_k_data(self, code = None, start = '', end = '', ktype = 'D', autype = 'qfq', index = False, retry_count = 3, pause = 0.001):
+        return self.request("get_k_data", (code, ktype, start, end, autype, index), ktype,
+            lambda: self.delegate.get_k_data(code, start, end, ktype, autype, index, retry_count, pause))
+
+    def get_realtime_quotes(self, symbols = None):
+        key = tuple(symbols) if isinstance(symbols, (list, tuple)) else symbols
+        return self.request("get_realtime_quotes", (key,), None, lambda: self.delegate.get_realtime_quotes(symbols))
+
+    def get_hs300s(self):
+        return self.request("get_hs300s", (), None, self.delegate.get_hs300s)
+
+    """
+    Return a copy of the cached response of method for key, or do the request. Only one request of the same key is in flight,
+    and other callers wait for its response. Responses of history data of ktype expire at the next close of the interval, and are
+    only cached if they have the last closed record, so that a retry for a record which was late gets it.
+    """
+    def request(self, method, key, ktype, do_request):
+        key = (method,) + key
+        with self.lock:
+            cached = self.cache.get(key)
+            if cached is not None:
+                if cached[0] > time.monotonic():
+                    self.cache.move_to_end(key)
+                    metrics.increment("loader_cache.hits")
+                    return CachingPriceDataLoaderChina.copy(cached[1])
+                del self.cache[key]
+            future = self.in_flight.get(key)
+            owner = future is None
+            if owner:
+                future = self.in_flight[key] = concurrent.futures.Future()
+        if not owner:
+            metrics.increment("loader_cache.coalesced")
+            return CachingPriceDataLoaderChina.copy(future.result())
+
+        metrics.increment("loader_cache.misses")
+        try:
+            rate_limiter = self.rate_limiters.get(CachingPriceDataLoaderChina.SOURCE_OF_METHOD[method])
+            if rate_limiter is not None:
+                rate_limiter.acquire()
+            response = do_request()
+        except Exception as e:
+            with self.lock:
+                del self.in_flight[key]
+            future.set_exception(e)
+            raise
+        expiry = time.monotonic() + self.time_to_live(method, ktype)
+        with self.lock:
+            del self.in_flight[key]
+            # No response is not cached, so that the next caller tries again.
+            if response is not None and self.has_last_close(response, ktype):
+                self.cache[key] = (expiry, response)
+                self.cache.move_to_end(key)
+                while len(self.cache) > self.max_entries:
+                    self.cache.popitem(last = False)
+        future.set_result(response)
+        return CachingPriceDataLoaderChina.copy(response)
+
+    @staticmethod
+    def copy(response):
+        return None if response is None else response.copy()
+
+    """
+    Whether a response of history data of ktype has the record of the last closed interval, compared as date strings because
+    minute records of get_k_data have no seconds. Always True for other responses.
+    """
+    def has_last_close(self, response, ktype):
+        if ktype is None:
+            return True
+        nowChina = self.delegate.now()
+        if ktype == "D":
+            last_close = trading_date_time.lastClosedDayChina(nowChina)
+        else:
+            last_close = trading_date_time.lastClosedMinuteIntervalTimeChina(int(ktype), nowChina).strftime("%Y-%m-%d %H:%M")
+        dates = response["date"] if "date" in response.columns else response.index
+        if (pandas.Series(dates).astype(str).str[:len(last_close)] == last_close).any():
+            return True
+        metrics.increment("loader_cache.incomplete")
+        return False
+
+    """ Seconds to keep a response of method, at most until the next close of the interval of ktype. """
+    def time_to_live(self, method, ktype):
+        ttl = self.ttls.get(method, 0)
+        if ktype is not None and ttl > 0:
+            interval = "day" if ktype == "D" else "%smin" % ktype
+            nowChina = self.delegate.now()
+            next_close = trading_date_time.nextIntervalCloseTimeChina(interval, nowChina)
+            ttl = min(ttl, (next_close.replace(tzinfo = None) - nowChina.replace(tzinfo = None)).total_seconds())
+        return max(0, ttl)
+
+    def invalidate(self):
+        with self.lock:
+            self.cache.clear()
+
+    """ Other methods are delegated. """
+    def get_price_store(self, csv_path):
+        return self.delegate.get_price_store(csv_path)
+    def has_saved_data(self, csv_path):
+        return self.delegate.has_saved_data(csv_path)
+    def read_csv(self, filepath, **kwargs):
+        return self.delegate.read_csv(filepath, **kwargs)
+    def save_csv(self, df, csv_path):
+        return self.delegate.save_csv(df, csv_path)
+    def now(self):
+        return self.delegate.now()
@@ -0,0 +1,136 @@
+from Metrics import metrics
+
+import collections
+import queue
+import threading
+import time
+
+# A realtime quote of code at time (YYYY-MM-DD HH:MM:SS), with the quote row as given by get_realtime_quotes.
+TickEvent = collections.namedtuple("TickEvent", ["code", "time", "price", "quote"])
+# A closed price record of interval merged into price data, record is {column: value}.
+BarClosedEvent = collections.namedtuple("BarClosedEvent", ["code", "interval", "close", "record"])
+# Moving averages of interval, {count: sma}, either at the last closed record or provisional at the realtime price.
+MaUpdatedEvent = collections.namedtuple("MaUpdatedEvent", ["code", "interval", "realtime", "values"])
+# A change of price relative to the moving average line (interval, count) of code, or of the alignment of the lines of interval
+# with count and ma None, see AlertEngine.
+AlertEvent = collections.namedtuple("AlertEvent", ["code", "interval", "count", "kind", "price", "ma"])
+
+class EventBus(object):
+    """
+    Publish / subscribe of price data events, see TickEvent, BarClosedEvent, MaUpdatedEvent and AlertEvent.
+    Every subscription has a bounded queue drained by its own thread, which hands events to the handler in batches, so publishing
+    never waits for a subscriber: when a slow subscriber's queue is full, its oldest event is dropped and counted in events.dropped.
+    Safe to publish from any thread.
+    """
+    DEFAULT_QUEUE_SIZE = 1024
+    DEFAULT_BATCH_SIZE = 256
+
+    def __init__(self):
+        self.subscriptions = []
+        self.__lock = threading.Lock()
+
+    """
+    Call handler(events) with lists of events of event_types (all types if None) in publishing order, on a thread of the subscription.
+    Return the subscription for unsubscribe.
+    """
+    def subscribe(self, handler, event_types = None, queue_size = DEFAULT_QUEUE_SIZE, batch_size = DEFAULT_BATCH_SIZE, name = None):
+        subscription = EventSubscription(handler, event_types, queue_size, batch_size, name)
+        with self.__lock:
+            self.subscriptions = self.subscriptions + [subscription]
+        return subscription
+
+    """ Stop the subscription after handling the events already in its queue. """
+    def unsubscribe(self, subscription, timeout = None):
+        with self.__lock:
+            self.subscriptions = [s for s in self.subscriptions if s is not subscription]
+        subscription.close(timeout)
+
+    """ Whether any subscription takes events of event_type, so that publishers can skip building events nobody handles. """
+    def wants(self, event_type):
+        for subscription in self.subscriptions:
+            if subscription.wants(event_type):
+                return True
+        return False
+
+    def publish(self, event):
+        for subscription in self.subscriptions:
+            if subscription.wants(type(event)):
+                subscription.offer(event)
+
+    """ Wait until every subscription has handled the events published so far. Return False on timeout. """
+    def flush(self, timeout = None):
+        deadline = None if timeout is None else time.monotonic() + timeout
+        for subscription in self.subscriptions:
+            if not subscription.flush(None if deadline is None else max(0.0, deadline - time.monotonic())):
+                return False
+        return True
+
+class EventSubscription(object):
+
+    def __init__(self, handler, event_types, queue_size, batch_size, name):
+        self.handler = handler
+        self.event_types = None if event_types is None else tuple(event_types)
+        self.batch_size = batch_size
+        self.name = name or getattr(handler, "__name__", "subscriber")
+        self.queue = queue.Queue(queue_size)
+        self.dropped = 0
+        self.__thread = threading.Thread(target = self.__run, name = "EventSubscription-%s" % self.name, daemon = True)
+        self.__thread.start()
+
+    def wants(self, event_type):
+        return self.event_types is None or event_type in self.event_types
+
+    """ Queue event without blocking, dropping the oldest queued event if the queue is full. """
+    def offer(self, event):
+        while True:
+            try:
+                self.queue.put_nowait(event)
+                return
+            except queue.Full:
+                pass
+            try:
+                self.queue.get_nowait()
+                self.queue.task_done()
+                self.dropped += 1
+                metrics.increment("events.dropped")
+            except queue.Empty:
+                pass
+
+    def flush(self, timeout = None):
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self.queue.all_tasks_done:
+            while self.queue.unfinished_tasks:
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    return False
+                self.queue.all_tasks_done.wait(remaining)
+        return True
+
+    def close(self, timeout = None):
+        # None wakes the thread up and ends it after the queued events.
+        self.queue.put(None)
+        self.__thread.join(timeout)
+
+    def __run(self):
+        while True:
+            events = [self.queue.get()]
+            while len(events) < self.batch_size:
+                try:
+                    events.append(self.queue.get_nowait())
+                except queue.Empty:
+                    break
+            stop = any(event is None for event in events)
+            batch = [event for event in events if event is not None]
+            try:
+                if batch:
+                    with metrics.timer("events.%s" % self.name):
+                        self.handler(batch)
+            except Exception as e:
+                print("Event subscriber %s failed: %s" % (self.name, e))
+            finally:
+                for _ in events:
+                    self.queue.task_done()
+            if stop:
+                return
+
+event_bus = EventBus()
@@ -0,0 +1,50 @@
+from EventBus import AlertEvent, BarClosedEvent, MaUpdatedEvent, TickEvent
+
+import sys
+
+class EventConsole(object):
+    """
+    Console output of price data events, subscribed to an EventBus so that formatting never runs on the polling path.
+    Within a batch only the last tick of each code and the last moving averages of each code and interval are printed,
+    and the whole batch is written at once.
+    """
+
+    def __init__(self, stream = None):
+        self.stream = sys.stdout if stream is None else stream
+        self.subscription = None
+
+    def subscribe(self, event_bus):
+        self.subscription = event_bus.subscribe(self.handle, name = "console")
+        return self.subscription
+
+    def handle(self, events):
+        # Latest events by key in order of first appearance.
+        latest = {}
+        for event in events:
+            if isinstance(event, TickEvent):
+                key = (TickEvent, event.code)
+            elif isinstance(event, MaUpdatedEvent):
+                key = (MaUpdatedEvent, event.code, event.interval, event.realtime)
+            elif isinstance(event, AlertEvent):
+                # Every alert is printed.
+                key = len(latest)
+            else:
+                key = (BarClosedEvent, event.code, event.interval, event.close)
+            latest[key] = event
+        lines = [EventConsole.format_event(event) for event in latest.values()]
+        self.stream.write("\n".join(lines) + "\n")
+        self.stream.flush()
+
+    @staticmethod
+    def format_event(event):
+        if isinstance(event, TickEvent):
+            return "%s realtime price at %s:\t%s" % (event.code, event.time, event.price)
+        if isinstance(event, AlertEvent):
+            if event.count is None:
+                return "%s alert: moving averages at interval %s turn %s at %s" % (event.code, event.interval, event.kind, event.price)
+            return "%s alert: %s MA (%s, %s) %.3f at %s" % (event.code, event.kind, event.interval, event.count, event.ma, event.price)
+        if isinstance(event, BarClosedEvent):
+            return "%s %s record at %s:\t%s" % (event.code, event.interval, event.close,
+                ", ".join("%s %s" % (column, value) for column, value in event.record.items()))
+        values = ", ".join("%s %s" % (count, "None" if value is None else "%.3f" % value) for count, value in sorted(event.values.items()))
+        return "%s %s MA at interval %s:\t%s" % (event.code, "realtime" if event.realtime else "closed", event.interval, values)
@@ -3,20 +3,24 @@ from TradingDateTime import TradingDateTime, trading_date_time
 
 import PriceDataLoader
 
+import numpy
 import pandas
 
 import datetime
 import os
 
 # A class to fake price data.
+# Price records up to the fake now are served as views of the loaded data, found by positional cursors on dates of each interval.
 class FakePriceDataLoaderChina(PriceDataLoader.PriceDataLoaderChina):
-    def __init__(self, start_datetime, csv_base_name):
+    def __init__(self, start_datetime, csv_base_name, k_data_window = None):
         # fake_now_str must be multiple of 5 minute
         self.fake_now_str = \
             trading_date_time.previousIntervalClose("5min",
                 trading_date_time.closeTimeOfCurrentMinuteIntervalChina(5, start_datetime, check_opening = False).strftime(TradingDateTime.DATETIME_STRFTIME))
 
         self.csv_base_name = csv_base_name
+        # Number of last records returned by get_k_data, like the data source which only gives recent records. None for all.
+        self.k_data_window = k_data_window
 
         self.csv_path_to_interval_name = {}
         self.ktype_to_interval_name = {}
@@ -24,22 +28,57 @@ class FakePriceDataLoaderChina(PriceDataLoader.PriceDataLoaderChina):
             self.ktype_to_interval_name[ktype] = interval
 
         self.price_data = {}
+        # Dates of each interval as an array for binary search, and the last searched (datetime_str, position) of each interval.
+        self.dates = {}
+        self.cursors = {}
+        # Closes of 5min records, which give the realtime price at the fake now.
+        self.closes = None
         self.load_data_from_csv(csv_base_name, start_datetime)
 
+        # Position of fake_now_str in 5min records, which is advanced by get_realtime_quotes.
+        self.fake_now_position = self.cursor("5min", self.fake_now_str) - 1
+        self.fake_now = datetime.datetime.strptime(self.fake_now_str, TradingDateTime.DATETIME_STRFTIME)
+
     def load_data_from_csv(self, csv_base_name, start_datetime):
         for interval in PriceData.INTERVALS:
             csv_path = "%s_%s.csv" % (self.csv_base_name, interval)
-            if os.path.exists(csv_path):
+            store = self.get_price_store(csv_path)
+            if store.exists():
+                df = store.read(dates_as_strings = True)
+            elif os.path.exists(csv_path):
                 df = pandas.read_csv(csv_path, index_col = 0)
             else:
                 raise Exception()
+            if not df.index.is_monotonic_increasing:
+                df = df.sort_index()
             self.price_data[interval] = df
+            self.dates[interval] = df.index.to_numpy(dtype = object)
             self.csv_path_to_interval_name[csv_path] = interval
+        self.closes = self.price_data["5min"]["close"].to_numpy()
+
+    """
+    Number of records of interval not later than datetime_str. The fake now only moves forward, so the cursor is moved forward
+    from the last position, which is mostly by one record or none. Other moves fall back to binary search.
+    """
+    def cursor(self, interval, datetime_str):
+        cached = self.cursors.get(interval)
+        if cached is not None and cached[0] == datetime_str:
+            return cached[1]
+        dates = self.dates[interval]
+        if cached is not None and cached[0] < datetime_str:
+            position = cached[1]
+            while position < len(dates) and dates[position] <= datetime_str:
+                position += 1
+        else:
+            position = int(numpy.searchsorted(dates, datetime_str, side = "right"))
+        self.cursors[interval] = (datetime_str, position)
+        return position
 
-    def cut_price_data_by_datetime(self, price_data, datetime_str):
-        return price_data.loc[price_data.index <= datetime_str]
+    def cut_price_data_by_datetime(self, interval, datetime_str):
+        return self.price_data[interval].iloc[:self.cursor(interval, datetime_str)]
 
-    def get_fake_price_data_for_interval(self, interval):
+    """ Number of records of interval closed at the fake now. """
+    def closed_count(self, interval):
         if interval == PriceData.DAY:
             day_str, time_str = self.fake_now_str.split()
             if (time_str == "15:00:00"):
@@ -48,7 +87,14 @@ class FakePriceDataLoaderChina(PriceDataLoader.PriceDataLoaderChina):
                 datetime_str = trading_date_time.previousTradingDayChina(day_str)
         else:
             datetime_str = self.fake_now_str
-        return self.cut_price_data_by_datetime(self.price_data[interval], datetime_str)
+        return self.cursor(interval, datetime_str)
+
+    def get_fake_price_data_for_interval(self, interval):
+        return self.price_data[interval].iloc[:self.closed_count(interval)]
+
+    """ Price at the fake now, the close of the 5min record. """
+    def fake_now_price(self):
+        return self.closes[self.fake_now_position]
 
     """ Inherited methods. """
     def get_hist_data(self, code = None, start = None, end = None, ktype= 'D', retry_count = 3, pause = 0.001):
@@ -56,34 +102,41 @@ class FakePriceDataLoaderChina(PriceDataLoader.PriceDataLoaderChina):
 
     def get_k_data(self, code = None, start = '', end = '', ktype = 'D', autype = 'qfq', index = False, retry_count = 3, pause = 0.001):
         data = self.get_fake_price_data_for_interval(self.ktype_to_interval_name[ktype])
+        if self.k_data_window is not None:
+            data = data.iloc[-self.k_data_window:]
         data = data.reset_index()
         if ktype != 'D':
             # Simulate the tencent's data format for minute intervals.
-            size = len(data.index)
-            for i in range(size):
-                data.at[i, "date"] = data.at[i, "date"][:-3]
+            data["date"] = data["date"].str[:-3]
         return data
 
-    def get_realtime_quotes(self, symbols = None):
-        # Increase fake_now_str by 5 minutes and return the price by fake_now_str
-        now_str = trading_date_time.nextIntervalClose("5min", self.fake_now_str)
+    """ Advance the fake now to the next 5min record. Return False if there is no more record. """
+    def advance(self):
+        if self.fake_now_position + 1 >= len(self.dates["5min"]):
+            return False
+        self.fake_now_position += 1
+        self.fake_now_str = self.dates["5min"][self.fake_now_position]
+        self.fake_now = datetime.datetime.strptime(self.fake_now_str, TradingDateTime.DATETIME_STRFTIME)
+        return True
 
+    def get_realtime_quotes(self, symbols = None):
+        # Increase fake_now_str to the next 5min record and return the price by fake_now_str
         # Return value format: DataFrame with only one record, containing price in "price", date in "date", time in "time".
         # If datetime goes beyond our data, always return the last one, and stop the fake_now_str increasing.
-        if now_str in self.price_data["5min"].index:
-            self.fake_now_str = now_str
-        else:
-            now_str = self.fake_now_str
-        date, time = now_str.split()
-        price = self.price_data["5min"].at[date + " " + time, "close"]
+        self.advance()
+        date, time = self.fake_now_str.split()
+        price = self.fake_now_price()
         return pandas.DataFrame(data = {"price": [price], "date": [date], "time": [time]})
-    
+
     def read_csv(self, filepath, **kwargs):
         interval = self.csv_path_to_interval_name[filepath]
         return self.get_fake_price_data_for_interval(interval)
 
+    def has_saved_data(self, csv_path):
+        return csv_path in self.csv_path_to_interval_name
+
     def save_csv(self, df, csv_path):
         return
 
     def now(self):
-        return datetime.datetime.strptime(self.fake_now_str, TradingDateTime.DATETIME_STRFTIME)
+        return self.fake_now
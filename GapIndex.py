@@ -0,0 +1,121 @@
+from TradingDateTime import trading_date_time
+
+import numpy
+
+class GapIndex(object):
+    """
+    Index of holes in price data of every interval, i.e. interval closes on the trading session grid which are missing between
+    the first and the last price record. Holes are found with one vectorized diff of bar ordinals, see
+    TradingDateTime.intervalCloseOrdinals, and appended records are indexed incrementally.
+    A gap is (first missing ordinal, first ordinal after the gap), so it holds end - start missing records.
+    """
+
+    def __init__(self):
+        # interval -> int64 array of shape (n, 2) of gaps in increasing order.
+        self.gaps = {}
+        # interval -> last indexed datetime string and its ordinal.
+        self.last_datetime_strs = {}
+        self.last_ordinals = {}
+        # interval -> set of gaps which were already requested from the data source, so that holes the data source can't
+        # fill are not requested again on every update.
+        self.requested = {}
+
+    """ Index all records of interval from dates in increasing order, e.g. a price data index. """
+    def build(self, interval, dates):
+        self.gaps[interval] = numpy.zeros((0, 2), dtype = numpy.int64)
+        self.last_datetime_strs[interval] = None
+        self.last_ordinals[interval] = None
+        self.requested[interval] = set()
+        self.append(interval, dates)
+
+    """ Index the records of dates after the last indexed one. """
+    def append(self, interval, dates):
+        last_datetime_str = self.last_datetime_strs.get(interval)
+        first = 0 if last_datetime_str is None else dates.searchsorted(last_datetime_str, side = "right")
+        if first >= len(dates):
+            return
+        ordinals = GapIndex.ordinals(interval, dates, first)
+        # Records off the grid, e.g. of days missing from the calendar, are not holes of the grid.
+        ordinals = ordinals[ordinals >= 0]
+        if len(ordinals) == 0:
+            return
+        if self.last_ordinals.get(interval) is not None:
+            ordinals = numpy.concatenate(([self.last_ordinals[interval]], ordinals))
+        holes = GapIndex.hole_positions(ordinals)
+        if len(holes) > 0:
+            gaps = numpy.stack((ordinals[holes] + 1, ordinals[holes + 1]), axis = 1)
+            self.gaps[interval] = numpy.concatenate((self.gaps.get(interval, numpy.zeros((0, 2), dtype = numpy.int64)), gaps))
+        elif interval not in self.gaps:
+            self.gaps[interval] = numpy.zeros((0, 2), dtype = numpy.int64)
+        self.last_datetime_strs[interval] = dates[-1]
+        self.last_ordinals[interval] = int(ordinals[-1])
+
+    """ Bar ordinals of the records of dates, a price data index, from position first on, -1 for records off the grid. """
+    @staticmethod
+    def ordinals(interval, dates, first = 0):
+        # Slice the array of the index, which costs much less than slicing the index itself for the few records of an update.
+        return trading_date_time.intervalCloseOrdinals(interval, numpy.asarray(dates.array[first:], dtype = object))
+
+    """ Positions i of bar ordinals in increasing order which a hole follows: ordinals[i + 1] is not the next close or is off the grid. """
+    @staticmethod
+    def hole_positions(ordinals):
+        return numpy.flatnonzero((numpy.diff(ordinals) != 1) | (ordinals[1:] < 0))
+
+    """ Remove the records of dates, which were inserted into holes, from the gaps of interval. """
+    def fill(self, interval, dates):
+        filled = trading_date_time.intervalCloseOrdinals(interval, numpy.asarray(dates, dtype = object))
+        missing = numpy.setdiff1d(self.missing_ordinals(interval), filled)
+        requested = self.requested.get(interval, set())
+        self.gaps[interval] = GapIndex.runs(missing)
+        # A gap which is partly filled by a request stays requested.
+        self.requested[interval] = set(gap for gap in map(tuple, self.gaps[interval].tolist())
+            if any(start <= gap[0] and gap[1] <= end for (start, end) in requested))
+
+    """ Mark gaps of interval as requested from the data source. """
+    def mark_requested(self, interval, gaps):
+        self.requested.setdefault(interval, set()).update(map(tuple, numpy.asarray(gaps).tolist()))
+
+    """ Gaps of interval which were not requested yet. """
+    def pending(self, interval):
+        gaps = self.gaps.get(interval, numpy.zeros((0, 2), dtype = numpy.int64))
+        requested = self.requested.get(interval, set())
+        return numpy.array([gap for gap in gaps.tolist() if tuple(gap) not in requested], dtype = numpy.int64).reshape(-1, 2)
+
+    """ Gaps of interval which were requested but are still missing, i.e. the holes which the data source can't fill. """
+    def unfillable(self, interval):
+        gaps = self.gaps.get(interval, numpy.zeros((0, 2), dtype = numpy.int64))
+        requested = self.requested.get(interval, set())
+        return numpy.array([gap for gap in gaps.tolist() if tuple(gap) in requested], dtype = numpy.int64).reshape(-1, 2)
+
+    """ Ordinals of all missing records of interval, in increasing order. """
+    def missing_ordinals(self, interval):
+        return GapIndex.ordinals_of(self.gaps.get(interval, numpy.zeros((0, 2), dtype = numpy.int64)))
+
+    """ Close datetime strings of the missing records of interval, only of the given gaps if any. """
+    def missing_closes(self, interval, gaps = None):
+        ordinals = self.missing_ordinals(interval) if gaps is None else GapIndex.ordinals_of(gaps)
+        return trading_date_time.intervalClosesFromOrdinals(interval, ordinals)
+
+    """ Number of missing records of interval. """
+    def missing_count(self, interval):
+        gaps = self.gaps.get(interval)
+        return 0 if gaps is None else int((gaps[:, 1] - gaps[:, 0]).sum())
+
+    """ All ordinals within gaps, in increasing order. """
+    @staticmethod
+    def ordinals_of(gaps):
+        gaps = numpy.asarray(gaps, dtype = numpy.int64).reshape(-1, 2)
+        lengths = gaps[:, 1] - gaps[:, 0]
+        # Each missing ordinal is the start of its gap plus its position within the gap.
+        offsets = numpy.arange(lengths.sum()) - numpy.repeat(numpy.cumsum(lengths) - lengths, lengths)
+        return numpy.repeat(gaps[:, 0], lengths) + offsets
+
+    """ Gaps of runs of consecutive ordinals in increasing order. """
+    @staticmethod
+    def runs(ordinals):
+        if len(ordinals) == 0:
+            return numpy.zeros((0, 2), dtype = numpy.int64)
+        breaks = GapIndex.hole_positions(ordinals)
+        starts = numpy.concatenate(([ordinals[0]], ordinals[breaks + 1]))
+        ends = numpy.concatenate((ordinals[breaks] + 1, [ordinals[-1] + 1]))
+        return numpy.stack((starts, ends), axis = 1).astype(numpy.int64)
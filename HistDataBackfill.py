@@ -0,0 +1,88 @@
+from PriceData import PriceData
+from PriceDataLoader import price_data_loader_china
+from RateLimiter import RateLimiter
+
+import concurrent.futures
+import os
+
+class HistDataBackfill(object):
+    """
+    Download history price data of many codes and intervals concurrently.
+    Downloads run in a bounded thread pool, and requests to each data source are rate limited.
+    Post-processing of responses (see PriceData.normalize_tencent_hist_data) runs in a process pool, and every result is
+    saved to the price store as soon as it's ready, so a cold start of a universe streams into storage instead of waiting for all.
+    """
+    # Data source of every loader method.
+    TENCENT = "tencent"
+    DEFAULT_RATE_LIMITS = {TENCENT: 10.0}
+
+    def __init__(self, max_workers = 8, max_processes = None, rate_limits = None):
+        self.max_workers = max_workers
+        # 0 processes post-process in the download threads.
+        self.max_processes = os.cpu_count() if max_processes is None else max_processes
+        self.rate_limiters = {}
+        for source, rate in (HistDataBackfill.DEFAULT_RATE_LIMITS if rate_limits is None else rate_limits).items():
+            self.rate_limiters[source] = RateLimiter(rate, burst = max(1, int(rate)))
+        # (code, interval, exception) of failed downloads of the last run.
+        self.failures = []
+
+    """
+    Download intervals of codes. When csv_base_name_format is given, each result is saved as csv_base_name_format % code,
+    and with skip_saved codes and intervals which already have saved data are skipped.
+    on_result(code, interval, data) is called as each result is ready. Return {code: {interval: data}}.
+    """
+    def run(self, codes, intervals = PriceData.INTERVALS, csv_base_name_format = None, skip_saved = False, on_result = None):
+        jobs = []
+        for code in codes:
+            for interval in intervals:
+                if skip_saved and csv_base_name_format is not None and \
+                        price_data_loader_china.get().has_saved_data(HistDataBackfill.csv_path(csv_base_name_format, code, interval)):
+                    continue
+                jobs.append((code, interval))
+
+        self.failures = []
+        results = dict((code, {}) for code in codes)
+        process_pool = concurrent.futures.ProcessPoolExecutor(self.max_processes) if self.max_processes > 0 and len(jobs) > 1 else None
+        try:
+            with concurrent.futures.ThreadPoolExecutor(self.max_workers) as thread_pool:
+                downloads = dict((thread_pool.submit(self.download, code, interval, process_pool is None), (code, interval)) for (code, interval) in jobs)
+                pending = set(downloads.keys())
+                post_processes = {}
+                while pending:
+                    done, pending = concurrent.futures.wait(pending, return_when = concurrent.futures.FIRST_COMPLETED)
+                    for future in done:
+                        code, interval = downloads.get(future) or post_processes.get(future)
+                        try:
+                            data = future.result()
+                        except Exception as e:
+                            print("Failed to download %s data of %s: %s" % (interval, code, e))
+                            self.failures.append((code, interval, e))
+                            continue
+                        if future in downloads and process_pool is not None:
+                            post_process = process_pool.submit(PriceData.normalize_tencent_hist_data, data, interval)
+                            post_processes[post_process] = (code, interval)
+                            pending.add(post_process)
+                            continue
+                        results[code][interval] = data
+                        if csv_base_name_format is not None:
+                            price_data_loader_china.get().save_csv(data, HistDataBackfill.csv_path(csv_base_name_format, code, interval))
+                        if on_result is not None:
+                            on_result(code, interval, data)
+        finally:
+            if process_pool is not None:
+                process_pool.shutdown()
+        return results
+
+    @staticmethod
+    def csv_path(csv_base_name_format, code, interval):
+        return "%s_%s.csv" % (csv_base_name_format % code, interval)
+
+    """ Download one interval of code, post-processed unless post-processing runs in the process pool. """
+    def download(self, code, interval, post_process = True):
+        rate_limiter = self.rate_limiters.get(HistDataBackfill.TENCENT)
+        if rate_limiter is not None:
+            rate_limiter.acquire()
+        data = price_data_loader_china.get().get_k_data(code = code, ktype = PriceData.INTERVAL_TO_REQUEST_MAP[interval])
+        if post_process:
+            data = PriceData.normalize_tencent_hist_data(data, interval)
+        return data
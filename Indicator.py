@@ -0,0 +1,167 @@
+from StreamingSma import StreamingSma
+
+import math
+
+class Indicator(object):
+    """
+    An incremental indicator of one interval, see IndicatorPipeline.
+    Indicators only hold parameters. Their state is an immutable value kept by the pipeline, and step(state, window) folds in
+    the last record of a PriceWindow in O(1), so that the pipeline can restate records and try provisional records cheaply.
+    """
+
+    def __init__(self, name, lookback, warmup):
+        self.name = name
+        # Number of last records in the window which step may read.
+        self.lookback = lookback
+        # Number of last records to fold in when loading history, e.g. for exponential averages to converge.
+        self.warmup = max(lookback, warmup)
+
+    """ Return the state after the last record of window is folded into state, which is None for the first record after a gap. """
+    def step(self, state, window):
+        raise NotImplementedError()
+
+    """ Return the indicator value at state, or None if there are no enough records. """
+    def value(self, state):
+        raise NotImplementedError()
+
+class ExponentialMovingAverage(Indicator):
+    """ EMA of close with smoothing 2 / (span + 1), started at the first close like pandas ewm(adjust = False). """
+
+    def __init__(self, span):
+        Indicator.__init__(self, "ema%d" % span, 1, 10 * span)
+        self.span = span
+        self.alpha = 2.0 / (span + 1)
+
+    def step(self, state, window):
+        close = window.last("close")
+        if state is None:
+            return (1, close)
+        count, ema = state
+        return (count + 1, ema + self.alpha * (close - ema))
+
+    def value(self, state):
+        if state is None or state[0] < self.span:
+            return None
+        return state[1]
+
+class Macd(Indicator):
+    """ MACD line (fast EMA - slow EMA), signal line (EMA of the MACD line) and histogram (MACD - signal) of close. """
+
+    def __init__(self, fast = 12, slow = 26, signal = 9):
+        Indicator.__init__(self, "macd%d_%d_%d" % (fast, slow, signal), 1, 10 * slow)
+        self.fast = fast
+        self.slow = slow
+        self.signal = signal
+        self.alphas = (2.0 / (fast + 1), 2.0 / (slow + 1), 2.0 / (signal + 1))
+
+    def step(self, state, window):
+        close = window.last("close")
+        if state is None:
+            return (1, close, close, 0.0)
+        count, fast_ema, slow_ema, signal_ema = state
+        fast_ema += self.alphas[0] * (close - fast_ema)
+        slow_ema += self.alphas[1] * (close - slow_ema)
+        signal_ema += self.alphas[2] * (fast_ema - slow_ema - signal_ema)
+        return (count + 1, fast_ema, slow_ema, signal_ema)
+
+    def value(self, state):
+        if state is None or state[0] < self.slow + self.signal:
+            return None
+        _, fast_ema, slow_ema, signal_ema = state
+        macd = fast_ema - slow_ema
+        return (macd, signal_ema, macd - signal_ema)
+
+class BollingerBands(Indicator):
+    """ (middle, upper, lower) bands: the moving average of close over count, plus and minus width population standard deviations. """
+
+    def __init__(self, count = 20, width = 2.0):
+        Indicator.__init__(self, "boll%d" % count, count + 1, count)
+        self.count = count
+        self.width = width
+
+    def step(self, state, window):
+        close = window.last("close")
+        if state is None:
+            return (1, close, close * close, 1)
+        size, total, total_squares, pushes = state
+        if size == self.count:
+            leaving = window.last("close", self.count + 1)
+            total -= leaving
+            total_squares -= leaving * leaving
+        size = min(size + 1, self.count)
+        total += close
+        total_squares += close * close
+        pushes = StreamingSma.count_push(pushes, self.count)
+        if pushes == 0:
+            closes = window.tail("close", size)
+            total = math.fsum(closes)
+            total_squares = math.fsum(c * c for c in closes)
+            pushes = 0
+        return (size, total, total_squares, pushes)
+
+    def value(self, state):
+        if state is None or state[0] < self.count:
+            return None
+        _, total, total_squares, _ = state
+        middle = total / self.count
+        deviation = math.sqrt(max(0.0, total_squares / self.count - middle * middle))
+        return (middle, middle + self.width * deviation, middle - self.width * deviation)
+
+class AverageTrueRange(Indicator):
+    """ Wilder's ATR over count, started with the mean true range of the first count records. """
+
+    def __init__(self, count = 14):
+        Indicator.__init__(self, "atr%d" % count, 2, 10 * count)
+        self.count = count
+
+    def step(self, state, window):
+        high, low = window.last("high"), window.last("low")
+        true_range = high - low
+        if state is not None:
+            previous_close = window.last("close", 2)
+            true_range = max(true_range, abs(high - previous_close), abs(low - previous_close))
+            size, atr = state
+        else:
+            size, atr = 0, 0.0
+        if size < self.count:
+            # Average of true ranges so far.
+            return (size + 1, atr + (true_range - atr) / (size + 1))
+        return (size + 1, atr + (true_range - atr) / self.count)
+
+    def value(self, state):
+        if state is None or state[0] < self.count:
+            return None
+        return state[1]
+
+class RollingHighLow(Indicator):
+    """ (highest high, lowest low) over the last count records. Amortized O(1): the window is only searched when the extreme leaves. """
+
+    def __init__(self, count = 20):
+        Indicator.__init__(self, "hl%d" % count, count, count)
+        self.count = count
+
+    def step(self, state, window):
+        high, low = window.last("high"), window.last("low")
+        if state is None:
+            return (1, high, 0, low, 0)
+        size, highest, highest_age, lowest, lowest_age = state
+        size = min(size + 1, self.count)
+        highest, highest_age = self.__extreme(window, "high", max, high, highest, highest_age, size)
+        lowest, lowest_age = self.__extreme(window, "low", min, low, lowest, lowest_age, size)
+        return (size, highest, highest_age, lowest, lowest_age)
+
+    """ Return (extreme, age in records) of column after value is pushed. """
+    def __extreme(self, window, column, function, value, extreme, age, size):
+        if function(value, extreme) == value:
+            return (value, 0)
+        if age + 1 < size:
+            return (extreme, age + 1)
+        values = window.tail(column, size)
+        extreme = function(values)
+        # The most recent position of the extreme, so that it leaves as late as possible.
+        return (extreme, size - 1 - max(i for i, v in enumerate(values) if v == extreme))
+
+    def value(self, state):
+        if state is None or state[0] < self.count:
+            return None
+        return (state[1], state[3])
@@ -0,0 +1,157 @@
+from Indicator import AverageTrueRange, BollingerBands, ExponentialMovingAverage, Macd, RollingHighLow
+from Metrics import metrics
+from PriceData import PriceData
+from PriceWindow import PriceWindow
+from TradingDateTime import trading_date_time
+
+class IndicatorPipeline(object):
+    """
+    Incremental indicators (see Indicator) of several intervals, fed by the same hooks of PriceData as SimpleMovingAverage,
+    i.e. load_price_data, append_price_records after merges and update_realtime with realtime data.
+    All indicators of one interval share one PriceWindow, and the pipeline keeps the state of every indicator, so a closed
+    record costs O(1) per indicator. Provisional values at the realtime price are computed by pushing the realtime price as the
+    close of the current interval (with high and low at the same price, as quotes don't give the range of an interval),
+    then restoring the window and states.
+    """
+
+    def __init__(self, indicators_by_interval):
+        # interval -> [Indicator, ...]
+        self.indicators = dict((interval, list(indicators)) for interval, indicators in indicators_by_interval.items())
+        self.windows = dict((interval, PriceWindow(interval, max(indicator.lookback for indicator in indicators)))
+            for interval, indicators in self.indicators.items() if indicators)
+        # interval -> [state of each indicator], and the states before the last record for restating it.
+        self.states = {}
+        self.previous_states = {}
+        # interval -> {name: provisional value} at the last realtime price.
+        self.realtime_values = {}
+        self.realtime_price_data = {}
+        self.reset_states()
+
+    """ Common indicators for each of intervals: EMA 12 and 26, MACD 12 26 9, Bollinger bands 20, ATR 14 and high / low of 20 records. """
+    @staticmethod
+    def default_indicators(intervals = PriceData.INTERVALS):
+        indicators = [ExponentialMovingAverage(12), ExponentialMovingAverage(26), Macd(12, 26, 9), BollingerBands(20, 2.0), AverageTrueRange(14), RollingHighLow(20)]
+        return dict((interval, indicators) for interval in intervals)
+
+    def reset_states(self, interval = None):
+        for reset_interval in (self.windows.keys() if interval is None else [interval]):
+            self.states[reset_interval] = [None] * len(self.indicators[reset_interval])
+            self.previous_states[reset_interval] = list(self.states[reset_interval])
+
+    """ Load from price data of every interval. Only the last continuous records up to the longest warmup are folded in. """
+    @metrics.timed("indicators.load_price_data")
+    def load_price_data(self, price_data):
+        for interval in self.windows.keys():
+            self.load_interval(interval, price_data[interval])
+
+    def load_interval(self, interval, data):
+        self.windows[interval].reset()
+        self.reset_states(interval)
+        warmup = max(indicator.warmup for indicator in self.indicators[interval])
+        self.push_records(interval, data.iloc[max(0, len(data.index) - warmup):])
+
+    """ Reload interval after records were inserted into holes of price_data, which only costs the warmup records. """
+    @metrics.timed("indicators.backfill_price_records")
+    def backfill_price_records(self, interval, price_data):
+        if interval in self.windows:
+            self.load_interval(interval, price_data)
+            self.refresh_realtime(interval)
+
+    """ Fold in price records of interval after the last record in the window. last_datetime_str is accepted like SimpleMovingAverage does. """
+    @metrics.timed("indicators.append_price_records")
+    def append_price_records(self, interval, last_datetime_str, price_data):
+        window = self.windows.get(interval)
+        if window is None:
+            return
+        if window.last_datetime_str is not None:
+            price_data = price_data.iloc[price_data.index.searchsorted(window.last_datetime_str, side = "right"):]
+        self.push_records(interval, price_data)
+        self.refresh_realtime(interval)
+
+    def push_records(self, interval, price_data):
+        records = zip(price_data.index, price_data["high"].to_numpy(), price_data["low"].to_numpy(), price_data["close"].to_numpy())
+        for datetime_str, high, low, close in records:
+            self.push(interval, datetime_str, (float(high), float(low), float(close)))
+
+    """ Fold in one closed record (high, low, close) of interval. """
+    def push(self, interval, datetime_str, record):
+        window = self.windows[interval]
+        result = window.push(datetime_str, record)
+        if result == PriceWindow.IGNORED:
+            return
+        if result == PriceWindow.RESTARTED:
+            self.reset_states(interval)
+        elif result == PriceWindow.RESTATED:
+            self.states[interval] = list(self.previous_states[interval])
+        states = self.states[interval]
+        self.previous_states[interval] = list(states)
+        for i, indicator in enumerate(self.indicators[interval]):
+            states[i] = indicator.step(states[i], window)
+
+    """ Value of indicator name at the last closed record of interval, or None. """
+    def value(self, interval, name):
+        for indicator, state in zip(self.indicators.get(interval, []), self.states.get(interval, [])):
+            if indicator.name == name:
+                return indicator.value(state)
+        return None
+
+    def values(self, interval):
+        return dict((indicator.name, indicator.value(state)) for indicator, state in zip(self.indicators[interval], self.states[interval]))
+
+    """ Provisional value of indicator name at the last realtime price of interval, or None. """
+    def realtime_value(self, interval, name):
+        return self.realtime_values.get(interval, {}).get(name)
+
+    """ Compute provisional values of every interval with realtime price data, see PriceData.__update_realtime_at_interval. """
+    @metrics.timed("indicators.update_realtime")
+    def update_realtime(self, realtime_price_data):
+        self.realtime_price_data = realtime_price_data
+        for interval in self.windows.keys():
+            self.refresh_realtime(interval)
+
+    def refresh_realtime(self, interval):
+        realtime_interval_data = self.realtime_price_data.get(interval)
+        if realtime_interval_data is None:
+            self.realtime_values.pop(interval, None)
+            return
+        window = self.windows[interval]
+        self.realtime_values[interval] = {}
+        if window.last_ordinal is None:
+            return
+        this_ordinal = trading_date_time.intervalCloseOrdinal(interval, realtime_interval_data["this_close"])
+        if this_ordinal is None:
+            return
+        update_count = max(0, this_ordinal - window.last_ordinal)
+        prev_close_price = realtime_interval_data.get("prev_close_price", None)
+        if update_count > 1 and prev_close_price is None or update_count > 2:
+            return
+        records = []
+        if update_count > 1:
+            records.append((realtime_interval_data["prev_close"], prev_close_price))
+        if update_count > 0:
+            records.append((realtime_interval_data["this_close"], realtime_interval_data["last_price"]))
+        window_snapshot = window.snapshot()
+        states, previous_states = self.states[interval], self.previous_states[interval]
+        try:
+            for datetime_str, price in records:
+                self.states[interval], self.previous_states[interval] = list(self.states[interval]), list(self.previous_states[interval])
+                self.push(interval, datetime_str, (price, price, price))
+            self.realtime_values[interval] = self.values(interval)
+        finally:
+            window.restore(window_snapshot)
+            self.states[interval], self.previous_states[interval] = states, previous_states
+
+    def print_realtime_indicator_summary(self):
+        for interval in self.windows.keys():
+            print("Indicators at interval %s:" % interval)
+            realtime_values = self.realtime_values.get(interval, {})
+            for name, value in self.values(interval).items():
+                print("\t%s\t%s\trealtime %s" % (name, IndicatorPipeline.format_value(value), IndicatorPipeline.format_value(realtime_values.get(name))))
+
+    @staticmethod
+    def format_value(value):
+        if value is None:
+            return "None"
+        if isinstance(value, tuple):
+            return "(%s)" % ", ".join("%.3f" % v for v in value)
+        return "%.3f" % value
@@ -0,0 +1,68 @@
+import bisect
+
+class LevelIndex(object):
+    """
+    Sorted index of support / resistance levels, e.g. the current values of all moving average lines.
+    Every level has a key, such as (interval, count), and updating a key moves its level. Queries around a price are
+    binary searches, so they are O(log n) plus the size of the answer and cheap enough to run on every tick.
+    """
+
+    def __init__(self):
+        # Level values in increasing order, and the key of each level.
+        self.prices = []
+        self.keys = []
+        # key -> value
+        self.values = {}
+
+    def __len__(self):
+        return len(self.prices)
+
+    """ Set the level of key to value. """
+    def update(self, key, value):
+        old_value = self.values.get(key)
+        if old_value == value:
+            return
+        if old_value is not None:
+            self.__delete(key, old_value)
+        self.values[key] = value
+        index = bisect.bisect_right(self.prices, value)
+        self.prices.insert(index, value)
+        self.keys.insert(index, key)
+
+    def remove(self, key):
+        old_value = self.values.pop(key, None)
+        if old_value is not None:
+            self.__delete(key, old_value)
+
+    def __delete(self, key, value):
+        index = bisect.bisect_left(self.prices, value)
+        # Skip other keys at the same value.
+        while self.keys[index] != key:
+            index += 1
+        del self.prices[index]
+        del self.keys[index]
+
+    """ The n closest levels strictly below price, closest first, as [(value, key), ...]. """
+    def below(self, price, n = 1):
+        end = bisect.bisect_left(self.prices, price)
+        return self.__levels(max(0, end - n), end)[::-1]
+
+    """ The n closest levels at or above price, closest first, as [(value, key), ...]. """
+    def above(self, price, n = 1):
+        start = bisect.bisect_left(self.prices, price)
+        return self.__levels(start, start + n)
+
+    """ Levels within fraction of price, e.g. 0.01 for 1%, in increasing order. """
+    def within(self, price, fraction):
+        return self.__levels(*self.__range(price, fraction))
+
+    """ Number of levels within fraction of price, i.e. how many lines cluster around it. O(log n). """
+    def density(self, price, fraction):
+        start, end = self.__range(price, fraction)
+        return end - start
+
+    def __range(self, price, fraction):
+        return (bisect.bisect_left(self.prices, price * (1 - fraction)), bisect.bisect_right(self.prices, price * (1 + fraction)))
+
+    def __levels(self, start, end):
+        return list(zip(self.prices[start:end], self.keys[start:end]))
@@ -0,0 +1,164 @@
+import bisect
+import functools
+import http.server
+import json
+import threading
+import time
+
+class Metrics(object):
+    """
+    Low-overhead counters and latency histograms of the hot paths, e.g. loader calls, merges, SMA updates and poll cycles.
+    Values are pulled with snapshot(), or from a local HTTP endpoint started by serve() which gives Prometheus text at /metrics
+    and JSON at /metrics.json. Names are dotted strings such as "loader.get_k_data". Safe to update from any thread.
+    """
+    # Upper bounds in seconds of latency histogram buckets. Larger values fall in a last unbounded bucket.
+    LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+    PROMETHEUS_PREFIX = "tsrpcr_"
+
+    def __init__(self, buckets = LATENCY_BUCKETS):
+        # With enabled unset, every update is a no-op.
+        self.enabled = True
+        self.buckets = tuple(buckets)
+        self.__counters = {}
+        # name -> [count, sum, min, max, bucket counts]
+        self.__histograms = {}
+        self.__lock = threading.Lock()
+        self.__server = None
+
+    def increment(self, name, value = 1):
+        if not self.enabled:
+            return
+        with self.__lock:
+            self.__counters[name] = self.__counters.get(name, 0) + value
+
+    """ Record a latency of seconds in the histogram of name. """
+    def observe(self, name, seconds):
+        if not self.enabled:
+            return
+        bucket = bisect.bisect_left(self.buckets, seconds)
+        with self.__lock:
+            histogram = self.__histograms.get(name)
+            if histogram is None:
+                histogram = self.__histograms[name] = [0, 0.0, seconds, seconds, [0] * (len(self.buckets) + 1)]
+            histogram[0] += 1
+            histogram[1] += seconds
+            histogram[2] = min(histogram[2], seconds)
+            histogram[3] = max(histogram[3], seconds)
+            histogram[4][bucket] += 1
+
+    """ Context manager timing its block into the histogram of name. Exceptions are also counted as name.errors. """
+    def timer(self, name):
+        return MetricsTimer(self, name)
+
+    """ Decorator timing every call of the decorated function into the histogram of name. """
+    def timed(self, name):
+        def decorator(function):
+            @functools.wraps(function)
+            def wrapper(*args, **kwargs):
+                if not self.enabled:
+                    return function(*args, **kwargs)
+                with MetricsTimer(self, name):
+                    return function(*args, **kwargs)
+            return wrapper
+        return decorator
+
+    def reset(self):
+        with self.__lock:
+            self.__counters = {}
+            self.__histograms = {}
+
+    """ Return {"counters": {name: value}, "histograms": {name: {...}}} with bucket counts as [[upper bound, count], ...]. """
+    def snapshot(self):
+        with self.__lock:
+            counters = dict(self.__counters)
+            histograms = dict((name, (count, total, low, high, list(buckets))) for name, (count, total, low, high, buckets) in self.__histograms.items())
+        result = {"time": time.time(), "counters": counters, "histograms": {}}
+        for name, (count, total, low, high, buckets) in histograms.items():
+            result["histograms"][name] = {
+                "count": count,
+                "sum": total,
+                "min": low,
+                "max": high,
+                "mean": total / count,
+                "buckets": [[bound, bucket_count] for bound, bucket_count in zip(self.buckets + (None,), buckets)],
+                }
+        return result
+
+    """ Snapshot in the Prometheus text exposition format. Histogram buckets are cumulative there. """
+    def prometheus_text(self):
+        snapshot = self.snapshot()
+        lines = []
+        for name, value in sorted(snapshot["counters"].items()):
+            metric = Metrics.prometheus_name(name)
+            lines.append("# TYPE %s counter" % metric)
+            lines.append("%s %s" % (metric, value))
+        for name, histogram in sorted(snapshot["histograms"].items()):
+            metric = Metrics.prometheus_name(name) + "_seconds"
+            lines.append("# TYPE %s histogram" % metric)
+            cumulative = 0
+            for bound, bucket_count in histogram["buckets"]:
+                cumulative += bucket_count
+                lines.append("%s_bucket{le=\"%s\"} %d" % (metric, "+Inf" if bound is None else repr(bound), cumulative))
+            lines.append("%s_sum %r" % (metric, histogram["sum"]))
+            lines.append("%s_count %d" % (metric, histogram["count"]))
+        return "\n".join(lines) + "\n"
+
+    @staticmethod
+    def prometheus_name(name):
+        return Metrics.PROMETHEUS_PREFIX + "".join(c if c.isalnum() else "_" for c in name)
+
+    """ Serve metrics over HTTP on host:port in a daemon thread. Only listens on localhost by default. Return the server. """
+    def serve(self, port = 9300, host = "127.0.0.1"):
+        if self.__server is not None:
+            return self.__server
+        metrics = self
+        class Handler(http.server.BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path == "/metrics":
+                    body, content_type = metrics.prometheus_text(), "text/plain; version=0.0.4"
+                elif self.path == "/metrics.json":
+                    body, content_type = json.dumps(metrics.snapshot()), "application/json"
+                else:
+                    self.send_error(404)
+                    return
+                body = body.encode("utf-8")
+                self.send_response(200)
+                self.send_header("Content-Type", content_type)
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+            def log_message(self, format, *args):
+                # Keep scrapes out of the console.
+                pass
+        self.__server = http.server.ThreadingHTTPServer((host, port), Handler)
+        self.__server.daemon_threads = True
+        thread = threading.Thread(target = self.__server.serve_forever, name = "metrics-server", daemon = True)
+        thread.start()
+        return self.__server
+
+    def stop_serving(self):
+        if self.__server is not None:
+            self.__server.shutdown()
+            self.__server.server_close()
+            self.__server = None
+
+class MetricsTimer(object):
+    """Time a block into a histogram of Metrics, see Metrics.timer."""
+
+    def __init__(self, metrics, name):
+        self.metrics = metrics
+        self.name = name
+        self.start_time = None
+
+    def __enter__(self):
+        self.start_time = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.metrics.observe(self.name, time.perf_counter() - self.start_time)
+        if exc_type is not None:
+            self.metrics.increment(self.name + ".errors")
+        return False
+
+# The instance which collects metrics of the process.
+metrics = Metrics()
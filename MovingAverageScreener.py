@@ -0,0 +1,217 @@
+from HistDataBackfill import HistDataBackfill
+from PriceDataLoader import price_data_loader_china
+from SimpleMovingAverage import SimpleMovingAverage
+from TradingDateTime import TradingDateTime, trading_date_time
+
+import numpy
+import pandas
+
+class MovingAverageScreener(object):
+    """
+    Screen a universe of codes, e.g. all A-shares at the end of day, by their price relative to the moving average lines of params.
+    Closes of every interval are laid out as a (codes x records) matrix right-aligned at the last record of each code, so the moving
+    averages of all lines and codes come from one cumulative sum per interval instead of a SimpleMovingAverage per code. Only the
+    records needed by the longest line of an interval are read, and records before the last hole in price data are left out, so a
+    line is unknown for a code until enough contiguous records follow the hole.
+    The scan gives for every code:
+    - distance of price to every line, price / sma - 1,
+    - trend_strength in [-1, 1], the mean of position (lines below price minus lines above, per known line), alignment (adjacent lines
+      of an interval with the shorter one above minus below, per known pair) and slope (rising minus falling lines over slope_lookback
+      records, per known line),
+    - the nearest resistance, the lowest line above price, and its distance resistance / price - 1,
+    - stale, whether the last record is from an earlier day than the last record of the universe.
+    """
+    # Codes screened at once, which bounds the size of the matrices.
+    DEFAULT_CHUNK_SIZE = 1024
+
+    def __init__(self, params = SimpleMovingAverage.DEFAULT_PARAMS, slope_lookback = 5, chunk_size = DEFAULT_CHUNK_SIZE):
+        self.slope_lookback = slope_lookback
+        self.chunk_size = chunk_size
+        counts_by_interval = SimpleMovingAverage.counts_by_interval(params)
+        self.intervals = list(counts_by_interval.keys())
+        # Distinct lines of params as (interval, count), lines of an interval adjacent in increasing order of count as in AlertEngine.
+        self.lines = [(interval, count) for interval in self.intervals for count in sorted(counts_by_interval[interval])]
+        self.line_names = ["%s_%d" % line for line in self.lines]
+        # Adjacent lines of an interval as rows (j, j + 1).
+        self.pair_rows = numpy.array([j for j in range(len(self.lines) - 1) if self.lines[j][0] == self.lines[j + 1][0]], dtype = numpy.int64)
+        # Records of every interval needed for the longest line now and slope_lookback records ago.
+        self.records = dict((interval, max(counts_by_interval[interval]) + slope_lookback) for interval in self.intervals)
+
+    """
+    Scan codes with price data saved at csv_base_name_format % code, see HistDataBackfill.csv_path.
+    Only the last records are read, straight from price stores where there are any. Return the ranking, see rank.
+    """
+    def scan_saved(self, codes, csv_base_name_format = "%s"):
+        def read(code, interval):
+            return MovingAverageScreener.read_saved(HistDataBackfill.csv_path(csv_base_name_format, code, interval), self.records[interval])
+        return self.__scan(list(codes), read)
+
+    """
+    Scan {code: {interval: DataFrame}} of price data, e.g. the results of HistDataBackfill.run, or
+    dict((code, price_data.price_data) for code, price_data in universe.price_data.items()) of a PriceDataUniverse.
+    Return the ranking, see rank.
+    """
+    def scan(self, price_data_by_code):
+        def read(code, interval):
+            df = price_data_by_code[code].get(interval)
+            if df is None or len(df) == 0:
+                return None
+            df = df.iloc[-self.records[interval]:]
+            return (numpy.asarray(df.index, dtype = object).astype("datetime64[s]"), df["close"].to_numpy(dtype = numpy.float64))
+        return self.__scan(list(price_data_by_code.keys()), read)
+
+    """ (datetime64 close times, float64 closes) of the last records saved at csv_path, or None if there is no saved data. """
+    @staticmethod
+    def read_saved(csv_path, records):
+        loader = price_data_loader_china.get()
+        if not loader.has_saved_data(csv_path):
+            return None
+        store = loader.get_price_store(csv_path)
+        if store.exists():
+            return (store.read_dates(records), store.read_column("close", records))
+        df = loader.read_csv(csv_path, index_col = 0).iloc[-records:]
+        return (numpy.asarray(df.index, dtype = object).astype("datetime64[s]"), df["close"].to_numpy(dtype = numpy.float64))
+
+    def __scan(self, codes, read):
+        chunks = []
+        for start in range(0, len(codes), self.chunk_size):
+            chunk = codes[start:start + self.chunk_size]
+            chunks.append(self.screen(dict((interval, [read(code, interval) for code in chunk]) for interval in self.intervals)))
+        if not chunks:
+            chunks.append(self.screen(dict((interval, []) for interval in self.intervals)))
+        columns = dict((name, numpy.concatenate([chunk[name] for chunk in chunks])) for name in chunks[0].keys())
+        return self.rank(codes, columns)
+
+    """
+    Screen one chunk of codes from {interval: [(close times, closes) or None, ...]} with the records of every code in order.
+    Return {column: array} with a value for every code, see rank for the columns.
+    """
+    def screen(self, records_by_interval):
+        codes = len(records_by_interval[self.intervals[0]])
+        ma = numpy.full((len(self.lines), codes), numpy.nan)
+        previous_ma = numpy.full((len(self.lines), codes), numpy.nan)
+        last_times = numpy.full((len(self.intervals), codes), numpy.datetime64("NaT"), dtype = "datetime64[s]")
+        last_closes = numpy.full((len(self.intervals), codes), numpy.nan)
+        j = 0
+        for k, interval in enumerate(self.intervals):
+            sums, valid_from, last_times[k], last_closes[k] = self.matrix(interval, records_by_interval[interval])
+            end = self.records[interval]
+            lag = end - self.slope_lookback
+            while j < len(self.lines) and self.lines[j][0] == interval:
+                count = self.lines[j][1]
+                ma[j] = numpy.where(valid_from <= end - count, (sums[:, end] - sums[:, end - count]) / count, numpy.nan)
+                previous_ma[j] = numpy.where(valid_from <= lag - count, (sums[:, lag] - sums[:, lag - count]) / count, numpy.nan)
+                j += 1
+
+        # Price is the close of the latest record of any interval, NaT sorts first. Daily records close at the afternoon close.
+        if "day" in self.intervals:
+            hour, minute, second = TradingDateTime.CHINA_AFTERNOON_CLOSE
+            last_times[self.intervals.index("day")] += numpy.timedelta64(hour * 3600 + minute * 60 + second, "s")
+        latest = numpy.argmax(last_times.view(numpy.int64), axis = 0)
+        columns = numpy.arange(codes)
+        price = last_closes[latest, columns]
+        time = last_times[latest, columns]
+        dates = numpy.full(codes, None, dtype = object)
+        for k, interval in enumerate(self.intervals):
+            mask = (latest == k) & ~numpy.isnat(time)
+            if mask.any():
+                dates[mask] = MovingAverageScreener.format_times(interval, time[mask])
+
+        with numpy.errstate(divide = "ignore", invalid = "ignore"):
+            distances = price / ma - 1
+            position = MovingAverageScreener.balance(distances)
+            alignment = MovingAverageScreener.balance(ma[self.pair_rows] - ma[self.pair_rows + 1])
+            slope = MovingAverageScreener.balance(ma - previous_ma)
+            components = numpy.stack((position, alignment, slope))
+            known = (~numpy.isnan(components)).sum(axis = 0)
+            trend_strength = numpy.where(known > 0, numpy.nansum(components, axis = 0) / numpy.maximum(known, 1), numpy.nan)
+            # The lowest line above price.
+            above_price = numpy.where(distances < 0, ma, numpy.inf)
+            nearest = numpy.argmin(above_price, axis = 0)
+            resistance = above_price[nearest, columns]
+            has_resistance = numpy.isfinite(resistance)
+            resistance = numpy.where(has_resistance, resistance, numpy.nan)
+            resistance_distance = resistance / price - 1
+        resistance_line = numpy.full(codes, None, dtype = object)
+        resistance_line[has_resistance] = numpy.array(self.line_names, dtype = object)[nearest[has_resistance]]
+
+        result = {"date": dates, "time": time, "price": price, "trend_strength": trend_strength, "position": position,
+            "alignment": alignment, "slope": slope, "resistance": resistance, "resistance_line": resistance_line,
+            "resistance_distance": resistance_distance}
+        for name, row in zip(self.line_names, distances):
+            result[name] = row
+        return result
+
+    """
+    Lay out records of interval for many codes. Return (cumulative sums of closes as (codes x records + 1) with leading zeros, first
+    column of the contiguous records ending at the last one for every code, last close time, last close).
+    """
+    def matrix(self, interval, records):
+        width = self.records[interval]
+        codes = len(records)
+        closes = numpy.zeros((codes, width))
+        valid_from = numpy.full(codes, width, dtype = numpy.int64)
+        last_times = numpy.full(codes, numpy.datetime64("NaT"), dtype = "datetime64[s]")
+        last_closes = numpy.full(codes, numpy.nan)
+        edges = []
+        for i, r in enumerate(records):
+            if r is None or len(r[1]) == 0:
+                continue
+            times, values = r
+            closes[i, width - len(values):] = values
+            valid_from[i] = width - len(values)
+            last_times[i] = times[-1]
+            last_closes[i] = values[-1]
+            edges.append((i, times[0], times[-1]))
+        if edges:
+            have_records = numpy.array([i for i, _, _ in edges], dtype = numpy.int64)
+            ordinals = trading_date_time.intervalCloseOrdinals(interval,
+                numpy.array([first for _, first, _ in edges] + [last for _, _, last in edges], dtype = "datetime64[s]"))
+            first_ordinals, last_ordinals = numpy.split(ordinals, 2)
+            # Records are in order without duplicates, so the records of a code are contiguous when its first and last ordinals are
+            # as far apart as its records. Only the other codes have all of their records converted to ordinals to find the last hole.
+            broken = (first_ordinals < 0) | (last_ordinals < 0) | (last_ordinals - first_ordinals != width - valid_from[have_records] - 1)
+            for i in have_records[broken].tolist():
+                ordinals = trading_date_time.intervalCloseOrdinals(interval, records[i][0])
+                # Records off the session grid, e.g. beyond the trading calendar, don't make a hole, as in GapIndex.
+                holes = numpy.flatnonzero((ordinals[1:] >= 0) & (ordinals[:-1] >= 0) & (ordinals[1:] - ordinals[:-1] != 1))
+                if len(holes) > 0:
+                    valid_from[i] += holes[-1] + 1
+        sums = numpy.zeros((codes, width + 1))
+        numpy.cumsum(closes, axis = 1, out = sums[:, 1:])
+        return (sums, valid_from, last_times, last_closes)
+
+    """ Per code (positives - negatives) / knowns of a (rows x codes) matrix, NaN if nothing is known. """
+    @staticmethod
+    def balance(values):
+        known = (~numpy.isnan(values)).sum(axis = 0)
+        balance = (values > 0).sum(axis = 0) - (values < 0).sum(axis = 0)
+        return numpy.where(known > 0, balance / numpy.maximum(known, 1), numpy.nan)
+
+    @staticmethod
+    def format_times(interval, times):
+        if interval == "day":
+            return numpy.datetime_as_string(times, unit = "D").astype(object)
+        return numpy.char.replace(numpy.datetime_as_string(times, unit = "s"), "T", " ").astype(object)
+
+    """
+    Rank codes from the {column: array} of screen, strongest trend first and, with equal trend, most room to the nearest resistance
+    first, codes above all lines before any. Return a DataFrame indexed by code with columns date, price, stale, trend_strength,
+    position, alignment, slope, resistance, resistance_line, resistance_distance and the distance to every line.
+    """
+    def rank(self, codes, columns):
+        time = columns.pop("time")
+        days = time.astype("datetime64[D]")
+        known_days = days[~numpy.isnat(days)]
+        stale = numpy.isnat(days)
+        if len(known_days) > 0:
+            stale |= days < known_days.max()
+        columns["stale"] = stale
+        trend_strength = numpy.where(numpy.isnan(columns["trend_strength"]), -numpy.inf, columns["trend_strength"])
+        room = numpy.where(numpy.isnan(columns["resistance"]), numpy.inf, columns["resistance_distance"])
+        room = numpy.where(numpy.isnan(room), -numpy.inf, room)
+        order = numpy.lexsort((-room, -trend_strength))
+        names = ["date", "price", "stale", "trend_strength", "position", "alignment", "slope", "resistance", "resistance_line",
+            "resistance_distance"] + self.line_names
+        index = pandas.Index(numpy.asarray(codes, dtype = object)[order], name = "code")
+        return pandas.DataFrame(dict((name, columns[name][order]) for name in names), index = index, columns = names)
@@ -0,0 +1,146 @@
+from Metrics import metrics
+from TradingDateTime import trading_date_time
+
+import PriceDataLoader
+
+import asyncio
+import datetime
+import signal
+import time
+
+class PollingScheduler(object):
+    """
+    Asyncio polling of realtime and history price data, for a PriceData or a PriceDataUniverse.
+    History data is polled right after every close of hist_data_interval, and polled again with a backoff from hist_data_retry_delay
+    up to max_hist_data_retry_delay seconds until the closed records arrive, but not beyond the next close. Realtime data is polled
+    every realtime_polling_interval seconds while realtime data is available. Both sleep until the next trading session otherwise.
+    Blocking loader calls run in an executor so that the two polls never wait for each other, and stop() wakes every sleep at once.
+    Nothing is printed on the polling path: price data publishes ticks, closed records and moving averages to the event bus,
+    see EventBus and EventConsole.
+    """
+
+    def __init__(self, price_data, realtime_polling_interval = 20, hist_data_interval = "5min", hist_data_delay = 1, executor = None,
+            on_hist_data_updated = None, hist_data_retry_delay = 1, max_hist_data_retry_delay = 30):
+        self.price_data = price_data
+        self.realtime_polling_interval = realtime_polling_interval
+        self.hist_data_interval = hist_data_interval
+        # Seconds to wait after an interval close, so that the data source has the closed record.
+        self.hist_data_delay = hist_data_delay
+        self.executor = executor
+        # Called in the executor after every history data poll, e.g. to save a snapshot.
+        self.on_hist_data_updated = on_hist_data_updated
+        # Seconds before the first retry of a history data poll which missed closed records, doubled up to max_hist_data_retry_delay.
+        self.hist_data_retry_delay = hist_data_retry_delay
+        self.max_hist_data_retry_delay = max_hist_data_retry_delay
+        self.__loop = None
+        self.__stop_event = None
+
+    """ Run both polls until stop() is called or one of them fails. Blocks the calling thread. """
+    def run(self):
+        asyncio.run(self.run_async())
+
+    async def run_async(self):
+        self.__loop = asyncio.get_running_loop()
+        self.__stop_event = asyncio.Event()
+        for signal_number in (signal.SIGINT, signal.SIGTERM):
+            try:
+                self.__loop.add_signal_handler(signal_number, self.__stop_event.set)
+            except (NotImplementedError, RuntimeError, ValueError):
+                # Signal handlers are not supported on this platform or outside of the main thread.
+                pass
+        tasks = [asyncio.ensure_future(self.realtime_price_polling()), asyncio.ensure_future(self.history_price_data_polling())]
+        try:
+            done, _ = await asyncio.wait(tasks, return_when = asyncio.FIRST_COMPLETED)
+            if not self.__stop_event.is_set():
+                print("At least one of the polling tasks finished.")
+            self.__stop_event.set()
+            await asyncio.gather(*tasks, return_exceptions = True)
+            for task in done:
+                if task.exception() is not None:
+                    raise task.exception()
+        finally:
+            for signal_number in (signal.SIGINT, signal.SIGTERM):
+                try:
+                    self.__loop.remove_signal_handler(signal_number)
+                except (NotImplementedError, RuntimeError, ValueError):
+                    pass
+
+    """ Ask both polls to finish. Safe to call from any thread. """
+    def stop(self):
+        if self.__loop is not None and self.__stop_event is not None:
+            self.__loop.call_soon_threadsafe(self.__stop_event.set)
+
+    def stopped(self):
+        return self.__stop_event is not None and self.__stop_event.is_set()
+
+    """ Sleep for seconds unless stopped earlier. Return True if stopped. """
+    async def sleep(self, seconds):
+        try:
+            await asyncio.wait_for(self.__stop_event.wait(), timeout = max(0.0, seconds))
+        except asyncio.TimeoutError:
+            pass
+        return self.__stop_event.is_set()
+
+    """ Sleep until the given time of China, measured with the loader's clock. Return True if stopped. """
+    async def sleep_until(self, timeChina):
+        nowChina = PriceDataLoader.price_data_loader_china.get().now()
+        # Compare wall clock times without tzinfo: datetimes built by TradingDateTime may carry a different utc offset of the same zone.
+        seconds = (timeChina.replace(tzinfo = None) - nowChina.replace(tzinfo = None)).total_seconds()
+        return await self.sleep(seconds)
+
+    async def call(self, function, *args):
+        return await self.__loop.run_in_executor(self.executor, function, *args)
+
+    async def realtime_price_polling(self):
+        while not self.stopped():
+            nowChina = PriceDataLoader.price_data_loader_china.get().now()
+            if not trading_date_time.isRealtimeDataAvailableChina(nowChina):
+                if await self.sleep_until(trading_date_time.nextRealtimeDataAvailableTimeChina(nowChina)):
+                    break
+                continue
+            start_time = time.perf_counter()
+            await self.call(self.price_data.update_realtime)
+            seconds = time.perf_counter() - start_time
+            metrics.observe("polling.realtime_cycle", seconds)
+            # Polls which could not start on time because the cycle took longer than the polling interval.
+            if seconds > self.realtime_polling_interval:
+                metrics.increment("polling.missed_realtime_polls", int(seconds // self.realtime_polling_interval))
+            if await self.sleep(self.realtime_polling_interval):
+                break
+
+    async def history_price_data_polling(self):
+        while not self.stopped():
+            nowChina = PriceDataLoader.price_data_loader_china.get().now()
+            next_close = trading_date_time.nextIntervalCloseTimeChina(self.hist_data_interval, nowChina)
+            if await self.poll_hist_data(next_close):
+                break
+            # An interval close passed while the cycle was running, so its records wait for the next cycle.
+            if PriceDataLoader.price_data_loader_china.get().now().replace(tzinfo = None) > next_close.replace(tzinfo = None):
+                metrics.increment("polling.missed_intervals")
+            if await self.sleep_until(next_close) or await self.sleep(self.hist_data_delay):
+                break
+
+    """
+    Update history data, and again with a backoff while the data source doesn't have the closed records yet, until they arrive or
+    a retry would be after next_close, where the next cycle takes over. Return True if stopped.
+    """
+    async def poll_hist_data(self, next_close):
+        retry_delay = self.hist_data_retry_delay
+        while True:
+            nowChina = PriceDataLoader.price_data_loader_china.get().now()
+            with metrics.timer("polling.hist_data_cycle"):
+                await self.call(self.price_data.update_hist_data, nowChina)
+            missing = await self.call(self.price_data.missing_hist_data, nowChina)
+            if not missing:
+                break
+            retry_time = PriceDataLoader.price_data_loader_china.get().now().replace(tzinfo = None) + datetime.timedelta(seconds = retry_delay)
+            if retry_time >= next_close.replace(tzinfo = None):
+                metrics.increment("polling.late_hist_data", len(missing))
+                break
+            metrics.increment("polling.hist_data_retries")
+            if await self.sleep(retry_delay):
+                return True
+            retry_delay = min(2 * retry_delay, self.max_hist_data_retry_delay)
+        if self.on_hist_data_updated is not None:
+            await self.call(self.on_hist_data_updated)
+        return self.stopped()
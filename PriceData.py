@@ -1,11 +1,18 @@
+from BarAggregator import BarAggregator
+from BarBuilder import BarBuilder
+from EventBus import BarClosedEvent, MaUpdatedEvent, TickEvent, event_bus
+from GapIndex import GapIndex
+from Metrics import metrics
 from TradingDateTime import TradingDateTime, trading_date_time
 from PriceDataLoader import price_data_loader_china
 
+import numpy
 import pandas
 
 import atexit
 import datetime
-import os
+import threading
+import time
 
 class PriceData(object):
     """For A shares traded in Shanghai / Shenzhen."""
@@ -14,13 +21,30 @@ class PriceData(object):
     INTERVALS = [DAY, "5min", "15min", "30min", "60min"]
     INTERVAL_TO_REQUEST_MAP = {DAY : "D", "5min" : "5", "15min" : "15", "30min" : "30", "60min" : "60"}
 
-    def __init__(self, code, csv_base_name, now = None):
+    def __init__(self, code, csv_base_name, now = None, aggregate_locally = False, build_bars_from_ticks = False):
         self.code = code
         self.csv_base_name = csv_base_name
+        # With aggregate_locally, only 5min data is downloaded and other intervals are built from it, see BarAggregator.
+        self.bar_aggregator = BarAggregator() if aggregate_locally else None
+        # With build_bars_from_ticks, closed records are built from realtime quotes instead of waiting for download, see BarBuilder.
+        self.bar_builder = BarBuilder(self.source_intervals()) if build_bars_from_ticks else None
+        # interval -> close of the first provisional record, i.e. records built from realtime quotes and records aggregated from them,
+        # which are never saved and are replaced by downloaded records, see append_built_bars.
+        self.provisional_closes = {}
         # Simple moving average.
         self.sma = None
+        # Other incremental indicators, see IndicatorPipeline.
+        self.indicators = None
         # Realtime price data.
         self.realtime_price_data = {}
+        # Merge downloaded data by reconciling only the overlap with the stored tail, see tail_merge_price_data.
+        self.tail_merge = True
+        # Holes in price data of every interval, and whether to request their missing records on every update, see backfill_gaps.
+        self.gap_index = GapIndex()
+        self.backfill_gaps_on_update = True
+        # Held while price data changes, and while it's pickled, since the polls and snapshots run in executor threads, see
+        # PollingScheduler. Downloads run without it, so that realtime updates don't wait for them.
+        self.lock = threading.RLock()
 
         if (self.csv_base_name is not None):
             self.initiate_from_csv(csv_base_name)
@@ -34,22 +58,59 @@ class PriceData(object):
     """ Initiate from saved csv file but fall back to downloading in case of missing files """
     def initiate_from_csv(self, csv_base_name):
         self.price_data = {}
+        missing_intervals = []
         for interval in PriceData.INTERVALS:
             df = self.__load_data_frame_from_csv("%s_%s.csv" % (self.csv_base_name, interval))
             if df is None:
-                df = self.get_hist_data_by_interval(interval)
-            self.price_data[interval] = df
+                missing_intervals.append(interval)
+            else:
+                self.price_data[interval] = df
+        missing_source_intervals = [interval for interval in missing_intervals if interval in self.source_intervals()]
+        if missing_source_intervals:
+            self.price_data.update(self.download_hist_data_by_intervals(missing_source_intervals))
+        self.aggregate_hist_data(missing_intervals)
 
+        self.index_gaps()
         self.initiate()
 
     def initiate_hist_data_from_web(self):
         self.price_data = self.download_hist_data()
+        self.aggregate_hist_data(PriceData.INTERVALS)
+        self.index_gaps()
         self.initiate()
 
-    def download_hist_data(self):
-        price_data = {}
+    def index_gaps(self):
         for interval in PriceData.INTERVALS:
-            price_data[interval] = self.get_hist_data_by_interval(interval)
+            self.gap_index.build(interval, self.price_data[interval].index)
+
+    """ Intervals downloaded from the data source. """
+    def source_intervals(self):
+        if self.bar_aggregator is not None:
+            return [self.bar_aggregator.base_interval]
+        return PriceData.INTERVALS
+
+    """ Download all source intervals concurrently. """
+    def download_hist_data(self):
+        return self.download_hist_data_by_intervals(self.source_intervals())
+
+    """ Build intervals which are not downloaded from the base interval. """
+    def aggregate_hist_data(self, intervals):
+        if self.bar_aggregator is None:
+            return
+        base_data = self.price_data[self.bar_aggregator.base_interval]
+        for interval in intervals:
+            if interval not in self.source_intervals():
+                self.price_data[interval] = self.bar_aggregator.extend(interval, self.price_data.get(interval), base_data)
+
+    def download_hist_data_by_intervals(self, intervals):
+        # Import here to break circular dependency.
+        from HistDataBackfill import HistDataBackfill
+        backfill = HistDataBackfill(max_processes = 0)
+        price_data = backfill.run([self.code], intervals)[self.code]
+        if backfill.failures:
+            raise Exception("Failed to download %s data of %s." % (", ".join(interval for (_, interval, _) in backfill.failures), self.code))
+        for interval in intervals:
+            print("last price record:\n%s" % self.get_last_price_record(price_data[interval]))
         return price_data
 
     """ DEPRECATED: Download from ifeng. ifeng_hist_data may not give data of the current trading day! """
@@ -59,14 +120,27 @@ class PriceData(object):
     """ WARNING: tencent data sometimes contain gaps, make sure to discard data before gap when calculating indicators such as moving average. """
     def get_tencent_hist_data_by_interval(self, interval):
         data = price_data_loader_china.get().get_k_data(code = self.code, ktype = PriceData.INTERVAL_TO_REQUEST_MAP[interval])
+        return PriceData.normalize_tencent_hist_data(data, interval)
 
-        if interval.endswith("min"):
+    """ Download records of interval between start and end days (YYYY-MM-DD), both included, to fill holes. """
+    def get_tencent_hist_data_by_range(self, interval, start, end):
+        data = price_data_loader_china.get().get_k_data(code = self.code, start = start, end = end, ktype = PriceData.INTERVAL_TO_REQUEST_MAP[interval])
+        if data is None or len(data.index) == 0:
+            return None
+        return PriceData.normalize_tencent_hist_data(data, interval)
+
+    """
+    Turn a get_k_data response into price data indexed by date in increasing order.
+    A pure function of its arguments, so that it can run in a worker process, see HistDataBackfill.
+    """
+    @staticmethod
+    def normalize_tencent_hist_data(data, interval):
+        if interval.endswith("min") and len(data.index) > 0:
             # Fix date format for minute intervals.
-            size = len(data.index)
-            for i in range(size):
-                data.at[i, "date"] = "%s:00" % data.at[i, "date"]
+            data = data.reset_index(drop = True)
+            data["date"] = data["date"].astype(str) + ":00"
             # Remove irregular data. Tecent data gives one more minute record for current minute interval when trading!
-            i = size - 1
+            i = len(data.index) - 1
             last_datetime = datetime.datetime.strptime(data.at[i, "date"], TradingDateTime.DATETIME_STRFTIME)
             close_datetime = trading_date_time.closeTimeOfCurrentMinuteIntervalChina(int(interval[:-3]), last_datetime)
             if last_datetime != close_datetime:
@@ -75,62 +149,352 @@ class PriceData(object):
         data = data.set_index("date").sort_index()
         return data
 
-    def merge_tencent_hist_data(self, interval):
-        data = self.get_hist_data_by_interval(interval)
+    """ Merge data downloaded for interval, which is downloaded if it's None. """
+    def merge_tencent_hist_data(self, interval, data = None):
+        if data is None:
+            data = self.get_hist_data_by_interval(interval)
+        if self.tail_merge:
+            merged = self.tail_merge_price_data(self.price_data[interval], data)
+            if merged is not None:
+                self.price_data[interval] = merged
+                return
+        filled = data.index[data.index.isin(self.gap_index.missing_closes(interval))]
         merged = pandas.merge(self.price_data[interval].reset_index(), data.reset_index(), how = "outer").set_index("date")
         # Dedup because data record from long ago in two responses sometimes are different.
         # This is one issue of Tencent data source. One record must be wrong and we take the newest value.
         deduped = merged[~merged.index.duplicated(keep = "last")]
         # Tencent data may can contain gap within data records so we must sort after merging.
         self.price_data[interval] = deduped.sort_index()
+        if len(filled) > 0:
+            self.gap_index.fill(interval, filled)
+            self.process_backfilled_records(interval, filled)
 
+    """
+    Merge downloaded data by only reconciling the overlap between the tail of stored price data and the download, then appending
+    the new records. Return None if the overlap contains records missing from price_data or records with different values,
+    in which case a full merge is needed.
+    """
+    def tail_merge_price_data(self, price_data, data):
+        if len(price_data.index) == 0 or len(data.index) == 0 or not data.index.is_monotonic_increasing or data.index.has_duplicates:
+            return None
+        last_datetime_str = price_data.index[-1]
+        # Downloaded records up to the last stored record are the overlap.
+        overlap_end = data.index.searchsorted(last_datetime_str, side = "right")
+        if overlap_end > 0:
+            overlap = data.iloc[:overlap_end]
+            window = price_data.iloc[price_data.index.searchsorted(overlap.index[0]):]
+            if not overlap.index.isin(window.index).all():
+                print("Downloaded %s data fills records missing before %s, do full merge." % (self.code, last_datetime_str))
+                return None
+            stored = window.loc[overlap.index]
+            for column in overlap.columns:
+                if column not in stored.columns:
+                    return None
+                new_values = overlap[column].to_numpy()
+                old_values = stored[column].to_numpy()
+                if new_values.dtype.kind in "biuf" and old_values.dtype.kind in "biuf":
+                    same = ((new_values == old_values) | (pandas.isnull(new_values) & pandas.isnull(old_values))).all()
+                else:
+                    same = (new_values.astype(str) == old_values.astype(str)).all()
+                if not same:
+                    print("Downloaded %s data restates %s before %s, do full merge." % (self.code, column, last_datetime_str))
+                    return None
+        if overlap_end == len(data.index):
+            return price_data
+        return pandas.concat([price_data, data.iloc[overlap_end:]])
+
+    @metrics.timed("price_data.update_hist_data")
     def update_hist_data(self, now):
-        last_closed_day = trading_date_time.lastClosedDayChina(now)
-        # Check for daily data.
-        if last_closed_day > self.__get_last_datetime(PriceData.DAY):
-            self.merge_hist_data(PriceData.DAY)
+        self.flush_built_bars(now)
+        for interval in self.missing_hist_data(now):
+            self.merge_hist_data(interval)
 
-        # Check for minutes data.
-        for interval in PriceData.INTERVALS:
-            if (interval.endswith("min")):
-                interval_min = int(interval[:-3])
-                last_interval_close = trading_date_time.lastClosedMinuteIntervalTimeChina(interval_min, now)
-                if (last_interval_close.strftime(TradingDateTime.DATETIME_STRFTIME) > self.__get_last_datetime(interval)):
-                    self.merge_hist_data(interval)
+        if self.backfill_gaps_on_update:
+            self.backfill_gaps()
+
+    """ Source intervals whose last closed record at now is not in price data yet, daily data first. """
+    def missing_hist_data(self, now = None):
+        missing = []
+        with self.lock:
+            for interval in self.source_intervals():
+                if interval == PriceData.DAY:
+                    last_close = trading_date_time.lastClosedDayChina(now)
+                else:
+                    last_close = trading_date_time.lastClosedMinuteIntervalTimeChina(int(interval[:-3]), now).strftime(TradingDateTime.DATETIME_STRFTIME)
+                if last_close > self.last_confirmed_datetime(interval):
+                    missing.append(interval)
+        return missing
+
+    """
+    Fill holes of source intervals which were not requested yet. Daily records are requested by range, one request per run of
+    trading days with holes. The minute endpoint ignores the range and only gives its recent records, so minute holes are all
+    requested at once. Only the missing records of the responses are inserted. Return the number of inserted records.
+    Holes which the data source can't fill are recorded as unfillable and not requested again, see GapIndex.unfillable.
+    """
+    @metrics.timed("price_data.backfill_gaps")
+    def backfill_gaps(self):
+        inserted = 0
+        for interval in self.source_intervals():
+            with self.lock:
+                gaps = self.gap_index.pending(interval)
+                if len(gaps) == 0:
+                    continue
+                missing = pandas.Index(self.gap_index.missing_closes(interval, gaps))
+            print("Request %d missing records in %d holes of %s data of %s." % (len(missing), len(gaps), interval, self.code))
+            ranges = PriceData.request_ranges(missing)
+            if interval != PriceData.DAY and len(ranges) > 0:
+                ranges = [(ranges[0][0], ranges[-1][1])]
+            records = []
+            failed = False
+            for start, end in ranges:
+                try:
+                    data = self.get_tencent_hist_data_by_range(interval, start, end)
+                except Exception as e:
+                    print("Failed to download %s data of %s between %s and %s: %s" % (interval, self.code, start, end, e))
+                    failed = True
+                    continue
+                if data is not None:
+                    records.append(data[data.index.isin(missing)])
+            with self.lock:
+                # Holes of failed requests stay pending, so that they are requested again on the next update.
+                if not failed:
+                    self.gap_index.mark_requested(interval, gaps)
+                filled = self.insert_records(interval, pandas.concat(records)) if records else 0
+            inserted += filled
+            if not failed and filled < len(missing):
+                print("%d missing records of %s data of %s can't be filled by the data source." % (len(missing) - filled, interval, self.code))
+                metrics.increment("price_data.unfillable_records", len(missing) - filled)
+        return inserted
+
+    """ Ranges of days (start, end) covering the missing close datetime strings, one range per run of adjacent trading days. """
+    @staticmethod
+    def request_ranges(missing_closes):
+        days = numpy.unique(numpy.asarray(missing_closes, dtype = object).astype(str).astype("U10")).astype(object)
+        day_ordinals = trading_date_time.intervalCloseOrdinals(PriceData.DAY, days)
+        runs = GapIndex.runs(day_ordinals[day_ordinals >= 0])
+        return [(trading_date_time.intervalCloseFromOrdinal(PriceData.DAY, int(start)), trading_date_time.intervalCloseFromOrdinal(PriceData.DAY, int(end) - 1))
+            for (start, end) in runs.tolist()]
+
+    """ Insert records into holes of interval. Return the number of inserted records. """
+    def insert_records(self, interval, records):
+        data = self.price_data[interval]
+        records = records[~records.index.duplicated(keep = "last") & ~records.index.isin(data.index)]
+        if len(records.index) == 0:
+            return 0
+        self.price_data[interval] = pandas.concat([data, records]).sort_index()
+        print("Filled %d records in holes of %s data of %s." % (len(records.index), interval, self.code))
+        self.gap_index.fill(interval, records.index)
+        self.process_backfilled_records(interval, records.index)
+        return len(records.index)
+
+    """ Save, update sma and indicators, and fill coarser intervals after records in dates were inserted into holes of interval. """
+    def process_backfilled_records(self, interval, dates):
+        if self.csv_base_name is not None:
+            self.__save_interval(interval)
+        if self.sma is not None:
+            self.sma.backfill_price_records(interval, self.price_data[interval])
+        if self.indicators is not None:
+            self.indicators.backfill_price_records(interval, self.price_data[interval])
+        if self.bar_aggregator is not None and interval == self.bar_aggregator.base_interval:
+            base_data = self.price_data[interval]
+            # Coarse records are only built from complete base records, so aggregate the whole days of the inserted records.
+            days = numpy.unique(numpy.asarray(dates, dtype = object).astype(str).astype("U10")).astype(object)
+            starts = base_data.index.searchsorted(days)
+            ends = base_data.index.searchsorted(days + " 99")
+            window = base_data.iloc[numpy.concatenate([numpy.arange(start, end) for start, end in zip(starts, ends)])]
+            for aggregated_interval in PriceData.INTERVALS:
+                if aggregated_interval not in self.source_intervals():
+                    self.insert_records(aggregated_interval, self.bar_aggregator.aggregate(window, aggregated_interval))
 
     def get_hist_data_by_interval(self, interval):
         data = self.get_tencent_hist_data_by_interval(interval)
         print("last price record:\n%s" % self.get_last_price_record(data))
         return data
 
+    @metrics.timed("price_data.merge_hist_data")
     def merge_hist_data(self, interval):
         print("Update data for %s" % interval)
-        # Get the last datetime string of the data before update
-        last_datetime_str = self.get_last_price_record(self.price_data[interval]).name
-        self.merge_tencent_hist_data(interval)
+        data = self.get_hist_data_by_interval(interval)
+        with self.lock:
+            # Downloaded records replace the provisional ones.
+            self.drop_provisional_records(interval)
+            # Get the last datetime string of the data before update
+            last_datetime_str = self.get_last_price_record(self.price_data[interval]).name
+            self.merge_tencent_hist_data(interval, data)
+            self.process_merged_records(interval, last_datetime_str)
+
+    """ Save, update sma and aggregate coarser intervals after records after last_datetime_str are merged into interval. """
+    def process_merged_records(self, interval, last_datetime_str):
+        self.gap_index.append(interval, self.price_data[interval].index)
+        # Save merged records right away so that a crash doesn't lose them. New records are only appended to the store.
+        if self.csv_base_name is not None:
+            self.__save_interval(interval)
         if self.sma is not None:
             self.sma.append_price_records(interval, last_datetime_str, self.price_data[interval])
+        if self.indicators is not None:
+            self.indicators.append_price_records(interval, last_datetime_str, self.price_data[interval])
+        self.publish_closed_records(interval, last_datetime_str)
+        if self.bar_aggregator is not None and interval == self.bar_aggregator.base_interval:
+            for aggregated_interval in PriceData.INTERVALS:
+                if aggregated_interval not in self.source_intervals():
+                    self.merge_aggregated_data(aggregated_interval, last_datetime_str)
+
+    """ Extend interval with records built from base records after last_base_datetime_str. """
+    @metrics.timed("price_data.merge_aggregated_data")
+    def merge_aggregated_data(self, interval, last_base_datetime_str):
+        data = self.price_data.get(interval)
+        last_datetime_str = None if data is None or len(data.index) == 0 else self.get_last_price_record(data).name
+        self.price_data[interval] = self.bar_aggregator.extend(interval, data, self.price_data[self.bar_aggregator.base_interval], last_base_datetime_str)
+        # Records aggregated from provisional base records are provisional too.
+        first_provisional_base = self.provisional_closes.get(self.bar_aggregator.base_interval)
+        if first_provisional_base is not None and interval not in self.provisional_closes:
+            new_records = self.price_data[interval].index
+            if last_datetime_str is not None:
+                new_records = new_records[new_records.searchsorted(last_datetime_str, side = "right"):]
+            for close in new_records:
+                if PriceData.close_datetime_str(interval, close) >= first_provisional_base:
+                    self.provisional_closes[interval] = close
+                    break
+        self.gap_index.append(interval, self.price_data[interval].index)
+        if self.csv_base_name is not None:
+            self.__save_interval(interval)
+        if self.sma is not None:
+            self.sma.append_price_records(interval, last_datetime_str, self.price_data[interval])
+        if self.indicators is not None:
+            self.indicators.append_price_records(interval, last_datetime_str, self.price_data[interval])
+        self.publish_closed_records(interval, last_datetime_str)
+
+    """ Publish records of interval after last_datetime_str and the moving averages at the last one, see EventBus. """
+    def publish_closed_records(self, interval, last_datetime_str):
+        if event_bus.wants(BarClosedEvent):
+            data = self.price_data[interval]
+            new_records = data if last_datetime_str is None else data.iloc[data.index.searchsorted(last_datetime_str, side = "right"):]
+            for close, record in new_records.to_dict("index").items():
+                event_bus.publish(BarClosedEvent(self.code, interval, close, record))
+        if self.sma is not None and event_bus.wants(MaUpdatedEvent):
+            event_bus.publish(MaUpdatedEvent(self.code, interval, False, self.sma.current_values(interval)))
 
     def save_csv(self):
-        for interval in PriceData.INTERVALS:
-            self.__save_data_frame_to_csv(self.price_data[interval], "%s_%s.csv" % (self.csv_base_name, interval))
+        if self.csv_base_name is None:
+            return
+        with self.lock:
+            for interval in PriceData.INTERVALS:
+                self.__save_interval(interval)
     
     def update_realtime(self, fakeNow = None):
         if not trading_date_time.isRealtimeDataAvailableChina(fakeNow):
             print("Not requesting realtime data because trade has closed.")
+            self.flush_built_bars(fakeNow)
             return
+        start_time = time.perf_counter()
         data = price_data_loader_china.get().get_realtime_quotes(self.code).iloc[0]
-        print(data)
-        price = float(data["price"])
-        time_str = "%s %s" % (data["date"], data["time"])
-        for interval in PriceData.INTERVALS:
-            self.__update_realtime_at_interval(interval, price, time_str)
+        self.update_realtime_with_quote(data)
+        # Latency from requesting the quote to realtime moving averages updated with it.
+        metrics.observe("price_data.tick_to_ma", time.perf_counter() - start_time)
+
+    """ Update realtime data with one row of get_realtime_quotes, which may come from a request for many codes. """
+    @metrics.timed("price_data.update_realtime_with_quote")
+    def update_realtime_with_quote(self, data):
+        with self.lock:
+            price = float(data["price"])
+            time_str = "%s %s" % (data["date"], data["time"])
+            if event_bus.wants(TickEvent):
+                event_bus.publish(TickEvent(self.code, time_str, price, data))
+            for interval in PriceData.INTERVALS:
+                self.__update_realtime_at_interval(interval, price, time_str)
+            if self.bar_builder is not None:
+                volume = data.get("volume", None)
+                finalized = self.bar_builder.update(price, time_str, None if volume in (None, "") else float(volume))
+                self.append_built_bars(finalized)
+            if self.sma is not None:
+                self.sma.update_realtime(self.realtime_price_data)
+                if event_bus.wants(MaUpdatedEvent):
+                    for interval in self.realtime_price_data.keys():
+                        event_bus.publish(MaUpdatedEvent(self.code, interval, True, self.sma.current_values(interval, realtime = True)))
+            if self.indicators is not None:
+                self.indicators.update_realtime(self.realtime_price_data)
+
+    """ Finalize built bars whose intervals have closed at now. """
+    def flush_built_bars(self, now = None):
+        if self.bar_builder is not None:
+            with self.lock:
+                self.append_built_bars(self.bar_builder.flush(trading_date_time.nowChina() if now is None else now))
+
+    """ Append finalized bars [(interval, close datetime string, bar), ...] which are newer than the last price records. """
+    @metrics.timed("price_data.append_built_bars")
+    def append_built_bars(self, finalized):
+        for interval, close_str, bar in finalized:
+            data = self.price_data[interval]
+            last_datetime_str = self.get_last_price_record(data).name
+            if close_str <= last_datetime_str:
+                continue
+            # Other columns such as code are taken from the last record.
+            record = {}
+            for column in data.columns:
+                if column in bar:
+                    record[column] = [float("nan") if bar[column] is None else bar[column]]
+                else:
+                    record[column] = [data[column].iat[-1]]
+            record = pandas.DataFrame(record, index = pandas.Index([close_str], name = data.index.name), columns = data.columns)
+            self.price_data[interval] = pandas.concat([data, record])
+            self.provisional_closes.setdefault(interval, close_str)
+            print("Built provisional %s record at %s from realtime data." % (interval, close_str))
+            self.process_merged_records(interval, last_datetime_str)
+
+    """ Price data of interval without provisional records. """
+    def confirmed_data(self, interval):
+        data = self.price_data[interval]
+        first_provisional = self.provisional_closes.get(interval)
+        return data if first_provisional is None else data.iloc[:data.index.searchsorted(first_provisional)]
+
+    def last_confirmed_datetime(self, interval):
+        return self.get_last_price_record(self.confirmed_data(interval)).name
+
+    """
+    Remove the provisional records of interval and of the intervals aggregated from it, and roll sma and indicators back to the
+    records left, so that downloaded records are merged in their place.
+    """
+    def drop_provisional_records(self, interval):
+        intervals = [interval]
+        if self.bar_aggregator is not None and interval == self.bar_aggregator.base_interval:
+            intervals += [aggregated for aggregated in PriceData.INTERVALS if aggregated not in self.source_intervals()]
+        for dropped in intervals:
+            if dropped not in self.provisional_closes:
+                continue
+            self.price_data[dropped] = self.confirmed_data(dropped)
+            del self.provisional_closes[dropped]
+            if self.sma is not None:
+                self.sma.truncate_price_records(dropped, self.price_data[dropped])
+            if self.indicators is not None:
+                self.indicators.backfill_price_records(dropped, self.price_data[dropped])
+
+    """ Close datetime string of a record of interval, daily records close at the afternoon close. """
+    @staticmethod
+    def close_datetime_str(interval, close):
+        if interval.endswith("min"):
+            return close
+        return "%s %02d:%02d:%02d" % ((close,) + TradingDateTime.CHINA_AFTERNOON_CLOSE)
+
+    """ Pickle without the lock, see PriceDataSnapshot. """
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        del state["lock"]
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self.lock = threading.RLock()
 
     def set_simple_moving_average(self, sma):
         self.sma = sma
         sma.load_price_data(self.price_data)
 
+    def set_indicator_pipeline(self, indicators):
+        self.indicators = indicators
+        indicators.load_price_data(self.price_data)
+
     """ Print a summary of last price data including history data and realtime data at each interval. """
+    @metrics.timed("price_data.print_realtime_price_summary")
     def print_realtime_price_summary(self):
         for interval in PriceData.INTERVALS:
             print("Last price record of interval %s: %s" % (interval, self.get_last_price_record(self.price_data[interval])))
@@ -139,18 +503,19 @@ class PriceData(object):
                 print("Realtime data at %s: %s" % (interval, self.realtime_price_data[interval]))
 
     """ Print a summary of realtime sma information. """
+    @metrics.timed("price_data.print_realtime_sma_summary")
     def print_realtime_sma_summary(self):
         if self.sma is not None:
             self.sma.print_realtime_sma_summary(self.price_data, self.realtime_price_data)
 
+    @metrics.timed("price_data.print_realtime_indicator_summary")
+    def print_realtime_indicator_summary(self):
+        if self.indicators is not None:
+            self.indicators.print_realtime_indicator_summary()
+
     def __update_realtime_at_interval(self, interval, price, time_str):
         # Compute the close time of the current interval.
-        time = datetime.datetime.strptime(time_str, TradingDateTime.DATETIME_STRFTIME)
-        if interval == PriceData.DAY:
-            this_close = time_str.split(' ')[0]
-        else:
-            this_close = trading_date_time.closeTimeOfCurrentMinuteIntervalChina(
-                int(interval[:-3]), time, check_opening = False).strftime(TradingDateTime.DATETIME_STRFTIME)
+        this_close = trading_date_time.intervalCloseOfDatetime(interval, time_str)
 
         # Obtain interval data. Create if it doesn't exist.
         interval_data = self.realtime_price_data.get(interval, None)
@@ -173,15 +538,16 @@ class PriceData(object):
     def get_last_price_record(self, price_data):
         return price_data.iloc[len(price_data.index) - 1]
 
+    """ Save price data of interval without provisional records. """
+    def __save_interval(self, interval):
+        self.__save_data_frame_to_csv(self.confirmed_data(interval), "%s_%s.csv" % (self.csv_base_name, interval))
+
     def __save_data_frame_to_csv(self, df, csv_path):
         price_data_loader_china.get().save_csv(df, csv_path)
 
     def __load_data_frame_from_csv(self, csv_path):
-        if os.path.exists(csv_path):
+        if price_data_loader_china.get().has_saved_data(csv_path):
             return price_data_loader_china.get().read_csv(csv_path, index_col = 0)
         else:
             print("File not found: %s. Will do fresh download instead." % csv_path)
             return None
-
-    def __get_last_datetime(self, interval):
-        return self.get_last_price_record(self.price_data[interval]).name
@@ -1,35 +1,67 @@
+from Metrics import metrics
+from PriceStore import PriceStore
+
 import pandas
-import tushare as ts
 
 import datetime
+import os
 import pytz
 
+# tushare is heavy to import, so it's only imported on the first request to the data source.
+def import_tushare():
+    import tushare
+    return tushare
+
 # A delegate class of methods to get price data.
 # Program should only call an instance of this class for price data.
+# Calls of the data source and of storage are timed in metrics as loader.<method>.
 class PriceDataLoaderChina(object):
     # For users who do from ... import price_data_loader_china, to make sure that they get
     # the current price_data_loader_china instance.
     def get(self):
         return price_data_loader_china
     def checkInstanceUnchanged(self):
-        equal = self == price_data_loader_china
+        # The installed instance may delegate to this one, e.g. CachingPriceDataLoaderChina.
+        equal = self == price_data_loader_china or getattr(price_data_loader_china, "delegate", None) is self
         if not equal:
             raise Exception()
+    @metrics.timed("loader.get_hist_data")
     def get_hist_data(self, code = None, start = None, end = None, ktype= 'D', retry_count = 3, pause = 0.001):
         self.checkInstanceUnchanged()
-        return ts.stock.trading.get_hist_data(code, start, end, ktype, retry_count, pause)
+        return import_tushare().stock.trading.get_hist_data(code, start, end, ktype, retry_count, pause)
+    @metrics.timed("loader.get_k_data")
     def get_k_data(self, code = None, start = '', end = '', ktype = 'D', autype = 'qfq', index = False, retry_count = 3, pause = 0.001):
         self.checkInstanceUnchanged()
-        return ts.stock.trading.get_k_data(code, start, end, ktype, autype, index, retry_count, pause)
+        return import_tushare().stock.trading.get_k_data(code, start, end, ktype, autype, index, retry_count, pause)
+    @metrics.timed("loader.get_realtime_quotes")
     def get_realtime_quotes(self, symbols = None):
         self.checkInstanceUnchanged()
-        return ts.stock.trading.get_realtime_quotes(symbols)
+        return import_tushare().stock.trading.get_realtime_quotes(symbols)
+    @metrics.timed("loader.get_hs300s")
+    def get_hs300s(self):
+        self.checkInstanceUnchanged()
+        return import_tushare().get_hs300s()
+    # Price records are saved in a columnar PriceStore next to the csv path. A csv file is only read when there is no store yet.
+    def get_price_store(self, csv_path):
+        stores = self.__dict__.setdefault("price_stores", {})
+        if csv_path not in stores:
+            stores[csv_path] = PriceStore(PriceStore.path_of_csv(csv_path))
+        return stores[csv_path]
+    def has_saved_data(self, csv_path):
+        self.checkInstanceUnchanged()
+        return self.get_price_store(csv_path).exists() or os.path.exists(csv_path)
+    @metrics.timed("loader.read_csv")
     def read_csv(self, filepath, **kwargs):
         self.checkInstanceUnchanged()
+        store = self.get_price_store(filepath)
+        if store.exists():
+            # PriceData works with close datetime strings like a csv file gives.
+            return store.read(dates_as_strings = True)
         return pandas.read_csv(filepath, **kwargs)
+    @metrics.timed("loader.save_csv")
     def save_csv(self, df, csv_path):
         self.checkInstanceUnchanged()
-        df.to_csv(csv_path)
+        self.get_price_store(csv_path).write(df)
     def now(self):
         self.checkInstanceUnchanged()
         return datetime.datetime.now(pytz.timezone('Asia/Shanghai'))
@@ -0,0 +1,98 @@
+from FakePriceDataLoader import FakePriceDataLoaderChina
+from PriceData import PriceData
+from SimpleMovingAverage import SimpleMovingAverage
+
+import PriceDataLoader
+
+import contextlib
+import io
+import time
+
+class PriceDataReplay(object):
+    """
+    Replay saved price data through PriceData and SimpleMovingAverage as fast as possible.
+    Every step advances a FakePriceDataLoaderChina by one 5min record, feeds the quote as realtime data, and hands the records
+    closed by then to PriceData as zero-copy prefix views of the saved data, without any sleep.
+    With through_loader, steps instead do what the pollers of CSI300 do, i.e. request and merge data via the loader, which is
+    much slower but exercises the whole download path.
+    """
+
+    def __init__(self, csv_base_name, start_datetime, code = "sh000300", params = SimpleMovingAverage.DEFAULT_PARAMS,
+            through_loader = False, k_data_window = 320, quiet = True):
+        self.csv_base_name = csv_base_name
+        self.start_datetime = start_datetime
+        self.code = code
+        self.params = params
+        self.through_loader = through_loader
+        # get_k_data only returns the last k_data_window records like the data source, so merging costs don't grow with history.
+        self.k_data_window = k_data_window
+        # Discard console output of PriceData during replay.
+        self.quiet = quiet
+        self.loader = None
+        self.price_data = None
+        self.steps = 0
+        self.elapsed = 0.0
+
+    """
+    Replay at most steps 5min records, until end_datetime_str or the end of data. on_step(replay) is called after every step.
+    The fake loader is only installed while running. Return the number of steps done.
+    """
+    def run(self, steps = None, end_datetime_str = None, on_step = None):
+        previous_loader = PriceDataLoader.price_data_loader_china
+        output = io.StringIO() if self.quiet else None
+        start_time = time.perf_counter()
+        done = 0
+        try:
+            with (contextlib.redirect_stdout(output) if self.quiet else contextlib.nullcontext()):
+                if self.loader is None:
+                    self.loader = FakePriceDataLoaderChina(self.start_datetime, self.csv_base_name, self.k_data_window)
+                PriceDataLoader.price_data_loader_china = self.loader
+                if self.price_data is None:
+                    self.price_data = PriceData(self.code, self.csv_base_name, self.loader.now())
+                    self.price_data.set_simple_moving_average(SimpleMovingAverage(self.params))
+                    # Replayed records are prefixes of the saved data and must never be saved over it, even at exit.
+                    self.price_data.csv_base_name = None
+                while steps is None or done < steps:
+                    if end_datetime_str is not None and self.loader.fake_now_str >= end_datetime_str:
+                        break
+                    if not (self.step_through_loader() if self.through_loader else self.step()):
+                        break
+                    done += 1
+                    if on_step is not None:
+                        on_step(self)
+                    if self.quiet:
+                        output.seek(0)
+                        output.truncate()
+        finally:
+            PriceDataLoader.price_data_loader_china = previous_loader
+        self.steps += done
+        self.elapsed += time.perf_counter() - start_time
+        return done
+
+    """ Advance one 5min record and feed the quote and closed records directly. Return False at the end of data. """
+    def step(self):
+        if not self.loader.advance():
+            return False
+        date, time_of_day = self.loader.fake_now_str.split()
+        self.price_data.update_realtime_with_quote({"price": self.loader.fake_now_price(), "date": date, "time": time_of_day})
+        # Records are only sliced when the positional cursor of the loader moved past the records already handed over.
+        for interval in self.price_data.source_intervals():
+            data = self.price_data.price_data[interval]
+            closed_count = self.loader.closed_count(interval)
+            if closed_count > len(data.index):
+                last_datetime_str = data.index[-1]
+                self.price_data.price_data[interval] = self.loader.price_data[interval].iloc[:closed_count]
+                self.price_data.process_merged_records(interval, last_datetime_str)
+        return True
+
+    """ Do what the pollers do: request realtime quotes, then merge history data. Return False at the end of data. """
+    def step_through_loader(self):
+        position = self.loader.fake_now_position
+        self.price_data.update_realtime(self.loader.now())
+        if position == self.loader.fake_now_position and not self.loader.advance():
+            return False
+        self.price_data.update_hist_data(self.loader.now())
+        return True
+
+    def steps_per_second(self):
+        return self.steps / self.elapsed if self.elapsed > 0 else 0.0
@@ -0,0 +1,58 @@
+import os
+import pickle
+import time
+
+class PriceDataSnapshot(object):
+    """
+    Snapshot of the full computed state of a PriceData: price records of every interval, moving average series and their
+    streaming running sums, indicators, bars being built and realtime interval state.
+    Restoring it skips reading saved price data and calculating moving averages, so a restart is back on live ticks right away,
+    and history polling then merges whatever closed while the process was down.
+    """
+    # Bump when the state of PriceData or its members changes incompatibly.
+    VERSION = 3
+
+    def __init__(self, path):
+        self.path = path
+
+    """ Save the state of price_data. The snapshot file is replaced atomically, so a crash never leaves a truncated snapshot. """
+    def save(self, price_data):
+        state = {
+            "version": PriceDataSnapshot.VERSION,
+            "time": time.time(),
+            "code": price_data.code,
+            "csv_base_name": price_data.csv_base_name,
+            "price_data": price_data,
+            }
+        # Pickle under the lock of price_data so that the polls can't change it half way, and write the file after releasing it.
+        with price_data.lock:
+            pickled = pickle.dumps(state, protocol = pickle.HIGHEST_PROTOCOL)
+        temp_path = self.path + ".tmp"
+        with open(temp_path, "wb") as f:
+            f.write(pickled)
+        os.replace(temp_path, self.path)
+
+    """
+    Return the PriceData of code and csv_base_name in the snapshot, or None if there is no usable snapshot.
+    With sma_params given, a snapshot whose moving averages have other params is not usable either.
+    """
+    def load(self, code, csv_base_name, sma_params = None):
+        if not os.path.exists(self.path):
+            return None
+        try:
+            with open(self.path, "rb") as f:
+                state = pickle.load(f)
+        except Exception as e:
+            print("Failed to load snapshot %s: %s" % (self.path, e))
+            return None
+        if state.get("version") != PriceDataSnapshot.VERSION or state.get("code") != code or state.get("csv_base_name") != csv_base_name:
+            print("Snapshot %s is not of %s %s, ignore it." % (self.path, code, csv_base_name))
+            return None
+        price_data = state["price_data"]
+        if sma_params is not None and (price_data.sma is None or price_data.sma.params != sma_params):
+            print("Snapshot %s has other moving averages, ignore it." % self.path)
+            return None
+        # Save price data at exit like a newly created PriceData does.
+        price_data.initiate()
+        print("Restored %s from snapshot %s taken at %s." % (code, self.path, time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(state["time"]))))
+        return price_data
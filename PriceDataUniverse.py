@@ -0,0 +1,144 @@
+from IndicatorPipeline import IndicatorPipeline
+from Metrics import metrics
+from PriceData import PriceData
+from SimpleMovingAverage import SimpleMovingAverage
+from TradingDateTime import trading_date_time
+from PriceDataLoader import price_data_loader_china
+
+import time
+
+class PriceDataUniverse(object):
+    """
+    A universe of instruments, e.g. the CSI300 constituents, each with its own PriceData.
+    Realtime quotes are requested for many codes at once, so a polling cycle costs one request per batch instead of one per code.
+    """
+    # Number of codes in one get_realtime_quotes request.
+    DEFAULT_BATCH_SIZE = 100
+
+    def __init__(self, batch_size = DEFAULT_BATCH_SIZE):
+        self.batch_size = batch_size
+        # code -> PriceData, in the order of adding.
+        self.price_data = {}
+        self.__batches = None
+
+    def __len__(self):
+        return len(self.price_data)
+
+    def __contains__(self, code):
+        return code in self.price_data
+
+    def __getitem__(self, code):
+        return self.price_data[code]
+
+    def codes(self):
+        return list(self.price_data.keys())
+
+    def add(self, price_data):
+        self.price_data[price_data.code] = price_data
+        self.__batches = None
+        return price_data
+
+    """
+    Add codes with price data saved at csv_base_name_format % code, e.g. "%s" gives sh600000_5min.csv for sh600000.
+    With a HistDataBackfill, data missing from storage is first downloaded concurrently for all codes.
+    """
+    def add_codes(self, codes, csv_base_name_format = "%s", now = None, backfill = None):
+        if backfill is not None and csv_base_name_format is not None:
+            backfill.run([code for code in codes if code not in self.price_data], csv_base_name_format = csv_base_name_format, skip_saved = True)
+        for code in codes:
+            if code not in self.price_data:
+                self.add(PriceData(code, None if csv_base_name_format is None else csv_base_name_format % code, now))
+
+    def remove(self, code):
+        del self.price_data[code]
+        self.__batches = None
+
+    def set_simple_moving_average(self, params = SimpleMovingAverage.DEFAULT_PARAMS, lazy = False):
+        for price_data in self.price_data.values():
+            price_data.set_simple_moving_average(SimpleMovingAverage(params, lazy = lazy))
+
+    """ Track indicators_by_interval of every code. Indicators only hold parameters, so they are shared by the pipelines of all codes. """
+    def set_indicator_pipeline(self, indicators_by_interval = None):
+        for price_data in self.price_data.values():
+            price_data.set_indicator_pipeline(IndicatorPipeline(IndicatorPipeline.default_indicators() if indicators_by_interval is None else indicators_by_interval))
+
+    @metrics.timed("universe.update_hist_data")
+    def update_hist_data(self, now):
+        for price_data in self.price_data.values():
+            price_data.update_hist_data(now)
+
+    """ (code, interval) of every source interval whose last closed record at now is not in price data yet. """
+    def missing_hist_data(self, now = None):
+        return [(code, interval) for code, price_data in self.price_data.items() for interval in price_data.missing_hist_data(now)]
+
+    """
+    Split codes into batches of at most batch_size.
+    Quotes identify codes by the 6 digits only (e.g. sh000001 and sz000001 are both 000001), so such codes go to different batches.
+    """
+    def batches(self):
+        if self.__batches is None:
+            batches = []
+            for code in self.price_data.keys():
+                key = PriceDataUniverse.quote_key(code)
+                for batch in batches:
+                    if len(batch) < self.batch_size and key not in batch:
+                        batch[key] = code
+                        break
+                else:
+                    batches.append({key: code})
+            self.__batches = batches
+        return self.__batches
+
+    @staticmethod
+    def quote_key(code):
+        return code[-6:]
+
+    """ Request realtime quotes batch by batch and fan out every row to its instrument. Return the codes which got no quote. """
+    @metrics.timed("universe.update_realtime")
+    def update_realtime(self, fakeNow = None):
+        if not trading_date_time.isRealtimeDataAvailableChina(fakeNow):
+            print("Not requesting realtime data because trade has closed.")
+            return []
+        missing = []
+        for batch in self.batches():
+            start_time = time.perf_counter()
+            quotes = price_data_loader_china.get().get_realtime_quotes(list(batch.values()))
+            updated = set()
+            if quotes is not None and len(quotes.index) > 0:
+                if "code" in quotes.columns:
+                    rows = [(PriceDataUniverse.quote_key(row["code"]), row) for (_, row) in quotes.iterrows()]
+                elif len(batch) == 1:
+                    # A quote without code, e.g. from FakePriceDataLoaderChina, can only belong to the single requested code.
+                    rows = [(next(iter(batch.keys())), quotes.iloc[0])]
+                else:
+                    rows = []
+                for key, row in rows:
+                    code = batch.get(key)
+                    if code is not None and key not in updated:
+                        self.price_data[code].update_realtime_with_quote(row)
+                        updated.add(key)
+                        # Latency from requesting the batch to realtime moving averages of this code updated.
+                        metrics.observe("price_data.tick_to_ma", time.perf_counter() - start_time)
+            for key, code in batch.items():
+                if key not in updated:
+                    missing.append(code)
+        if missing:
+            metrics.increment("universe.missing_quotes", len(missing))
+            print("No realtime quotes for %s." % ", ".join(missing))
+        return missing
+
+    def print_realtime_price_summary(self):
+        for code, price_data in self.price_data.items():
+            print("%s:" % code)
+            price_data.print_realtime_price_summary()
+
+    def print_realtime_sma_summary(self):
+        for code, price_data in self.price_data.items():
+            print("%s:" % code)
+            price_data.print_realtime_sma_summary()
+
+    def print_realtime_indicator_summary(self):
+        for code, price_data in self.price_data.items():
+            if price_data.indicators is not None:
+                print("%s:" % code)
+                price_data.print_realtime_indicator_summary()
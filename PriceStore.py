@@ -0,0 +1,259 @@
+import numpy
+import pandas
+
+import json
+import os
+import shutil
+
+class PriceStore(object):
+    """
+    Columnar, append-only storage of price records for one code and interval.
+    Every column is a raw binary file in a directory, which is memory-mapped on load so that no text is parsed.
+    The date index is stored as int64 seconds (or days for daily records) since epoch, numeric columns as float64,
+    and other columns as fixed-width utf-8 bytes. The row count in meta.json is updated after column files are synced,
+    so a crash during appending never exposes a partially written record.
+    """
+    META_FILE = "meta.json"
+    DATE_FILE = "date.bin"
+    MIN_STRING_WIDTH = 16
+
+    def __init__(self, path):
+        self.path = path
+        self.__recover()
+        self.meta = self.__load_meta()
+
+    """ The store directory of a csv path, e.g. csi300_5min.csv -> csi300_5min.store """
+    @staticmethod
+    def path_of_csv(csv_path):
+        base, _ = os.path.splitext(csv_path)
+        return base + ".store"
+
+    def exists(self):
+        return self.meta is not None
+
+    def __len__(self):
+        return 0 if self.meta is None else self.meta["rows"]
+
+    """
+    Read all records as a DataFrame indexed by close times, a DatetimeIndex with no text parsed or formatted.
+    With dates_as_strings, the index is of close datetime strings (date strings for daily records) like a csv file gives.
+    """
+    def read(self, dates_as_strings = False):
+        if self.meta is None:
+            return None
+        rows = self.meta["rows"]
+        dates = self.read_dates()
+        if dates_as_strings:
+            index = pandas.Index(PriceStore.date_strings(dates), name = self.meta["index_name"])
+        else:
+            index = pandas.DatetimeIndex(dates.astype("datetime64[s]"), name = self.meta["index_name"])
+        data = {}
+        for column in self.meta["columns"]:
+            values = self.__map(column["file"], column["dtype"], rows)
+            if column["dtype"].startswith("|S"):
+                # Columns of text, e.g. the code, repeat a few values, so only distinct values are decoded.
+                uniques, inverse = numpy.unique(numpy.asarray(values), return_inverse = True)
+                values = numpy.char.decode(uniques, "utf-8").astype(object)[inverse]
+            data[column["name"]] = values
+        return pandas.DataFrame(data, index = index, columns = [column["name"] for column in self.meta["columns"]])
+
+    """
+    Format datetime64 close times as strings, "YYYY-MM-DD HH:MM:SS", or "YYYY-MM-DD" for daily records.
+    Records share few days and few times of day, so only distinct days and times are formatted.
+    """
+    @staticmethod
+    def date_strings(dates):
+        days = dates.astype("datetime64[D]")
+        unique_days, day_inverse = numpy.unique(days, return_inverse = True)
+        day_strings = numpy.datetime_as_string(unique_days, unit = "D").astype(object)
+        if numpy.datetime_data(dates.dtype)[0] == "D":
+            return day_strings[day_inverse]
+        seconds = (dates.astype("datetime64[s]") - days).astype(numpy.int64)
+        unique_seconds, second_inverse = numpy.unique(seconds, return_inverse = True)
+        time_strings = numpy.array([" %02d:%02d:%02d" % (second // 3600, second // 60 % 60, second % 60) for second in unique_seconds.tolist()], dtype = object)
+        return day_strings[day_inverse] + time_strings[second_inverse]
+
+    """ Dates of the last rows records (all if None) as a datetime64 array in the unit of the store, without converting to strings. """
+    def read_dates(self, last = None):
+        start, rows = self.__tail(last)
+        return numpy.asarray(self.__map(PriceStore.DATE_FILE, "<i8", rows)[start:]).astype("datetime64[%s]" % self.meta["date_unit"])
+
+    """ Values of numeric column name of the last rows records (all if None) as a float64 array. """
+    def read_column(self, name, last = None):
+        start, rows = self.__tail(last)
+        for column in self.meta["columns"]:
+            if column["name"] == name:
+                return numpy.array(self.__map(column["file"], column["dtype"], rows)[start:], dtype = numpy.float64)
+        raise KeyError(name)
+
+    def __tail(self, last):
+        rows = self.meta["rows"]
+        return (0 if last is None else max(0, rows - last), rows)
+
+    """
+    Save df. Stored records which df repeats are kept and only the records from the first one which df restates (or the
+    first one after the stored ones) are encoded and appended, after the stored records from there are dropped.
+    Otherwise (changed columns, or wider text) the store is rewritten.
+    """
+    def write(self, df):
+        if self.meta is not None:
+            first = self.__first_difference(df)
+            if first is not None:
+                if first == self.meta["rows"] == len(df):
+                    return
+                dates = self.__encode_dates(df.index[first:])
+                columns = self.__encode_columns(df.iloc[first:])
+                if self.__fits(dates, columns):
+                    if first < self.meta["rows"]:
+                        self.__truncate(first)
+                    self.__append(dates, columns)
+                    return
+        self.__rewrite(df.index.name, self.__encode_dates(df.index), self.__encode_columns(df))
+
+    def __encode_dates(self, index):
+        if isinstance(index, pandas.DatetimeIndex) or numpy.asarray(index).dtype.kind == "M":
+            values = numpy.asarray(index, dtype = "datetime64[s]")
+            if self.meta is not None:
+                unit = self.meta["date_unit"]
+            else:
+                unit = "D" if len(values) == 0 or (values == values.astype("datetime64[D]")).all() else "s"
+        else:
+            values = numpy.asarray(index, dtype = object)
+            unit = "D" if len(values) == 0 or len(values[0]) <= 10 else "s"
+        return (unit, values.astype("datetime64[%s]" % unit).astype("<i8"))
+
+    def __encode_columns(self, df):
+        columns = []
+        for position, name in enumerate(df.columns):
+            series = df.iloc[:, position]
+            if series.dtype.kind in "biuf":
+                values = series.to_numpy(dtype = "<f8")
+            else:
+                values = numpy.char.encode(series.astype(str).to_numpy(dtype = str), "utf-8")
+                width = max(PriceStore.MIN_STRING_WIDTH, values.dtype.itemsize)
+                values = values.astype("|S%d" % width)
+            columns.append((str(name), values))
+        return columns
+
+    """
+    Position of the first stored record which df doesn't repeat, the number of stored records if df repeats all of them, or None
+    if df has other columns or dates in another unit. Records are compared across the whole overlap, because the data source
+    restates records from long ago, see PriceData.merge_tencent_hist_data.
+    """
+    def __first_difference(self, df):
+        rows = self.meta["rows"]
+        if [str(name) for name in df.columns] != [column["name"] for column in self.meta["columns"]]:
+            return None
+        overlap = min(rows, len(df))
+        unit, date_values = self.__encode_dates(df.index[:overlap])
+        if overlap > 0 and unit != self.meta["date_unit"]:
+            return None
+        differs = self.__map(PriceStore.DATE_FILE, "<i8", rows)[:overlap] != date_values
+        for column, (_, values) in zip(self.meta["columns"], self.__encode_columns(df.iloc[:overlap])):
+            stored = self.__map(column["file"], column["dtype"], rows)[:overlap]
+            if column["dtype"].startswith("|S"):
+                differs |= stored != values
+            else:
+                differs |= ~((stored == values) | (numpy.isnan(stored) & numpy.isnan(values)))
+        return int(numpy.argmax(differs)) if differs.any() else overlap
+
+    """ Whether new records can be appended in the stored date unit and column widths. """
+    def __fits(self, dates, columns):
+        unit, _ = dates
+        if self.meta["rows"] > 0 and unit != self.meta["date_unit"]:
+            return False
+        for column, (_, values) in zip(self.meta["columns"], columns):
+            if column["dtype"].startswith("|S") and values.dtype.itemsize > numpy.dtype(column["dtype"]).itemsize:
+                return False
+        return True
+
+    """ Append encoded records after the stored ones. """
+    def __append(self, dates, columns):
+        rows = self.meta["rows"]
+        unit, date_values = dates
+        self.__append_file(PriceStore.DATE_FILE, date_values, rows)
+        for column, (_, values) in zip(self.meta["columns"], columns):
+            self.__append_file(column["file"], values.astype(column["dtype"]), rows)
+        self.meta["date_unit"] = unit
+        self.meta["rows"] = rows + len(date_values)
+        self.__save_meta(self.path, self.meta)
+
+    """
+    Drop the stored records from position rows on. Only the row count is committed, the column files are truncated by the
+    next append, so a crash before it leaves the records before rows.
+    """
+    def __truncate(self, rows):
+        self.meta["rows"] = rows
+        self.__save_meta(self.path, self.meta)
+
+    def __append_file(self, file_name, values, rows):
+        path = os.path.join(self.path, file_name)
+        with open(path, "r+b") as f:
+            # Drop anything beyond the committed rows, e.g. left by a crash during the previous append.
+            f.seek(rows * values.dtype.itemsize)
+            f.truncate()
+            f.write(values.tobytes())
+            f.flush()
+            os.fsync(f.fileno())
+
+    def __rewrite(self, index_name, dates, columns):
+        unit, date_values = dates
+        meta = {
+            "rows": len(date_values),
+            "index_name": index_name,
+            "date_unit": unit,
+            "columns": [{"name": name, "file": "%d.bin" % position, "dtype": values.dtype.str}
+                for position, (name, values) in enumerate(columns)],
+            }
+        # Write a complete new directory and swap it in, see __recover.
+        temp_path = self.path + ".tmp"
+        old_path = self.path + ".old"
+        shutil.rmtree(temp_path, ignore_errors = True)
+        os.makedirs(temp_path)
+        self.__write_file(temp_path, PriceStore.DATE_FILE, date_values)
+        for column, (_, values) in zip(meta["columns"], columns):
+            self.__write_file(temp_path, column["file"], values)
+        self.__save_meta(temp_path, meta)
+        if os.path.exists(self.path):
+            os.rename(self.path, old_path)
+        os.rename(temp_path, self.path)
+        shutil.rmtree(old_path, ignore_errors = True)
+        self.meta = meta
+
+    def __write_file(self, directory, file_name, values):
+        with open(os.path.join(directory, file_name), "wb") as f:
+            f.write(values.tobytes())
+            f.flush()
+            os.fsync(f.fileno())
+
+    """ Finish or roll back a rewrite interrupted by a crash. """
+    def __recover(self):
+        temp_path = self.path + ".tmp"
+        old_path = self.path + ".old"
+        if not os.path.exists(self.path):
+            if os.path.exists(os.path.join(temp_path, PriceStore.META_FILE)):
+                os.rename(temp_path, self.path)
+            elif os.path.exists(old_path):
+                os.rename(old_path, self.path)
+        shutil.rmtree(temp_path, ignore_errors = True)
+        shutil.rmtree(old_path, ignore_errors = True)
+
+    def __map(self, file_name, dtype, rows):
+        if rows == 0:
+            return numpy.zeros(0, dtype = dtype)
+        return numpy.memmap(os.path.join(self.path, file_name), dtype = dtype, mode = "r", shape = (rows,))
+
+    def __load_meta(self):
+        meta_path = os.path.join(self.path, PriceStore.META_FILE)
+        if not os.path.exists(meta_path):
+            return None
+        with open(meta_path) as f:
+            return json.load(f)
+
+    def __save_meta(self, directory, meta):
+        meta_path = os.path.join(directory, PriceStore.META_FILE)
+        with open(meta_path + ".tmp", "w") as f:
+            json.dump(meta, f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(meta_path + ".tmp", meta_path)
@@ -0,0 +1,77 @@
+from TradingDateTime import trading_date_time
+
+class PriceWindow(object):
+    """
+    Ring buffers of the last continuous price records of one interval, shared by all indicators of the interval.
+    Only high, low and close are kept, and at most capacity records, which is the longest lookback of the indicators.
+    A gap from the last record restarts the window, like the moving average calculation does.
+    """
+    COLUMNS = ("high", "low", "close")
+    # Results of push.
+    APPENDED = "appended"
+    RESTATED = "restated"
+    RESTARTED = "restarted"
+    IGNORED = "ignored"
+
+    def __init__(self, interval, capacity):
+        self.interval = interval
+        self.capacity = max(1, capacity)
+        self.rings = dict((column, [0.0] * self.capacity) for column in PriceWindow.COLUMNS)
+        self.reset()
+
+    def reset(self):
+        # Position in rings for the next record.
+        self.position = 0
+        # Number of continuous records in rings.
+        self.size = 0
+        self.last_datetime_str = None
+        self.last_ordinal = None
+
+    """
+    Fold in a closed price record, a tuple of (high, low, close). Return RESTATED if it replaced the last record, RESTARTED if
+    it follows a gap and is now the only record, APPENDED if it follows the last record, or IGNORED if it's older.
+    """
+    def push(self, datetime_str, record):
+        if self.last_datetime_str is not None and datetime_str <= self.last_datetime_str:
+            if datetime_str != self.last_datetime_str or self.size == 0:
+                return PriceWindow.IGNORED
+            self.__set((self.position - 1) % self.capacity, record)
+            return PriceWindow.RESTATED
+        ordinal = trading_date_time.intervalCloseOrdinal(self.interval, datetime_str)
+        result = PriceWindow.APPENDED
+        if self.size > 0 and (ordinal is None or self.last_ordinal is None or ordinal != self.last_ordinal + 1):
+            print("Price data in %s contains hole: %s, %s" % (self.interval, self.last_datetime_str, datetime_str))
+            self.size = 0
+            self.position = 0
+            result = PriceWindow.RESTARTED
+        self.__set(self.position, record)
+        self.position = (self.position + 1) % self.capacity
+        self.size = min(self.size + 1, self.capacity)
+        self.last_datetime_str = datetime_str
+        self.last_ordinal = ordinal
+        return result
+
+    def __set(self, position, record):
+        for column, value in zip(PriceWindow.COLUMNS, record):
+            self.rings[column][position] = value
+
+    """ Return the i-th last value of column, i = 1 for the last record. """
+    def last(self, column, i = 1):
+        return self.rings[column][(self.position - i) % self.capacity]
+
+    """ Return the last n values of column as a list in increasing order of date. """
+    def tail(self, column, n):
+        ring = self.rings[column]
+        start = (self.position - n) % self.capacity
+        if n <= 0:
+            return []
+        if start + n <= self.capacity:
+            return ring[start:start + n]
+        return ring[start:] + ring[:self.position]
+
+    """ State of the window, to be restored after provisional records are pushed, see IndicatorPipeline.update_realtime. """
+    def snapshot(self):
+        return (self.position, self.size, self.last_datetime_str, self.last_ordinal, dict((column, list(ring)) for column, ring in self.rings.items()))
+
+    def restore(self, snapshot):
+        self.position, self.size, self.last_datetime_str, self.last_ordinal, self.rings = snapshot
@@ -0,0 +1,37 @@
+import threading
+import time
+
+class RateLimiter(object):
+    """Thread-safe token bucket: on average at most rate acquisitions per second, with bursts of up to burst acquisitions."""
+
+    def __init__(self, rate, burst = 1):
+        self.rate = float(rate)
+        self.burst = float(max(1, burst))
+        self.__tokens = self.burst
+        self.__last_time = time.monotonic()
+        self.__lock = threading.Lock()
+
+    def __refill(self):
+        now = time.monotonic()
+        self.__tokens = min(self.burst, self.__tokens + (now - self.__last_time) * self.rate)
+        self.__last_time = now
+
+    """ Take tokens if available without blocking. Return whether tokens are taken. """
+    def try_acquire(self, tokens = 1):
+        with self.__lock:
+            self.__refill()
+            if self.__tokens >= tokens:
+                self.__tokens -= tokens
+                return True
+            return False
+
+    """ Block until tokens are taken. """
+    def acquire(self, tokens = 1):
+        while True:
+            with self.__lock:
+                self.__refill()
+                if self.__tokens >= tokens:
+                    self.__tokens -= tokens
+                    return
+                wait = (tokens - self.__tokens) / self.rate
+            time.sleep(wait)
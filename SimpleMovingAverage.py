@@ -1,6 +1,13 @@
+from GapIndex import GapIndex
+from LevelIndex import LevelIndex
+from Metrics import metrics
 from PriceData import PriceData
+from SmaSeries import SmaSeries
+from StreamingSma import StreamingSma
 from TradingDateTime import trading_date_time
 
+import numpy
+
 class SimpleMovingAverage(object):
     DEFAULT_PARAMS = {
         "240" : [ # Annual 年线
@@ -57,72 +64,270 @@ class SimpleMovingAverage(object):
             ],
         }
 
-    def __init__(self, params):
+    def __init__(self, params, retention = None, lazy = False):
         self.params = params
+        # Number of last records kept in each series, None to keep all. Streaming state doesn't depend on it.
+        self.retention = retention
+        # With lazy, a series is only calculated when its line is first requested with line(), and then kept up to date.
+        self.lazy = lazy
         # Use a similar stucture of params for filling moving average data.
         # sma = {"name" : [((interval_name, count), sma_series), ...], ...}
-        # sma_series = [(date, sma), ...] with date in increasing order.
+        # sma_series = SmaSeries of (date, sma) records with date in increasing order, or None if not calculated yet in lazy mode.
         self.sma = {}
+        # Price data of every interval, which lazy calculation reads.
+        self.price_data = None
+        # Rolling windows and running sums of all lines for realtime updates, interval -> StreamingSma.
+        self.streaming = {}
+        # Current values of all lines keyed by (interval, count), the realtime value if available, for support / resistance lookup.
+        self.levels = LevelIndex()
 
+    @metrics.timed("sma.load_price_data")
     def load_price_data(self, price_data):
+        self.price_data = price_data
+        series = {}
+        for interval, counts in SimpleMovingAverage.counts_by_interval(self.params).items():
+            if not self.lazy:
+                series[interval] = self.calculate_moving_averages(interval, counts, price_data[interval])
+            # Streaming state only needs the last records of the longest window.
+            tail = price_data[interval].iloc[-max(counts):]
+            self.streaming[interval] = StreamingSma(interval, counts)
+            self.streaming[interval].load(tail.index.to_numpy(dtype = object), tail["close"].to_numpy())
         for ma in self.params.keys():
             self.sma[ma] = []
             for interval_def in self.params[ma]:
                 interval, count = interval_def
-                self.sma[ma].append((interval_def, self.calculate_moving_average(interval, count, price_data[interval])))
+                self.sma[ma].append((interval_def, series[interval][count] if interval in series else None))
+        for interval in self.streaming.keys():
+            self.update_levels(interval)
+
+    """ Return ((interval, count), sma_series) of the index-th line of ma. In lazy mode the series is calculated on first request. """
+    def line(self, ma, index):
+        interval_def, sma_series = self.sma[ma][index]
+        if sma_series is None:
+            interval, count = interval_def
+            sma_series = self.calculate_moving_average(interval, count, self.price_data[interval])
+            # Lines of the same interval and count share the series.
+            for lines in self.sma.values():
+                for i in range(len(lines)):
+                    if lines[i][0] == interval_def:
+                        lines[i] = (interval_def, sma_series)
+        return (interval_def, sma_series)
+
+    """ Group the counts of all moving average lines of params by interval, e.g. {"day": [240, 120, ...], ...}. """
+    @staticmethod
+    def counts_by_interval(params):
+        counts = {}
+        for ma in params.keys():
+            for interval, count in params[ma]:
+                if count not in counts.setdefault(interval, []):
+                    counts[interval].append(count)
+        return counts
 
     """ When last_datetime_str is not None, update the existing sma_series. Otherwise compute sma_series soly from the provided price_data. """
-    def calculate_moving_average(self, interval, count, price_data, sma_series = [], last_datetime_str = None):
-        price_series = price_data.loc[:, "close"]
-        size = price_series.size
-        if count != int(count) or count < 1:
-            print("Count %s is invalid." % count)
-            return sma_series
-
-        # Scan price_series in reverse order to find the beginning of the last continuous price records.
-        # Due to issue in our data source, the price data may contain gaps. So we only compute sma for the
-        # last continuous price records.
-        # Stop as soon as the price record of last_datetime_str for which sma is already calculated.
-        start = size - 1
-        close_datetime = price_series.index[start]
-        while start > 0:
-            if price_series.index[start - 1] == trading_date_time.previousIntervalClose(interval, close_datetime):
-                start -= 1
-                close_datetime = price_series.index[start]
-                if close_datetime == last_datetime_str:
-                    break
+    def calculate_moving_average(self, interval, count, price_data, sma_series = None, last_datetime_str = None):
+        sma_series_by_count = None if sma_series is None else {count: sma_series}
+        return self.calculate_moving_averages(interval, [count], price_data, sma_series_by_count, last_datetime_str)[count]
+
+    """
+    Compute the moving averages of every count in counts for price records in one interval with a single NumPy pass.
+    All windows share one cumulative sum of close prices, so the sma at the i-th record of count c is (cumsum[i + 1] - cumsum[i + 1 - c]) / c.
+    When last_datetime_str is not None, the series in sma_series_by_count ending at last_datetime_str are extended with the new records only.
+    Return a dict of count -> SmaSeries.
+    """
+    def calculate_moving_averages(self, interval, counts, price_data, sma_series_by_count = None, last_datetime_str = None):
+        if sma_series_by_count is None:
+            sma_series_by_count = {}
+        result = {}
+        valid_counts = []
+        for count in counts:
+            if count != int(count) or count < 1:
+                print("Count %s is invalid." % count)
+                result[count] = sma_series_by_count.get(count, SmaSeries(retention = self.retention))
             else:
-                print("Price data in %s contains hole: %s, %s" % (interval, price_series.index[start - 1], trading_date_time.previousIntervalClose(interval, close_datetime)))
-                break
-        # If we can not extend existing sma data.
-        if not close_datetime == last_datetime_str:
-            index = start + count
-            if index > size:
-                return []
-            sum = 0.0
-            while start < index:
-                sum += price_series.iat[start]
-                start += 1
-            # Create new sma_series because we can not extend the existing sma_series.
-            sma_series = [(price_series.index[start], sum / count)]
-        else:
-            index = start + 1
-            # However we do not have enough price records yet.
-            if index < count:
-                return []
+                valid_counts.append(count)
+        size = len(price_data.index)
+        if not valid_counts or size == 0:
+            for count in valid_counts:
+                result[count] = SmaSeries(retention = self.retention)
+            return result
+
+        # Keep the index as is, since converting all of it would cost O(history) on every update.
+        dates = price_data.index
+        closes = price_data["close"].to_numpy(dtype = numpy.float64)
+        start = self.find_last_continuous_start(interval, dates, last_datetime_str)
+
+        # Records after last_datetime_str can be appended to the series which already end at last_datetime_str.
+        # The other series have to be calculated from the beginning of the last continuous price records.
+        # Compare the int64 timestamps of the series, since decoding their last record costs more than the rest of an update.
+        last_timestamp = SmaSeries.encode([last_datetime_str])[1][0] if dates[start] == last_datetime_str else None
+        extend_counts = []
+        full_counts = []
+        for count in valid_counts:
+            sma_series = sma_series_by_count.get(count)
+            if last_timestamp is not None and sma_series is not None and len(sma_series) > 0 and sma_series.timestamps[-1] == last_timestamp:
+                extend_counts.append(count)
+            else:
+                full_counts.append(count)
+
+        if extend_counts:
+            # The records before last_datetime_str were already checked for continuity when the series were calculated.
+            base = max(0, start + 1 - max(extend_counts))
+            cumsum = numpy.concatenate(([0.0], numpy.cumsum(closes[base:])))
+            # Sums of windows ending at start + 1, ..., size - 1, whose dates are converted once for all series.
+            end = numpy.arange(start + 2 - base, size + 1 - base)
+            unit, timestamps = SmaSeries.encode(dates.array[start + 1:])
+            for count in extend_counts:
+                result[count] = sma_series_by_count[count].extend_timestamps(timestamps, (cumsum[end] - cumsum[end - count]) / count, unit)
+
+        if full_counts:
+            if dates[start] == last_datetime_str:
+                # The scan stopped at last_datetime_str, so find the real beginning of the last continuous price records.
+                start = self.find_last_continuous_start(interval, dates)
+            cumsum = numpy.concatenate(([0.0], numpy.cumsum(closes[start:])))
+            # Convert dates once for all series, and only the records which are kept.
+            first = start if self.retention is None else max(start, size - self.retention)
+            unit, timestamps = SmaSeries.encode(dates[first:])
+            for count in full_counts:
+                if start + count > size:
+                    result[count] = SmaSeries(retention = self.retention)
+                else:
+                    offset = max(0, start + count - 1 - first)
+                    values = (cumsum[count:] - cumsum[:-count]) / count
+                    result[count] = SmaSeries(retention = self.retention).extend_timestamps(timestamps[offset:], values[len(values) - (len(timestamps) - offset):], unit)
+        return result
 
-        while index < size:
-            sma_series.append((price_series.index[index], sma_series[-1][1] + (price_series.iat[index] - price_series.iat[index - count]) / count))
-            index += 1
-        return sma_series
+    """
+    Find the beginning of the last continuous price records.
+    Due to issue in our data source, the price data may contain gaps. So we only compute sma for the last continuous price records.
+    Holes are found from bar ordinals on the trading session grid like GapIndex finds them, see GapIndex.hole_positions.
+    Only the records from stop_datetime_str on are checked, because sma is already calculated up to stop_datetime_str.
+    """
+    def find_last_continuous_start(self, interval, dates, stop_datetime_str = None):
+        base = 0
+        if stop_datetime_str is not None:
+            position = dates.searchsorted(stop_datetime_str)
+            if position < len(dates) and dates[position] == stop_datetime_str:
+                base = position
+        holes = GapIndex.hole_positions(GapIndex.ordinals(interval, dates, base))
+        if len(holes) == 0:
+            return base
+        start = base + holes[-1] + 1
+        print("Price data in %s contains hole: %s, %s" % (interval, dates[start - 1], dates[start]))
+        return start
 
+    @metrics.timed("sma.append_price_records")
     def append_price_records(self, interval, last_datetime_str, price_data):
+        lines = []
         for ma in self.params.keys():
             for index in range(len(self.sma[ma])):
                 interval_def, sma_series = self.sma[ma][index]
-                if (interval_def[0] == interval):
-                    count = interval_def[1]
-                    self.sma[ma][index] = (interval_def, self.calculate_moving_average(interval, count, price_data, sma_series, last_datetime_str))
+                # Series which are not calculated yet in lazy mode are calculated from all price data when requested.
+                if (interval_def[0] == interval and sma_series is not None):
+                    lines.append((ma, index, interval_def, sma_series))
+        if lines:
+            sma_series_by_count = dict((interval_def[1], sma_series) for (_, _, interval_def, sma_series) in lines)
+            series = self.calculate_moving_averages(interval, list(sma_series_by_count.keys()), price_data, sma_series_by_count, last_datetime_str)
+            for (ma, index, interval_def, _) in lines:
+                self.sma[ma][index] = (interval_def, series[interval_def[1]])
+
+        streaming = self.streaming.get(interval)
+        if streaming is not None:
+            # Slice the index and closes rather than the DataFrame, which costs more than pushing the few new records.
+            first = 0
+            if streaming.last_datetime_str is not None:
+                first = price_data.index.searchsorted(streaming.last_datetime_str, side = "right")
+            for datetime_str, close in zip(price_data.index.array[first:], price_data["close"].to_numpy()[first:]):
+                streaming.push(datetime_str, close)
+            streaming.refresh_realtime()
+            self.update_levels(interval)
+
+    """
+    Update the series of interval after records were inserted into holes of price_data, see PriceData.backfill_gaps.
+    Holes are all before the last continuous records, whose averages are unchanged, so every series only gets the averages
+    which became computable before its first record prepended, and the streaming state is only reloaded if it lacked records.
+    """
+    @metrics.timed("sma.backfill_price_records")
+    def backfill_price_records(self, interval, price_data):
+        # Lines of the same interval and count share the series, so update each series once.
+        sma_series_by_count = {}
+        for ma in self.params.keys():
+            for interval_def, sma_series in self.sma[ma]:
+                if interval_def[0] == interval and sma_series is not None:
+                    sma_series_by_count[interval_def[1]] = sma_series
+        if sma_series_by_count:
+            dates = price_data.index
+            closes = price_data["close"].to_numpy(dtype = numpy.float64)
+            start = self.find_last_continuous_start(interval, dates)
+            for count, sma_series in sma_series_by_count.items():
+                end = len(dates) if len(sma_series) == 0 else dates.searchsorted(sma_series[0][0])
+                first = start + count - 1
+                if first >= end:
+                    continue
+                cumsum = numpy.concatenate(([0.0], numpy.cumsum(closes[start:end])))
+                sma_series.prepend(dates[first:end], (cumsum[count:] - cumsum[:-count]) / count)
+
+        streaming = self.streaming.get(interval)
+        if streaming is not None and streaming.size < streaming.capacity:
+            tail = price_data.iloc[-streaming.capacity:]
+            streaming.load(tail.index.to_numpy(dtype = object), tail["close"].to_numpy())
+            streaming.refresh_realtime()
+            self.update_levels(interval)
+
+    """ Drop averages after the last record of price_data from the series of interval, e.g. of removed provisional records, and reload its streaming state. """
+    @metrics.timed("sma.truncate_price_records")
+    def truncate_price_records(self, interval, price_data):
+        last_datetime_str = price_data.index[-1]
+        for ma in self.params.keys():
+            for interval_def, sma_series in self.sma[ma]:
+                if interval_def[0] == interval and sma_series is not None:
+                    sma_series.truncate(last_datetime_str)
+        streaming = self.streaming.get(interval)
+        if streaming is not None:
+            tail = price_data.iloc[-streaming.capacity:]
+            streaming.load(tail.index.to_numpy(dtype = object), tail["close"].to_numpy())
+            streaming.refresh_realtime()
+            self.update_levels(interval)
+
+    """ Fold realtime price data of every interval into the streaming state. O(1) per line. """
+    @metrics.timed("sma.update_realtime")
+    def update_realtime(self, realtime_price_data):
+        for interval, streaming in self.streaming.items():
+            # Realtime price data may not be available when trading is already closed.
+            if interval in realtime_price_data:
+                streaming.update_realtime(realtime_price_data[interval])
+                self.update_levels(interval)
+
+    """ Move the levels of lines of interval to their current values. """
+    def update_levels(self, interval):
+        streaming = self.streaming[interval]
+        for count in streaming.counts:
+            value = streaming.realtime_sma.get(count)
+            if value is None:
+                value = streaming.moving_average(count)
+            if value is None or value != value:
+                self.levels.remove((interval, count))
+            else:
+                self.levels.update((interval, count), value)
+
+    """ Moving averages of all lines of interval as {count: sma}, at the last closed record, or provisional at the realtime price with realtime. """
+    def current_values(self, interval, realtime = False):
+        streaming = self.streaming.get(interval)
+        if streaming is None:
+            return {}
+        if realtime:
+            return dict((count, streaming.realtime_sma.get(count)) for count in streaming.counts)
+        return dict((count, streaming.moving_average(count)) for count in streaming.counts)
+
+    """ The n closest lines below and at or above price, as ([(value, (interval, count)), ...], [...]), closest first. """
+    def nearest_levels(self, price, n = 3):
+        return (self.levels.below(price, n), self.levels.above(price, n))
+
+    """ Return the provisional moving average at the last realtime price, or None if not available. """
+    def realtime_moving_average(self, interval, count):
+        streaming = self.streaming.get(interval)
+        if streaming is None:
+            return None
+        return streaming.realtime_sma.get(count)
 
     """
     Compute the moving average of count for price records in interval, with given realtime_price_data, at time_to_predict.
@@ -131,20 +336,27 @@ class SimpleMovingAverage(object):
     close price for previous interval.
 
     With time_to_predict unset, this function calculate the sma at the current interval of current time. With time_to_predict is
-    set to a time in future, sma is calculated assuming that the price remains at the realtime price unless specified in future_price.
+    set to a time in future, sma is calculated assuming that the price remains at the realtime price unless specified in future_price,
+    see project_realtime_moving_averages.
     """
     def calculate_realtime_moving_average(self, interval, count, price_data, sma_series, realtime_price_data,
             time_to_predict = None, future_price = None):
         sum = 0.0
         if time_to_predict is None:
             # Use incremental calculation by default unless there is no enough data.
+            closes = price_data["close"]
             index = len(price_data.index) - 1
             last_datetime_str = price_data.index[index]
             update_count = 0
             datetime_str = realtime_price_data["this_close"]
-            while datetime_str != last_datetime_str:
-                datetime_str = trading_date_time.previousIntervalClose(interval, datetime_str)
-                update_count += 1
+            this_ordinal = trading_date_time.intervalCloseOrdinal(interval, datetime_str)
+            last_ordinal = trading_date_time.intervalCloseOrdinal(interval, last_datetime_str)
+            if this_ordinal is not None and last_ordinal is not None:
+                update_count = this_ordinal - last_ordinal
+            else:
+                while datetime_str != last_datetime_str:
+                    datetime_str = trading_date_time.previousIntervalClose(interval, datetime_str)
+                    update_count += 1
             sum = 0.0
             if update_count > 0:
                 sum += realtime_price_data["last_price"]
@@ -155,22 +367,128 @@ class SimpleMovingAverage(object):
             if update_count > 1:
                 sum += prev_close_price
                 # If we want to estimate missing data.
-                sum += (update_count - 2) * price_data.iloc[index]["close"]
+                sum += (update_count - 2) * closes.iat[index]
             if len(sma_series) > 0:
                 sum += sma_series[-1][1] * count
                 for i in range(update_count):
-                    sum -= price_data.iloc[index - count + i + 1]["close"]
+                    sum -= closes.iat[index - count + i + 1]
             elif update_count + index + 1 >= count:
                 for i in range(count - update_count):
-                    sum += price_data.iloc[index - i]["close"]
+                    sum += closes.iat[index - i]
             else:
                 # No enough price records.
                 return None
         else:
-            print("Unsupported")
-            raise Exception()
+            _, averages = self.project_realtime_moving_averages(interval, [count], price_data, realtime_price_data, time_to_predict, future_price)
+            if len(averages) == 0 or numpy.isnan(averages[-1, 0]):
+                return None
+            return float(averages[-1, 0])
         return sum / count
 
+    """
+    Project the moving averages of counts in interval at every close up to the close of the interval containing time_to_predict,
+    with the realtime price as the close of the current interval and the price staying there, unless specified in future_price:
+    one price, or a sequence of the prices at the closes after the current one which stays at its last price.
+    All closes and counts come from one rolling sum over the closes followed by the projected path, see project_moving_averages.
+    Return (close datetime strings, (closes x counts) float64 array of averages, NaN where price records are not enough).
+    """
+    def project_realtime_moving_averages(self, interval, counts, price_data, realtime_price_data, time_to_predict, future_price = None):
+        closes, base_ordinal, current_close = self.realtime_known_closes(interval, counts, price_data, realtime_price_data)
+        target_ordinal = trading_date_time.intervalCloseOrdinal(interval, trading_date_time.intervalCloseOfDatetime(interval, time_to_predict))
+        if target_ordinal is None:
+            print("Cannot predict %s moving averages at %s off the trading calendar." % (interval, time_to_predict))
+            raise Exception()
+        path = numpy.full(max(0, target_ordinal - base_ordinal), realtime_price_data["last_price"], dtype = numpy.float64)
+        if len(path) > 0:
+            path[0] = current_close
+        if future_price is not None and len(path) > 1:
+            future = numpy.atleast_1d(numpy.asarray(future_price, dtype = numpy.float64))
+            path[1:] = future[numpy.minimum(numpy.arange(len(path) - 1), len(future) - 1)]
+        dates = trading_date_time.intervalClosesFromOrdinals(interval, numpy.arange(base_ordinal + 1, base_ordinal + 1 + len(path)))
+        return (dates, SimpleMovingAverage.project_moving_averages(closes, counts, path))
+
+    """
+    Exact prices at which the close of the current interval crosses the lines of counts in interval: the price p which equals the
+    moving average it makes as the close of the current interval, and of the next h - 1 intervals too for every h in horizons.
+    Return a (horizons x counts) float64 array, see crossing_prices.
+    """
+    def realtime_crossing_prices(self, interval, counts, price_data, realtime_price_data, horizons = (1,)):
+        closes, _, _ = self.realtime_known_closes(interval, counts, price_data, realtime_price_data)
+        return SimpleMovingAverage.crossing_prices(closes, counts, horizons)
+
+    """
+    Closes known before the close of the current interval in realtime_price_data: the last continuous closes of price_data, enough for
+    the longest of counts, followed by the realtime close of the previous interval if it's missing from price_data.
+    The close of the current interval is the realtime price, or the close of its record if it's in price_data already, like the
+    realtime moving averages, see StreamingSma.update_realtime. Realtime data older than the last record of price_data is stale,
+    and the last record is the current interval then.
+    Return (closes, ordinal of the last known close, close of the current interval).
+    """
+    def realtime_known_closes(self, interval, counts, price_data, realtime_price_data):
+        last_datetime_str = price_data.index[-1]
+        last_ordinal = trading_date_time.intervalCloseOrdinal(interval, last_datetime_str)
+        this_ordinal = trading_date_time.intervalCloseOrdinal(interval, realtime_price_data["this_close"])
+        if last_ordinal is None or this_ordinal is None:
+            print("Cannot project %s moving averages from %s to %s off the trading calendar." % (interval, last_datetime_str, realtime_price_data["this_close"]))
+            raise Exception()
+        update_count = max(0, this_ordinal - last_ordinal)
+        prev_close_price = realtime_price_data.get("prev_close_price", None)
+        if update_count > 1 and prev_close_price is None or update_count > 2:
+            print("Missing data between %s and %s in interval %s." % (last_datetime_str, realtime_price_data["this_close"], interval))
+            raise Exception()
+        tail = price_data.iloc[-max(counts):]
+        closes = tail["close"].to_numpy(dtype = numpy.float64)[self.find_last_continuous_start(interval, tail.index):]
+        if update_count == 0:
+            return (closes[:-1], last_ordinal - 1, closes[-1])
+        if update_count > 1:
+            closes = numpy.append(closes, prev_close_price)
+        return (closes, this_ordinal - 1, realtime_price_data["last_price"])
+
+    """
+    Moving averages of counts at every close of path, the prices of the closes following closes in order, from one rolling sum.
+    Return a (len(path) x len(counts)) float64 array, NaN where closes are not enough.
+    """
+    @staticmethod
+    def project_moving_averages(closes, counts, path):
+        counts = numpy.asarray(counts, dtype = numpy.int64)
+        sums = numpy.concatenate(([0.0], numpy.cumsum(numpy.concatenate((closes, path)))))
+        ends = len(closes) + numpy.arange(1, len(path) + 1)[:, numpy.newaxis]
+        starts = ends - counts
+        return numpy.where(starts >= 0, (sums[ends] - sums[numpy.maximum(starts, 0)]) / counts, numpy.nan)
+
+    """
+    Closed form of moving averages of counts with the price flat at p for the next h closes following closes: a + b * p, where a is
+    the sum of the last count - h closes divided by count and b = min(h, count) / count.
+    Return (a, b) as (len(horizons) x len(counts)) float64 arrays, NaN in a where closes are not enough.
+    """
+    @staticmethod
+    def linear_projection(closes, counts, horizons):
+        counts = numpy.asarray(counts, dtype = numpy.int64)
+        horizons = numpy.asarray(horizons, dtype = numpy.int64)[:, numpy.newaxis]
+        sums = numpy.concatenate(([0.0], numpy.cumsum(closes)))
+        kept = numpy.maximum(counts - horizons, 0)
+        a = numpy.where(kept <= len(closes), (sums[-1] - sums[len(closes) - numpy.minimum(kept, len(closes))]) / counts, numpy.nan)
+        b = numpy.minimum(horizons, counts) / counts
+        return (a, b)
+
+    """ Moving averages of counts over a grid of flat prices and horizons, see linear_projection. Return a (prices x horizons x counts) array. """
+    @staticmethod
+    def project_flat_moving_averages(closes, counts, horizons, prices):
+        a, b = SimpleMovingAverage.linear_projection(closes, counts, horizons)
+        return a + b * numpy.asarray(prices, dtype = numpy.float64)[:, numpy.newaxis, numpy.newaxis]
+
+    """
+    Prices which, staying flat for the next h closes following closes, equal the moving average they make, p = a + b * p, for every h
+    in horizons: above it price stays above the line. Return a (horizons x counts) array, NaN where h >= count, when any flat price
+    is its own average, or where closes are not enough.
+    """
+    @staticmethod
+    def crossing_prices(closes, counts, horizons = (1,)):
+        a, b = SimpleMovingAverage.linear_projection(closes, counts, horizons)
+        with numpy.errstate(divide = "ignore", invalid = "ignore"):
+            return numpy.where(b < 1, a / (1 - b), numpy.nan)
+
+    @metrics.timed("sma.print_realtime_sma_summary")
     def print_realtime_sma_summary(self, price_data, realtime_price_data):
         for ma in self.params.keys():
             print("Realtime MA for %s days:" % ma)
@@ -180,9 +498,15 @@ class SimpleMovingAverage(object):
                 # Realtime price data may not be available when trading is already closed.
                 if interval not in realtime_price_data:
                     continue
-                realtime_ma = self.calculate_realtime_moving_average(interval, count, price_data[interval].copy(), sma_series, realtime_price_data[interval])
+                realtime_ma = self.realtime_moving_average(interval, count)
                 if realtime_ma is None:
                     realtime_ma_str = "None\t"
                 else:
                     realtime_ma_str = "%.3f" % realtime_ma
                 print("\t%s\tat interval %s,\t%s" % (realtime_ma_str, interval, count))
+        realtime_interval_data = next(iter(realtime_price_data.values()), None)
+        if realtime_interval_data is not None:
+            price = realtime_interval_data["last_price"]
+            supports, resistances = self.nearest_levels(price)
+            print("Support at %s:\t%s" % (price, ", ".join("%.3f (%s, %s)" % (value, interval, count) for (value, (interval, count)) in supports)))
+            print("Resistance at %s:\t%s" % (price, ", ".join("%.3f (%s, %s)" % (value, interval, count) for (value, (interval, count)) in resistances)))
@@ -0,0 +1,152 @@
+import numpy
+
+class SmaSeries(object):
+    """
+    Array-backed moving average series in increasing order of date.
+    Close times are int64 seconds since epoch (days since epoch for daily series) and averages are float64, both kept in
+    contiguous arrays which grow by doubling, so appending is amortized O(1) per record.
+    With retention, only the last retention records are kept, so memory stays flat in long-running processes.
+    """
+    INITIAL_CAPACITY = 64
+
+    def __init__(self, dates = None, values = None, retention = None):
+        self.retention = retention
+        # "s" for close datetime strings, "D" for daily date strings, None until the first record.
+        self.unit = None
+        self.__times = numpy.zeros(0, dtype = numpy.int64)
+        self.__values = numpy.zeros(0, dtype = numpy.float64)
+        # Records are in [__start, __end) of the arrays.
+        self.__start = 0
+        self.__end = 0
+        if dates is not None and len(dates) > 0:
+            self.extend(dates, values)
+
+    def __len__(self):
+        return self.__end - self.__start
+
+    """ Averages as a read-only float64 array view. """
+    @property
+    def values(self):
+        values = self.__values[self.__start:self.__end]
+        values.flags.writeable = False
+        return values
+
+    """ Close times as a read-only int64 array view, in the unit of the series. """
+    @property
+    def timestamps(self):
+        timestamps = self.__times[self.__start:self.__end]
+        timestamps.flags.writeable = False
+        return timestamps
+
+    """ Close datetime strings as an object array. O(n), prefer timestamps for vector operations. """
+    @property
+    def dates(self):
+        return self.decode(self.timestamps)
+
+    """ An integer key gives a (date, sma) tuple like the former list-of-tuples series. A slice key gives a new SmaSeries. """
+    def __getitem__(self, key):
+        if isinstance(key, slice):
+            return SmaSeries(retention = self.retention).extend_timestamps(self.timestamps[key], self.values[key], self.unit)
+        if key < 0:
+            key += len(self)
+        if key < 0 or key >= len(self):
+            raise IndexError("SmaSeries index out of range")
+        return (self.decode(self.__times[self.__start + key:self.__start + key + 1])[0], float(self.__values[self.__start + key]))
+
+    def __iter__(self):
+        dates = self.dates
+        values = self.values
+        for i in range(len(values)):
+            yield (dates[i], float(values[i]))
+
+    def __repr__(self):
+        if len(self) == 0:
+            return "SmaSeries([])"
+        return "SmaSeries(%d records, last %s)" % (len(self), self[-1])
+
+    """ Append records of close datetime strings (e.g. a slice of a price data index) and averages. """
+    def extend(self, dates, values):
+        if len(dates) == 0:
+            return self
+        if self.retention is not None:
+            # Don't convert records which would be dropped right away.
+            dates = dates[-self.retention:]
+            values = values[-self.retention:]
+        unit, timestamps = SmaSeries.encode(dates)
+        return self.extend_timestamps(timestamps, values, unit)
+
+    """ Append records of timestamps in unit, see encode, so that dates shared by many series are only converted once. """
+    def extend_timestamps(self, timestamps, values, unit = None):
+        if self.unit is None:
+            self.unit = unit
+        values = numpy.asarray(values, dtype = numpy.float64)
+        count = len(values)
+        self.__reserve(count)
+        self.__times[self.__end:self.__end + count] = timestamps
+        self.__values[self.__end:self.__end + count] = values
+        self.__end += count
+        if self.retention is not None:
+            self.__start = max(self.__start, self.__end - self.retention)
+        return self
+
+    """ Convert close datetime strings, or date strings of daily records, to (unit, int64 timestamps). """
+    @staticmethod
+    def encode(dates):
+        dates = numpy.asarray(dates, dtype = object)
+        unit = "D" if len(dates) > 0 and len(dates[0]) == 10 else "s"
+        return (unit, dates.astype("datetime64[%s]" % unit).astype(numpy.int64))
+
+    def append(self, date, value):
+        return self.extend([date], [value])
+
+    """
+    Insert records of close datetime strings and averages before the first record, e.g. records which became computable after
+    a hole in price data was filled. With retention, only the records which fit in are kept. O(n) copy.
+    """
+    def prepend(self, dates, values):
+        if self.retention is not None:
+            skip = max(0, len(values) - max(0, self.retention - len(self)))
+            dates = dates[skip:]
+            values = values[skip:]
+        if len(dates) == 0:
+            return self
+        unit, timestamps = SmaSeries.encode(dates)
+        if self.unit is None:
+            self.unit = unit
+        times = numpy.concatenate((timestamps, self.timestamps))
+        values = numpy.concatenate((numpy.asarray(values, dtype = numpy.float64), self.values))
+        self.__times = numpy.empty(max(SmaSeries.INITIAL_CAPACITY, 2 * len(values)), dtype = numpy.int64)
+        self.__values = numpy.empty(len(self.__times), dtype = numpy.float64)
+        self.__times[:len(values)] = times
+        self.__values[:len(values)] = values
+        self.__start, self.__end = 0, len(values)
+        return self
+
+    """ Drop the records after close datetime string datetime_str. """
+    def truncate(self, datetime_str):
+        if len(self) > 0:
+            _, timestamps = SmaSeries.encode([datetime_str])
+            self.__end = self.__start + int(numpy.searchsorted(self.timestamps, timestamps[0], side = "right"))
+        return self
+
+    """ Make room for count more records, reusing the space of records dropped by retention before growing. """
+    def __reserve(self, count):
+        if self.__end + count <= len(self.__values):
+            return
+        size = len(self)
+        capacity = len(self.__values)
+        if size + count > capacity // 2:
+            capacity = max(SmaSeries.INITIAL_CAPACITY, 2 * (size + count))
+        times = numpy.empty(capacity, dtype = numpy.int64)
+        values = numpy.empty(capacity, dtype = numpy.float64)
+        times[:size] = self.__times[self.__start:self.__end]
+        values[:size] = self.__values[self.__start:self.__end]
+        self.__times, self.__values = times, values
+        self.__start, self.__end = 0, size
+
+    """ Convert timestamps of the series to datetime strings. """
+    def decode(self, timestamps):
+        strings = numpy.datetime_as_string(numpy.asarray(timestamps, dtype = numpy.int64).astype("datetime64[%s]" % (self.unit or "s")), unit = self.unit or "s")
+        if self.unit != "D":
+            strings = numpy.char.replace(strings, "T", " ")
+        return strings.astype(object)
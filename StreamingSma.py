@@ -0,0 +1,189 @@
+from GapIndex import GapIndex
+from TradingDateTime import trading_date_time
+
+import numpy
+
+class StreamingSma(object):
+    """
+    Streaming state of all simple moving averages of one interval.
+    The closes of the last continuous price records are kept in one ring buffer sized by the largest count,
+    and every count keeps a running sum of its window, so a closed bar or a realtime tick is folded in O(1) per line.
+    """
+
+    def __init__(self, interval, counts):
+        self.interval = interval
+        self.counts = sorted(set(counts))
+        self.capacity = self.counts[-1]
+        self.ring = numpy.zeros(self.capacity, dtype = numpy.float64)
+        # Position in ring for the next close.
+        self.position = 0
+        # Number of continuous closes in ring.
+        self.size = 0
+        # Running sum of the last min(count, size) closes for each count.
+        self.sums = dict((count, 0.0) for count in self.counts)
+        # Pushes since the sums were recalculated, see count_push.
+        self.pushes_since_resum = 0
+        # update_count -> {count: sum of the closes which stay in the window, or None}, until closes change, see closed_sums.
+        self.closed_sums_by_update_count = {}
+        self.last_datetime_str = None
+        self.last_ordinal = None
+        # The last realtime data of this interval and the provisional moving averages at its price, count -> sma.
+        self.realtime_interval_data = None
+        self.realtime_sma = {}
+        # (last close, this close) of the gap in realtime data which was last reported, so that a gap is reported once.
+        self.reported_gap = None
+
+    """ Initialize from price records in increasing order of date. Only the last continuous records are kept. """
+    def load(self, dates, closes):
+        dates = numpy.asarray(dates[-self.capacity:], dtype = object)
+        tail = numpy.asarray(closes[-self.capacity:], dtype = numpy.float64)
+        if len(dates) > 0:
+            ordinals = trading_date_time.intervalCloseOrdinals(self.interval, dates)
+            holes = GapIndex.hole_positions(ordinals)
+            if len(holes) > 0:
+                tail = tail[holes[-1] + 1:]
+        self.ring[:len(tail)] = tail
+        self.position = len(tail) % self.capacity
+        self.size = len(tail)
+        self.resum()
+        self.realtime_sma = {}
+        if len(dates) > 0:
+            self.last_datetime_str = dates[-1]
+            self.last_ordinal = trading_date_time.intervalCloseOrdinal(self.interval, self.last_datetime_str)
+        else:
+            self.last_datetime_str = None
+            self.last_ordinal = None
+
+    """ Fold in a closed price record. A gap from the last record restarts the window like the batch calculation does. """
+    def push(self, datetime_str, close):
+        if self.last_datetime_str is not None and datetime_str <= self.last_datetime_str:
+            if datetime_str == self.last_datetime_str:
+                self.restate_last(close)
+            return
+        ordinal = trading_date_time.intervalCloseOrdinal(self.interval, datetime_str)
+        if self.size > 0 and (ordinal is None or self.last_ordinal is None or ordinal != self.last_ordinal + 1):
+            print("Price data in %s contains hole: %s, %s" % (self.interval, self.last_datetime_str, datetime_str))
+            self.size = 0
+            self.position = 0
+            self.resum()
+        ring = self.ring
+        for count in self.counts:
+            if self.size >= count:
+                self.sums[count] -= ring[(self.position - count) % self.capacity]
+            self.sums[count] += close
+        ring[self.position] = close
+        self.position = (self.position + 1) % self.capacity
+        self.size = min(self.size + 1, self.capacity)
+        self.last_datetime_str = datetime_str
+        self.last_ordinal = ordinal
+        self.closed_sums_by_update_count = {}
+        self.pushes_since_resum = StreamingSma.count_push(self.pushes_since_resum, self.capacity)
+        if self.pushes_since_resum == 0:
+            self.resum()
+
+    """ Recalculate the provisional moving averages after closed price records are pushed. """
+    def refresh_realtime(self):
+        if self.realtime_interval_data is not None:
+            self.update_realtime(self.realtime_interval_data)
+
+    """ The data source restated the close of the last price record. """
+    def restate_last(self, close):
+        if self.size == 0:
+            return
+        last = (self.position - 1) % self.capacity
+        for count in self.counts:
+            self.sums[count] += close - self.ring[last]
+        self.ring[last] = close
+        self.closed_sums_by_update_count = {}
+
+    """
+    Count a push into running sums of windows of up to capacity closes, given the pushes since they were recalculated. Return the
+    new count, which is 0 when the sums are due to be recalculated from the window, after every capacity pushes, to stop floating
+    point errors from accumulating. Also used by IndicatorPipeline indicators, e.g. BollingerBands.
+    """
+    @staticmethod
+    def count_push(pushes, capacity):
+        pushes += 1
+        return 0 if pushes >= capacity else pushes
+
+    def resum(self):
+        for count in self.counts:
+            self.sums[count] = self.tail_sum(min(count, self.size))
+        self.pushes_since_resum = 0
+        self.closed_sums_by_update_count = {}
+
+    """ Sum of the last n closes. """
+    def tail_sum(self, n):
+        if n <= 0:
+            return 0.0
+        indices = numpy.arange(self.position - n, self.position) % self.capacity
+        return float(self.ring[indices].sum())
+
+    """ Return the i-th last close, i = 1 for the last one. """
+    def last_close(self, i):
+        return self.ring[(self.position - i) % self.capacity]
+
+    """ Moving average of count over closed price records, or None if there is no enough records. """
+    def moving_average(self, count):
+        if self.size < count:
+            return None
+        return self.sums[count] / count
+
+    """
+    Update the provisional moving averages with the realtime data of this interval, see PriceData.__update_realtime_at_interval.
+    The realtime price is used as close price of the current interval, and prev_close_price as close price of the previous
+    interval in case its price record has not been merged yet.
+    """
+    def update_realtime(self, realtime_interval_data):
+        self.realtime_interval_data = realtime_interval_data
+        self.realtime_sma = {}
+        update_count = self.update_count(realtime_interval_data["this_close"])
+        if update_count is None:
+            return self.realtime_sma
+        prev_close_price = realtime_interval_data.get("prev_close_price", None)
+        if update_count > 1 and prev_close_price is None or update_count > 2:
+            gap = (self.last_datetime_str, realtime_interval_data["this_close"])
+            if gap != self.reported_gap:
+                print("Missing data between %s and %s in interval %s." % (gap + (self.interval,)))
+                self.reported_gap = gap
+            return self.realtime_sma
+        new_sum = 0.0
+        if update_count > 0:
+            new_sum += realtime_interval_data["last_price"]
+        if update_count > 1:
+            new_sum += prev_close_price
+        for count, closed_sum in self.closed_sums(update_count).items():
+            self.realtime_sma[count] = None if closed_sum is None else (closed_sum + new_sum) / count
+        return self.realtime_sma
+
+    """
+    Sums of the closes which stay in the window of every count when update_count realtime records are appended, or None if
+    there are not enough price records. Only realtime prices change between closed records, so the sums are kept until then.
+    """
+    def closed_sums(self, update_count):
+        closed_sums = self.closed_sums_by_update_count.get(update_count)
+        if closed_sums is None:
+            closed_sums = self.closed_sums_by_update_count[update_count] = dict((count, self.closed_sum(count, update_count)) for count in self.counts)
+        return closed_sums
+
+    def closed_sum(self, count, update_count):
+        keep = count - update_count
+        if keep < 0 or self.size < keep:
+            # No enough price records.
+            return None
+        if self.size >= count:
+            closed_sum = self.sums[count]
+            # Drop the oldest closes of the window which are pushed out by the realtime records.
+            for i in range(update_count):
+                closed_sum -= self.last_close(count - i)
+            return closed_sum
+        return self.tail_sum(keep)
+
+    """ Number of intervals from the last closed price record to this_close, or None if unknown. """
+    def update_count(self, this_close):
+        if self.last_ordinal is None:
+            return None
+        this_ordinal = trading_date_time.intervalCloseOrdinal(self.interval, this_close)
+        if this_ordinal is None:
+            return None
+        return max(0, this_ordinal - self.last_ordinal)
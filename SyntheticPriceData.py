@@ -0,0 +1,89 @@
+from BarAggregator import BarAggregator
+from PriceData import PriceData
+from PriceDataLoader import price_data_loader_china
+from TradingDateTime import trading_date_time
+
+import numpy
+import pandas
+
+import datetime
+
+class SyntheticPriceData(object):
+    """
+    Generate reproducible synthetic A-share price data of every interval in PriceData.INTERVALS, e.g. for benchmarks.
+    5min records are a seeded random walk on the session grid of the trading calendar, with an overnight gap at every open,
+    and records of the other intervals are aggregated from them, so all intervals agree with each other like downloaded data.
+    """
+    # Holidays of the synthetic calendar as (month, first day, last day), a rough approximation of A-share market closures.
+    HOLIDAYS = [(1, 1, 3), (5, 1, 3), (10, 1, 7)]
+
+    def __init__(self, start_day, end_day, code = "sh000300", seed = 0, start_price = 3000.0, volatility = 0.0015):
+        self.start_day = start_day
+        self.end_day = end_day
+        self.code = code
+        self.seed = seed
+        self.start_price = start_price
+        # Standard deviation of log returns of one 5min record.
+        self.volatility = volatility
+        self.__price_data = None
+
+    """ Weekdays from start_day to end_day except HOLIDAYS, to be used with TradingDateTime.setChinaTradingDates without network. """
+    @staticmethod
+    def trading_dates(start_day, end_day):
+        dates = []
+        day = datetime.datetime.strptime(start_day, "%Y-%m-%d").date()
+        end = datetime.datetime.strptime(end_day, "%Y-%m-%d").date()
+        while day <= end:
+            if day.weekday() < 5 and not any(day.month == month and first <= day.day <= last for (month, first, last) in SyntheticPriceData.HOLIDAYS):
+                dates.append(day.strftime("%Y-%m-%d"))
+            day += datetime.timedelta(days = 1)
+        return dates
+
+    """ Generate price data of all intervals on the trading calendar of trading_date_time. Return {interval: data}. """
+    def generate(self):
+        if self.__price_data is not None:
+            return self.__price_data
+        days = numpy.asarray(trading_date_time.getChinaTradingDates(), dtype = object)
+        first_day, end_day = numpy.searchsorted(days, [self.start_day, self.end_day], side = "left")
+        if end_day < len(days) and days[end_day] == self.end_day:
+            end_day += 1
+        if end_day <= first_day:
+            raise Exception("No trading day between %s and %s." % (self.start_day, self.end_day))
+        bars_per_day = trading_date_time.barsPerDay(BarAggregator.BASE_INTERVAL)
+        dates = trading_date_time.intervalClosesFromOrdinals(BarAggregator.BASE_INTERVAL,
+            numpy.arange(first_day * bars_per_day, end_day * bars_per_day))
+
+        random = numpy.random.default_rng(self.seed)
+        returns = random.normal(0.0, self.volatility, len(dates))
+        gaps = numpy.zeros(len(dates))
+        gaps[::bars_per_day] = random.normal(0.0, self.volatility * 3, end_day - first_day)
+        log_close = numpy.log(self.start_price) + numpy.cumsum(returns + gaps)
+        closes = numpy.exp(log_close)
+        opens = numpy.exp(log_close - returns)
+        spreads = numpy.abs(random.normal(0.0, self.volatility / 2, (2, len(dates))))
+        highs = numpy.maximum(opens, closes) * (1 + spreads[0])
+        lows = numpy.minimum(opens, closes) * (1 - spreads[1])
+        volumes = numpy.round(random.lognormal(12.0, 0.5, len(dates)))
+
+        base_data = pandas.DataFrame({
+            "open": opens.round(2),
+            "close": closes.round(2),
+            "high": highs.round(2),
+            "low": lows.round(2),
+            "volume": volumes,
+            "code": self.code[-6:],
+            }, index = pandas.Index(dates, name = "date"), columns = ["open", "close", "high", "low", "volume", "code"])
+        # Rounding must not move open or close out of the range of the record.
+        base_data["high"] = base_data[["open", "close", "high"]].max(axis = 1)
+        base_data["low"] = base_data[["open", "close", "low"]].min(axis = 1)
+
+        aggregator = BarAggregator()
+        self.__price_data = {}
+        for interval in PriceData.INTERVALS:
+            self.__price_data[interval] = base_data if interval == aggregator.base_interval else aggregator.aggregate(base_data, interval)
+        return self.__price_data
+
+    """ Save price data of all intervals like PriceData does, i.e. as csv_base_name_<interval>.csv. """
+    def save(self, csv_base_name):
+        for interval, data in self.generate().items():
+            price_data_loader_china.get().save_csv(data, "%s_%s.csv" % (csv_base_name, interval))
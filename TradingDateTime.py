@@ -1,9 +1,11 @@
-import tushare as ts
+from PriceDataLoader import import_tushare, price_data_loader_china
 
-from PriceDataLoader import price_data_loader_china
+import numpy
 
 import bisect
 import datetime
+import os
+import time
 
 class TradingDateTime(object):
     """Provide local date time information of China stock exchange."""
@@ -13,19 +15,91 @@ class TradingDateTime(object):
     CHINA_AFTERNOON_OPEN = (13, 0, 0)
     CHINA_AFTERNOON_CLOSE = (15, 0, 0)
 
+    # Up to this many datetime strings are converted to ordinals one by one, see intervalCloseOrdinals.
+    SCALAR_ORDINALS_SIZE = 8
+
     DAY_STRFTIME = "%Y-%m-%d"
     DATETIME_STRFTIME = "%Y-%m-%d %H:%M:%S"
 
-    def __init__(self):
-        self.__ChinaTradingDates = None
+    # Minute intervals with a precomputed session grid of interval closes.
+    GRID_MINUTE_INTERVALS = [5, 15, 30, 60]
+
+    # On-disk snapshot of China trading dates, so that the calendar is available at startup without network.
+    CALENDAR_SNAPSHOT_PATH = "china_trading_dates.csv"
+    # Seconds between two checks whether the trading dates still cover today.
+    CALENDAR_CHECK_INTERVAL = 24 * 3600
+
+    def __init__(self, calendar_snapshot_path = CALENDAR_SNAPSHOT_PATH):
+        self.calendar_snapshot_path = calendar_snapshot_path
+        # The last trading date of the calendar is its validity horizon.
+        self.__ChinaTradingDates = self.loadTradingDatesSnapshot()
+        self.__tradingDatesCheckTime = None
+        # Session grid: every interval close is numbered by a dense integer ordinal, day_ordinal * bars_per_day + bar_of_day.
+        # The day ordinal is the index in the trading dates array, so the grid is rebuilt when trading dates are reloaded.
+        self.__gridTradingDates = None
+        self.__dayOrdinals = None
+        self.__dayArray = None
+        self.__sessionGrids = {}
+        for minute_interval in TradingDateTime.GRID_MINUTE_INTERVALS:
+            close_times = self.sessionCloseTimes(minute_interval)
+            # Map minute of day to the bar of day, -1 if no interval closes at the minute.
+            bar_of_minute = numpy.full(24 * 60, -1, dtype = numpy.int64)
+            for bar, close_time in enumerate(close_times):
+                bar_of_minute[int(close_time[:2]) * 60 + int(close_time[3:5])] = bar
+            self.__sessionGrids["%dmin" % minute_interval] = {
+                "close_times": close_times,
+                "bar_of_time": dict((close_time, bar) for bar, close_time in enumerate(close_times)),
+                "bar_of_minute": bar_of_minute,
+                }
 
     def getChinaTradingDates(self):
-        # Check if China trading dates need update.
-        if (self.__ChinaTradingDates is None) or (self.__ChinaTradingDates[-1] < self.todayStringChina()):
-            calendar = ts.trade_cal()
-            self.__ChinaTradingDates = calendar[calendar.isOpen == 1]['calendarDate'].values
+        # Check if China trading dates need update, at most once per CALENDAR_CHECK_INTERVAL.
+        check_time = time.time()
+        if (self.__ChinaTradingDates is None) or (self.__tradingDatesCheckTime is None) or \
+                (check_time - self.__tradingDatesCheckTime >= TradingDateTime.CALENDAR_CHECK_INTERVAL):
+            if (self.__ChinaTradingDates is None) or (self.__ChinaTradingDates[-1] < self.todayStringChina()):
+                self.__ChinaTradingDates = self.downloadTradingDates()
+            self.__tradingDatesCheckTime = check_time
         return self.__ChinaTradingDates
 
+    """ Use given trading dates, e.g. a synthetic calendar, until the next check finds them not covering today. Nothing is saved. """
+    def setChinaTradingDates(self, dates):
+        self.__ChinaTradingDates = numpy.asarray(dates, dtype = object)
+        self.__tradingDatesCheckTime = time.time()
+
+    """ Download China trading dates and save the snapshot. Keep using the existing dates if download fails. """
+    def downloadTradingDates(self):
+        try:
+            calendar = import_tushare().trade_cal()
+        except Exception as e:
+            if self.__ChinaTradingDates is None:
+                raise
+            print("Failed to download China trading dates, keep using dates until %s: %s" % (self.__ChinaTradingDates[-1], e))
+            return self.__ChinaTradingDates
+        dates = numpy.asarray(calendar[calendar.isOpen == 1]['calendarDate'].values, dtype = object)
+        self.saveTradingDatesSnapshot(dates)
+        return dates
+
+    """ Return trading dates in the snapshot file, or None if there is no snapshot. """
+    def loadTradingDatesSnapshot(self):
+        if self.calendar_snapshot_path is None or not os.path.exists(self.calendar_snapshot_path):
+            return None
+        with open(self.calendar_snapshot_path) as f:
+            # Skip the header line.
+            dates = [line.strip() for line in f.readlines()[1:] if line.strip()]
+        return numpy.asarray(dates, dtype = object) if dates else None
+
+    def saveTradingDatesSnapshot(self, dates):
+        if self.calendar_snapshot_path is None:
+            return
+        # Write to a temporary file first so that a crash never leaves a truncated snapshot.
+        temp_path = self.calendar_snapshot_path + ".tmp"
+        with open(temp_path, "w") as f:
+            f.write("calendarDate\n")
+            for day in dates:
+                f.write("%s\n" % day)
+        os.replace(temp_path, self.calendar_snapshot_path)
+
     def isTradingDayChina(self, day):
         index = bisect.bisect_left(self.getChinaTradingDates(), day)
         return day == self.getChinaTradingDates()[index]
@@ -117,7 +191,11 @@ class TradingDateTime(object):
     def closeTimeOfCurrentMinuteIntervalChina(self, minute_interval, nowChina, check_opening = True):
         if check_opening and not self.isTradingDayChina(nowChina.strftime(TradingDateTime.DAY_STRFTIME)):
             return None
-        hour, minute, second = (nowChina.hour, nowChina.minute, nowChina.second)
+        close_hour, close_minute = self.closeTimeOfMinuteInterval(minute_interval, nowChina.hour, nowChina.minute, nowChina.second)
+        return datetime.datetime(nowChina.year, nowChina.month, nowChina.day, close_hour, close_minute, 0, tzinfo = nowChina.tzinfo)
+
+    """ (hour, minute) of the close of the minute_interval interval containing the time of day hour:minute:second. """
+    def closeTimeOfMinuteInterval(self, minute_interval, hour, minute, second):
         # Check if now is in the morning
         is_morning = (hour, minute, second) < TradingDateTime.CHINA_AFTERNOON_OPEN
         if is_morning:
@@ -140,7 +218,46 @@ class TradingDateTime(object):
             if (close_hour, close_minute, 0) > TradingDateTime.CHINA_AFTERNOON_CLOSE:
                 close_hour, close_minute, _ = TradingDateTime.CHINA_AFTERNOON_CLOSE
 
-        return datetime.datetime(nowChina.year, nowChina.month, nowChina.day, close_hour, close_minute, 0, tzinfo = nowChina.tzinfo)
+        return (close_hour, close_minute)
+
+    """ Given an interval and a datetime string, return the close datetime string of the interval containing it. (0, 1] -> 1 """
+    def intervalCloseOfDatetime(self, interval, datetime_str):
+        if not interval.endswith("min"):
+            return datetime_str.split(' ')[0]
+        # Take the time of day from the string, which costs much less than parsing it, since this runs for every quote.
+        close_hour, close_minute = self.closeTimeOfMinuteInterval(
+            int(interval[:-3]), int(datetime_str[11:13]), int(datetime_str[14:16]), int(datetime_str[17:19]))
+        return "%s %02d:%02d:00" % (datetime_str[:10], close_hour, close_minute)
+
+    """ Return a datetime object of the first close of interval after the given datetime. [0, 1) -> 1 """
+    def nextIntervalCloseTimeChina(self, interval, nowChina = None):
+        if nowChina is None:
+            nowChina = self.nowChina()
+        if interval.endswith("min"):
+            last_close = self.lastClosedMinuteIntervalTimeChina(int(interval[:-3]), nowChina).strftime(TradingDateTime.DATETIME_STRFTIME)
+            next_close = datetime.datetime.strptime(self.nextIntervalClose(interval, last_close), TradingDateTime.DATETIME_STRFTIME)
+        else:
+            day = datetime.datetime.strptime(self.nextTradingDayChina(self.lastClosedDayChina(nowChina)), TradingDateTime.DAY_STRFTIME)
+            next_close = datetime.datetime.combine(day, datetime.time(*TradingDateTime.CHINA_AFTERNOON_CLOSE))
+        return next_close.replace(tzinfo = nowChina.tzinfo)
+
+    """ Return a datetime object of the first time from the given datetime on when realtime data is available. [0] -> 0 """
+    def nextRealtimeDataAvailableTimeChina(self, nowChina = None):
+        if nowChina is None:
+            nowChina = self.nowChina()
+        if self.isRealtimeDataAvailableChina(nowChina):
+            return nowChina
+        day_str = nowChina.strftime(TradingDateTime.DAY_STRFTIME)
+        time_of_day = (nowChina.hour, nowChina.minute, nowChina.second)
+        if self.isTradingDayChina(day_str) and time_of_day < TradingDateTime.CHINA_OPENING_AUCTION_CLOSE:
+            open_time = TradingDateTime.CHINA_OPENING_AUCTION_CLOSE
+        elif self.isTradingDayChina(day_str) and time_of_day < TradingDateTime.CHINA_AFTERNOON_OPEN:
+            open_time = TradingDateTime.CHINA_AFTERNOON_OPEN
+        else:
+            day_str = self.nextTradingDayChina(day_str)
+            open_time = TradingDateTime.CHINA_OPENING_AUCTION_CLOSE
+        day = datetime.datetime.strptime(day_str, TradingDateTime.DAY_STRFTIME)
+        return datetime.datetime.combine(day, datetime.time(*open_time)).replace(tzinfo = nowChina.tzinfo)
 
     """ Given a minute interval and close time of an interval, return the close time of the previous interval. [1] -> 0 """
     def previousMinuteIntervalClose(self, minute_interval, close_time):
@@ -170,6 +287,10 @@ class TradingDateTime(object):
 
     """ Given an interval and a datetime string, return the close datetime string of the previous interval. [1] -> 0 """
     def previousIntervalClose(self, interval, datetime_str):
+        ordinal = self.intervalCloseOrdinal(interval, datetime_str)
+        if ordinal is not None and ordinal > 0:
+            return self.intervalCloseFromOrdinal(interval, ordinal - 1)
+        # Fall back to calendar arithmetic for datetimes off the session grid.
         # Import here to break circular dependency.
         from PriceData import PriceData
         if interval == PriceData.DAY:
@@ -210,6 +331,12 @@ class TradingDateTime(object):
 
     """ Given an interval and a datetime string, return the close datetime string of the next interval. [0] -> 1 """
     def nextIntervalClose(self, interval, datetime_str):
+        ordinal = self.intervalCloseOrdinal(interval, datetime_str)
+        if ordinal is not None:
+            next_close = self.intervalCloseFromOrdinal(interval, ordinal + 1)
+            if next_close is not None:
+                return next_close
+        # Fall back to calendar arithmetic for datetimes off the session grid.
         # Import here to break circular dependency.
         from PriceData import PriceData
         if interval == PriceData.DAY:
@@ -219,6 +346,120 @@ class TradingDateTime(object):
                     int(interval[:-3]), datetime.datetime.strptime(datetime_str, TradingDateTime.DATETIME_STRFTIME)
                 ).strftime(TradingDateTime.DATETIME_STRFTIME)
 
+    """ Close times (HH:MM:SS) of all intervals in a trading day. The last interval of a session may not be full. """
+    def sessionCloseTimes(self, minute_interval):
+        close_times = []
+        for (open_time, close_time) in [(TradingDateTime.CHINA_MORNING_OPEN, TradingDateTime.CHINA_MORNING_CLOSE),
+                (TradingDateTime.CHINA_AFTERNOON_OPEN, TradingDateTime.CHINA_AFTERNOON_CLOSE)]:
+            minute = open_time[0] * 60 + open_time[1] + minute_interval
+            close_minute = close_time[0] * 60 + close_time[1]
+            while minute < close_minute:
+                close_times.append("%02d:%02d:00" % (minute // 60, minute % 60))
+                minute += minute_interval
+            close_times.append("%02d:%02d:00" % close_time[:2])
+        return close_times
+
+    def __getSessionGrid(self):
+        dates = self.getChinaTradingDates()
+        if self.__gridTradingDates is not dates:
+            self.__dayOrdinals = dict((day, ordinal) for ordinal, day in enumerate(dates))
+            self.__dayArray = numpy.asarray(dates).astype("datetime64[D]")
+            self.__gridTradingDates = dates
+        return self.__sessionGrids
+
+    """ Number of interval closes in a trading day. """
+    def barsPerDay(self, interval):
+        if interval.endswith("min"):
+            return len(self.__sessionGrids[interval]["close_times"])
+        return 1
+
+    """ Given an interval and a close datetime string, return the bar ordinal on the session grid, or None if it's not an interval close. """
+    def intervalCloseOrdinal(self, interval, datetime_str):
+        grids = self.__getSessionGrid()
+        if interval.endswith("min"):
+            grid = grids.get(interval)
+            if grid is None:
+                return None
+            day_ordinal = self.__dayOrdinals.get(datetime_str[:10])
+            bar = grid["bar_of_time"].get(datetime_str[11:])
+            if day_ordinal is None or bar is None:
+                return None
+            return day_ordinal * len(grid["close_times"]) + bar
+        return self.__dayOrdinals.get(datetime_str)
+
+    """ Given an interval and a bar ordinal on the session grid, return the close datetime string, or None if it's out of the calendar. """
+    def intervalCloseFromOrdinal(self, interval, ordinal):
+        grids = self.__getSessionGrid()
+        if interval.endswith("min"):
+            close_times = grids[interval]["close_times"]
+            day_ordinal, bar = divmod(ordinal, len(close_times))
+        else:
+            day_ordinal, bar = ordinal, None
+        if ordinal < 0 or day_ordinal >= len(self.__gridTradingDates):
+            return None
+        day_str = self.__gridTradingDates[day_ordinal]
+        return day_str if bar is None else "%s %s" % (day_str, close_times[bar])
+
+    """ Vectorized intervalCloseFromOrdinal: convert an array of bar ordinals on the session grid to close datetime strings. """
+    def intervalClosesFromOrdinals(self, interval, ordinals):
+        self.__getSessionGrid()
+        ordinals = numpy.asarray(ordinals, dtype = numpy.int64)
+        if interval.endswith("min"):
+            close_times = numpy.array([" " + close_time for close_time in self.__sessionGrids[interval]["close_times"]])
+            day_ordinals, bars = numpy.divmod(ordinals, len(close_times))
+            days = numpy.asarray(self.__gridTradingDates).astype(str)[day_ordinals]
+            return numpy.char.add(days, close_times[bars]).astype(object)
+        return numpy.asarray(self.__gridTradingDates, dtype = object)[ordinals]
+
+    """
+    Map bars of day in base_interval to bars of day in a coarser interval, e.g. 5min to 60min, following session boundaries.
+    Return (coarse_bar_of_base_bar, base_bar_count_of_coarse_bar) as int64 arrays. Every base bar belongs to the coarse bar which
+    closes at or after it in the same session, so the last coarse bar of a session may hold fewer base bars.
+    """
+    def barOfDayMapping(self, base_interval, interval):
+        base_close_times = self.__sessionGrids[base_interval]["close_times"]
+        if interval.endswith("min"):
+            close_times = self.__sessionGrids[interval]["close_times"]
+            coarse_bars = numpy.searchsorted(numpy.array(close_times), numpy.array(base_close_times), side = "left")
+        else:
+            close_times = [TradingDateTime.CHINA_AFTERNOON_CLOSE]
+            coarse_bars = numpy.zeros(len(base_close_times), dtype = numpy.int64)
+        counts = numpy.bincount(coarse_bars, minlength = len(close_times))
+        return (coarse_bars.astype(numpy.int64), counts.astype(numpy.int64))
+
+    """
+    Vectorized intervalCloseOrdinal: convert a sequence of close datetime strings (e.g. a DataFrame index) to an int64 array of
+    bar ordinals in one call. Datetimes which are not interval closes on the grid get -1.
+    A datetime64 array is taken as is, which saves parsing strings of many records, e.g. records read from price stores.
+    """
+    def intervalCloseOrdinals(self, interval, datetime_strs):
+        grids = self.__getSessionGrid()
+        if len(datetime_strs) == 0:
+            return numpy.zeros(0, dtype = numpy.int64)
+        if isinstance(datetime_strs, numpy.ndarray) and datetime_strs.dtype.kind == "M":
+            times = datetime_strs.astype("datetime64[s]")
+        elif len(datetime_strs) <= TradingDateTime.SCALAR_ORDINALS_SIZE:
+            # Dict lookups per string cost less than the array conversions for the few records of an update.
+            ordinals = [self.intervalCloseOrdinal(interval, datetime_str) for datetime_str in datetime_strs]
+            return numpy.array([-1 if ordinal is None else ordinal for ordinal in ordinals], dtype = numpy.int64)
+        else:
+            times = numpy.asarray(datetime_strs, dtype = object).astype("datetime64[s]")
+        days = times.astype("datetime64[D]")
+        day_ordinals = numpy.searchsorted(self.__dayArray, days)
+        in_calendar = day_ordinals < len(self.__dayArray)
+        in_calendar[in_calendar] = self.__dayArray[day_ordinals[in_calendar]] == days[in_calendar]
+        if interval.endswith("min"):
+            grid = grids[interval]
+            seconds = (times - days).astype(numpy.int64)
+            on_minute = (seconds % 60 == 0)
+            bars = grid["bar_of_minute"][numpy.where(on_minute, seconds // 60, 0)]
+            valid = in_calendar & on_minute & (bars >= 0)
+            ordinals = day_ordinals * len(grid["close_times"]) + bars
+        else:
+            valid = in_calendar & (times == days)
+            ordinals = day_ordinals
+        return numpy.where(valid, ordinals, -1).astype(numpy.int64)
+
     def nowChina(self):
         return price_data_loader_china.get().now()
 
@@ -1,7 +1,41 @@
 from CSI300 import CSI300
+from MovingAverageScreener import MovingAverageScreener
 from SimpleMovingAverage import SimpleMovingAverage
 
-csi300 = CSI300()
-for sma_name in SimpleMovingAverage.DEFAULT_PARAMS.keys():
-    date, ma = csi300.price_data.sma.sma[sma_name][0][1][-1]
-    print("Moving average %03s at %s:\t%s" % (sma_name, date, ma))
+import argparse
+
+def print_moving_averages(csi300):
+    for sma_name in SimpleMovingAverage.DEFAULT_PARAMS.keys():
+        date, ma = csi300.price_data.sma.line(sma_name, 0)[1][-1]
+        print("Moving average %03s at %s:\t%s" % (sma_name, date, ma))
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description = "Track moving averages of CSI300.")
+    parser.add_argument("mode", nargs = "?", choices = ["once", "daemon", "scan"], default = "once",
+        help = "once: update history data, print moving averages and exit; daemon: keep polling until interrupted; "
+            "scan: rank codes by saved price data relative to the moving averages")
+    parser.add_argument("--csv-base-name", default = "csi300")
+    parser.add_argument("--snapshot", default = "csi300.snapshot", help = "warm-start snapshot of the computed state")
+    parser.add_argument("--no-snapshot", action = "store_true", help = "neither restore nor save a snapshot")
+    parser.add_argument("--interval", type = int, default = 20, help = "seconds between realtime polls in daemon mode")
+    parser.add_argument("--metrics-port", type = int, help = "serve metrics on this local port in daemon mode")
+    parser.add_argument("--codes", help = "comma separated codes to scan, the CSI300 constituents by default")
+    parser.add_argument("--csv-base-name-format", default = "%s", help = "saved price data of a code to scan, e.g. data/%%s")
+    parser.add_argument("--top", type = int, default = 20, help = "number of codes to print in scan mode")
+    args = parser.parse_args()
+
+    snapshot_path = None if args.no_snapshot else args.snapshot
+    if args.mode == "scan":
+        codes = args.codes.split(",") if args.codes else CSI300.constituent_codes()
+        ranking = MovingAverageScreener().scan_saved(codes, args.csv_base_name_format)
+        print(ranking.head(args.top).to_string())
+    elif args.mode == "daemon":
+        csi300 = CSI300(args.interval, args.metrics_port, args.csv_base_name, snapshot_path)
+        print_moving_averages(csi300)
+        csi300.run_polling()
+    else:
+        csi300 = CSI300(args.interval, None, args.csv_base_name, snapshot_path)
+        csi300.update_hist_data()
+        csi300.flush_events()
+        print_moving_averages(csi300)
+        csi300.save_snapshot()
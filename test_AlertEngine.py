@@ -0,0 +1,71 @@
+from AlertEngine import AlertEngine
+from EventBus import AlertEvent, EventBus, MaUpdatedEvent, TickEvent
+
+import unittest
+
+class AlertEngineTest(unittest.TestCase):
+
+    PARAMS = {"5": [("5min", 5), ("day", 5)], "20": [("5min", 20)]}
+
+    def setUp(self):
+        self.engine = AlertEngine(["sh000300", "sz000001"], AlertEngineTest.PARAMS, tolerance = 0.01)
+
+    def kinds(self, alerts):
+        return [(alert.code, alert.interval, alert.count, alert.kind) for alert in alerts]
+
+    def test_crossings_are_alerted_once(self):
+        self.engine.update_ma("sh000300", "5min", {5: 100.0})
+        self.assertEqual(self.engine.evaluate({"sh000300": 90.0}), [])
+        # Exactly at the line is a touch but no crossing yet.
+        self.assertEqual(self.kinds(self.engine.evaluate({"sh000300": 100.0})), [("sh000300", "5min", 5, AlertEngine.TOUCH)])
+        self.assertEqual(self.kinds(self.engine.evaluate({"sh000300": 110.0})), [("sh000300", "5min", 5, AlertEngine.CROSS_UP)])
+        self.assertEqual(self.engine.evaluate({"sh000300": 120.0}), [])
+        # Codes without a tick keep their side.
+        self.assertEqual(self.engine.evaluate({"sz000001": 10.0}), [])
+        alerts = self.engine.evaluate({"sh000300": 80.0})
+        self.assertEqual(self.kinds(alerts), [("sh000300", "5min", 5, AlertEngine.CROSS_DOWN)])
+        self.assertEqual((alerts[0].price, alerts[0].ma), (80.0, 100.0))
+
+    def test_touches_are_alerted_on_approach(self):
+        self.engine.update_ma("sz000001", "day", {5: 10.0})
+        self.engine.evaluate({"sz000001": 9.0})
+        self.assertEqual(self.kinds(self.engine.evaluate({"sz000001": 9.95})), [("sz000001", "day", 5, AlertEngine.TOUCH)])
+        self.assertEqual(self.engine.evaluate({"sz000001": 9.98}), [])
+        self.engine.evaluate({"sz000001": 9.0})
+        self.assertEqual(self.kinds(self.engine.evaluate({"sz000001": 10.05})), [("sz000001", "day", 5, AlertEngine.CROSS_UP), ("sz000001", "day", 5, AlertEngine.TOUCH)])
+
+    def test_alignment_changes_are_alerted(self):
+        self.engine.update_ma("sh000300", "5min", {5: 110.0, 20: 100.0})
+        # The first known alignment is the initial state.
+        self.assertEqual(self.engine.evaluate({"sh000300": 120.0}), [])
+        self.engine.update_ma("sh000300", "5min", {5: 95.0})
+        self.assertEqual(self.kinds(self.engine.evaluate({"sh000300": 120.0})), [("sh000300", "5min", None, AlertEngine.BEARISH)])
+        self.engine.update_ma("sh000300", "5min", {5: 100.0})
+        self.assertEqual(self.kinds(self.engine.evaluate({"sh000300": 120.0})), [("sh000300", "5min", None, AlertEngine.MIXED)])
+
+    def test_new_codes_are_added(self):
+        self.engine.update_ma("sh600000", "5min", {5: 10.0, 7: 1.0})
+        self.engine.evaluate({"sh600000": 9.0})
+        self.assertEqual(self.kinds(self.engine.evaluate({"sh600000": 11.0})), [("sh600000", "5min", 5, AlertEngine.CROSS_UP)])
+        self.assertEqual(self.engine.codes, ["sh000300", "sz000001", "sh600000"])
+
+    def test_alerts_are_published(self):
+        event_bus = EventBus()
+        alerts = []
+        alert_subscription = event_bus.subscribe(alerts.extend, [AlertEvent])
+        subscription = self.engine.subscribe(event_bus)
+        try:
+            event_bus.publish(MaUpdatedEvent("sh000300", "5min", True, {5: 100.0}))
+            event_bus.publish(TickEvent("sh000300", "2018-03-05 10:00:00", 110.0, None))
+            self.assertTrue(event_bus.flush(timeout = 10))
+            event_bus.publish(TickEvent("sh000300", "2018-03-05 10:00:03", 90.0, None))
+            # Alerts are published by the alert engine while the bus is flushed, so flush again for them.
+            self.assertTrue(event_bus.flush(timeout = 10))
+            self.assertTrue(event_bus.flush(timeout = 10))
+        finally:
+            event_bus.unsubscribe(subscription, timeout = 10)
+            event_bus.unsubscribe(alert_subscription, timeout = 10)
+        self.assertEqual(self.kinds(alerts), [("sh000300", "5min", 5, AlertEngine.CROSS_DOWN)])
+
+if __name__ == "__main__":
+    unittest.main()
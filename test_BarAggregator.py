@@ -0,0 +1,49 @@
+from BarAggregator import BarAggregator
+from SyntheticPriceData import SyntheticPriceData
+from TradingDateTime import trading_date_time
+
+import numpy
+
+import unittest
+
+def setUpModule():
+    trading_date_time.setChinaTradingDates(SyntheticPriceData.trading_dates("2017-01-01", "2030-12-31"))
+
+class BarAggregatorTest(unittest.TestCase):
+
+    def setUp(self):
+        self.base_data = SyntheticPriceData("2018-03-01", "2018-03-09").generate()["5min"]
+        self.aggregator = BarAggregator()
+
+    """ Records of interval grouped by the interval close of every base record, complete or not. """
+    def grouped(self, base_data, interval):
+        closes = [trading_date_time.intervalCloseOfDatetime(interval, date) for date in base_data.index]
+        return base_data.groupby(closes).agg({"open": "first", "high": "max", "low": "min", "close": "last", "volume": "sum"})
+
+    def test_records_follow_session_boundaries(self):
+        for interval in ["15min", "30min", "60min", "day"]:
+            aggregated = self.aggregator.aggregate(self.base_data, interval)
+            expected = self.grouped(self.base_data, interval)
+            self.assertEqual(list(aggregated.index), list(expected.index))
+            for column in expected.columns:
+                numpy.testing.assert_allclose(aggregated[column].to_numpy(dtype = numpy.float64), expected[column].to_numpy(dtype = numpy.float64))
+        closes = self.aggregator.aggregate(self.base_data, "60min").index
+        self.assertEqual([date[11:] for date in closes[:4]], ["10:30:00", "11:30:00", "14:00:00", "15:00:00"])
+
+    def test_incomplete_records_are_not_built(self):
+        base_data = self.base_data.drop("2018-03-05 10:05:00")
+        aggregated = self.aggregator.aggregate(base_data, "30min")
+        self.assertNotIn("2018-03-05 10:30:00", aggregated.index)
+        self.assertEqual(len(aggregated.index), len(self.aggregator.aggregate(self.base_data, "30min").index) - 1)
+        self.assertNotIn("2018-03-05", self.aggregator.aggregate(base_data, "day").index)
+
+    def test_extend_matches_aggregate(self):
+        for interval in ["15min", "60min", "day"]:
+            for last in ["2018-03-05 10:05:00", "2018-03-05 11:30:00", "2018-03-05 15:00:00"]:
+                head = self.base_data.loc[:last]
+                data = self.aggregator.aggregate(head, interval)
+                extended = self.aggregator.extend(interval, data, self.base_data, last)
+                self.assertTrue(extended.equals(self.aggregator.aggregate(self.base_data, interval)), "%s after %s" % (interval, last))
+
+if __name__ == "__main__":
+    unittest.main()
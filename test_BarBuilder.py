@@ -0,0 +1,44 @@
+from BarBuilder import BarBuilder
+from SyntheticPriceData import SyntheticPriceData
+from TradingDateTime import trading_date_time
+
+import datetime
+import unittest
+
+def setUpModule():
+    trading_date_time.setChinaTradingDates(SyntheticPriceData.trading_dates("2017-01-01", "2030-12-31"))
+
+class BarBuilderTest(unittest.TestCase):
+
+    def update(self, builder, quotes):
+        finalized = []
+        for price, time_str, volume in quotes:
+            finalized += builder.update(price, "2018-03-05 " + time_str, volume)
+        return finalized
+
+    def test_partial_first_bar_is_dropped(self):
+        builder = BarBuilder(["5min"])
+        finalized = self.update(builder, [(10.0, "10:02:00", 100), (10.5, "10:04:00", 150), (10.2, "10:06:00", 160)])
+        self.assertEqual(finalized, [])
+        finalized = self.update(builder, [(9.8, "10:08:00", 200), (10.1, "10:11:00", 230)])
+        self.assertEqual(finalized, [("5min", "2018-03-05 10:10:00", {"open": 10.2, "high": 10.2, "low": 9.8, "close": 9.8, "volume": 50})])
+
+    def test_bar_after_lunch_break_follows_morning_bar(self):
+        builder = BarBuilder(["5min"])
+        finalized = self.update(builder, [(10.0, "11:27:00", None), (10.1, "11:29:00", None), (10.2, "13:01:00", None), (10.3, "13:06:00", None)])
+        self.assertEqual([close for _, close, _ in finalized], ["2018-03-05 13:05:00"])
+
+    def test_bar_after_missed_interval_is_dropped(self):
+        builder = BarBuilder(["5min"])
+        finalized = self.update(builder, [(10.0, "10:02:00", None), (10.1, "10:06:00", None), (10.2, "10:17:00", None), (10.3, "10:21:00", None)])
+        self.assertEqual([close for _, close, _ in finalized], ["2018-03-05 10:10:00"])
+
+    def test_bars_from_opening_auction_are_whole(self):
+        builder = BarBuilder(["5min", "day"])
+        self.update(builder, [(10.0, "09:25:00", 100), (10.4, "09:33:00", 300), (10.3, "09:36:00", 400)])
+        finalized = builder.flush(datetime.datetime(2018, 3, 5, 15, 0, 0))
+        self.assertEqual([(interval, close) for interval, close, _ in finalized], [("5min", "2018-03-05 09:40:00"), ("day", "2018-03-05")])
+        self.assertEqual(finalized[1][2]["open"], 10.0)
+
+if __name__ == "__main__":
+    unittest.main()
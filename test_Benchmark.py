@@ -0,0 +1,51 @@
+from Benchmark import Benchmark
+from SyntheticPriceData import SyntheticPriceData
+from TradingDateTime import trading_date_time
+
+import json
+import unittest
+
+def setUpModule():
+    trading_date_time.setChinaTradingDates(SyntheticPriceData.trading_dates("2017-01-01", "2030-12-31"))
+
+class SyntheticPriceDataTest(unittest.TestCase):
+
+    def test_trading_dates_skip_weekends_and_holidays(self):
+        dates = SyntheticPriceData.trading_dates("2018-09-28", "2018-10-09")
+        self.assertEqual(dates, ["2018-09-28", "2018-10-08", "2018-10-09"])
+
+    def test_data_is_reproducible_and_consistent(self):
+        price_data = SyntheticPriceData("2018-03-01", "2018-03-09", seed = 1).generate()
+        again = SyntheticPriceData("2018-03-01", "2018-03-09", seed = 1).generate()
+        other = SyntheticPriceData("2018-03-01", "2018-03-09", seed = 2).generate()
+        base = price_data["5min"]
+        self.assertTrue(base.equals(again["5min"]))
+        self.assertFalse(base.equals(other["5min"]))
+        self.assertEqual(len(base.index), 7 * trading_date_time.barsPerDay("5min"))
+        self.assertEqual(list(price_data["day"].index), SyntheticPriceData.trading_dates("2018-03-01", "2018-03-09"))
+        for data in price_data.values():
+            self.assertTrue((data["low"] <= data[["open", "close"]].min(axis = 1)).all())
+            self.assertTrue((data["high"] >= data[["open", "close"]].max(axis = 1)).all())
+        self.assertEqual(price_data["day"]["close"].iloc[-1], base["close"].iloc[-1])
+
+class BenchmarkTest(unittest.TestCase):
+
+    def tearDown(self):
+        setUpModule()
+
+    def test_report(self):
+        benchmark = Benchmark("2018-03-01", "2018-03-30", repeat = 2, operations = 10, params = {"5": [("5min", 5), ("day", 5)]})
+        names = ["previous_interval_close", "merge_tencent_hist_data", "replay"]
+        report = benchmark.run(names)
+        self.assertEqual([result["name"] for result in report["results"]], names)
+        for result in report["results"]:
+            self.assertEqual(len(result["seconds"]), 2)
+            self.assertGreater(result["operations"], 0)
+            self.assertGreater(result["best_seconds_per_operation"], 0)
+        self.assertEqual(report["parameters"]["records"]["day"], len(SyntheticPriceData.trading_dates("2018-03-01", "2018-03-30")))
+        json.dumps(report)
+        with self.assertRaises(Exception):
+            benchmark.run(["unknown"])
+
+if __name__ == "__main__":
+    unittest.main()
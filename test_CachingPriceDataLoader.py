@@ -0,0 +1,108 @@
+from CachingPriceDataLoader import CachingPriceDataLoaderChina
+from SyntheticPriceData import SyntheticPriceData
+from TradingDateTime import trading_date_time
+
+import pandas
+
+import datetime
+import threading
+import time
+import unittest
+
+def setUpModule():
+    trading_date_time.setChinaTradingDates(SyntheticPriceData.trading_dates("2017-01-01", "2030-12-31"))
+
+class CountingLoader(object):
+    """ A data source which counts requests, and holds them until released is set. """
+
+    def __init__(self, now):
+        self.fake_now = now
+        self.requests = []
+        self.released = threading.Event()
+        self.released.set()
+        self.fail = False
+        self.dates = ["2018-03-05 09:55", "2018-03-05 10:00"]
+
+    def now(self):
+        return self.fake_now
+
+    def get_k_data(self, code = None, start = '', end = '', ktype = 'D', autype = 'qfq', index = False, retry_count = 3, pause = 0.001):
+        self.requests.append((code, ktype))
+        self.released.wait(10)
+        if self.fail:
+            raise Exception("timeout")
+        if code is None:
+            return None
+        return pandas.DataFrame({"date": self.dates, "close": [float(len(self.requests))] * len(self.dates)})
+
+class CachingPriceDataLoaderTest(unittest.TestCase):
+
+    def setUp(self):
+        self.delegate = CountingLoader(datetime.datetime(2018, 3, 5, 10, 1, 0))
+        self.loader = CachingPriceDataLoaderChina(self.delegate, rate_limits = {})
+
+    def test_responses_are_cached_as_copies(self):
+        data = self.loader.get_k_data("sh000001", ktype = "5")
+        data.loc[0, "close"] = 100.0
+        self.assertEqual(self.loader.get_k_data("sh000001", ktype = "5")["close"].iloc[0], 1.0)
+        self.loader.get_k_data("sh000002", ktype = "5")
+        self.assertEqual(len(self.delegate.requests), 2)
+        self.loader.invalidate()
+        self.loader.get_k_data("sh000001", ktype = "5")
+        self.assertEqual(len(self.delegate.requests), 3)
+
+    def test_time_to_live_ends_at_next_close(self):
+        self.assertEqual(self.loader.time_to_live("get_k_data", "5"), 60)
+        self.delegate.fake_now = datetime.datetime(2018, 3, 5, 10, 4, 50)
+        self.assertEqual(self.loader.time_to_live("get_k_data", "5"), 10)
+        self.assertEqual(self.loader.time_to_live("get_realtime_quotes", None), 3)
+
+    def test_failures_and_no_response_are_not_cached(self):
+        self.delegate.fail = True
+        with self.assertRaises(Exception):
+            self.loader.get_k_data("sh000001", ktype = "5")
+        self.delegate.fail = False
+        self.assertIsNone(self.loader.get_k_data(None, ktype = "5"))
+        self.assertIsNone(self.loader.get_k_data(None, ktype = "5"))
+        self.loader.get_k_data("sh000001", ktype = "5")
+        self.assertEqual(len(self.delegate.requests), 4)
+
+    def test_responses_without_closed_record_are_not_cached(self):
+        # The data source doesn't have the record closed at 10:00 yet.
+        self.delegate.dates = ["2018-03-05 09:50", "2018-03-05 09:55"]
+        self.assertEqual(self.loader.get_k_data("sh000001", ktype = "5")["date"].iloc[-1], "2018-03-05 09:55")
+        # The retry gets it, and then it's cached.
+        self.delegate.dates = ["2018-03-05 09:55", "2018-03-05 10:00"]
+        self.assertEqual(self.loader.get_k_data("sh000001", ktype = "5")["date"].iloc[-1], "2018-03-05 10:00")
+        self.assertEqual(self.loader.get_k_data("sh000001", ktype = "5")["date"].iloc[-1], "2018-03-05 10:00")
+        self.assertEqual(len(self.delegate.requests), 2)
+        self.delegate.dates = ["2018-03-01", "2018-03-02"]
+        self.loader.get_k_data("sh000001", ktype = "D")
+        self.loader.get_k_data("sh000001", ktype = "D")
+        self.assertEqual(len(self.delegate.requests), 3)
+
+    def test_least_recently_used_responses_are_evicted(self):
+        self.loader.max_entries = 2
+        for code in ["sh000001", "sh000002", "sh000001", "sh000003", "sh000001", "sh000002"]:
+            self.loader.get_k_data(code, ktype = "5")
+        self.assertEqual(self.delegate.requests, [("sh000001", "5"), ("sh000002", "5"), ("sh000003", "5"), ("sh000002", "5")])
+
+    def test_concurrent_requests_are_coalesced(self):
+        self.delegate.released.clear()
+        results = []
+        threads = [threading.Thread(target = lambda: results.append(self.loader.get_k_data("sh000001", ktype = "5"))) for _ in range(4)]
+        for thread in threads:
+            thread.start()
+        # Let the waiting requests join the one in flight before it completes.
+        while len(self.loader.in_flight) == 0:
+            time.sleep(0.01)
+        time.sleep(0.1)
+        self.delegate.released.set()
+        for thread in threads:
+            thread.join(10)
+        self.assertEqual(len(results), 4)
+        self.assertEqual(len(self.delegate.requests), 1)
+        self.assertEqual(len(set(id(result) for result in results)), 4)
+
+if __name__ == "__main__":
+    unittest.main()
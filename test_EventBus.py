@@ -0,0 +1,83 @@
+from EventBus import AlertEvent, BarClosedEvent, EventBus, MaUpdatedEvent, TickEvent
+from EventConsole import EventConsole
+
+import contextlib
+import io
+import threading
+import unittest
+
+class EventBusTest(unittest.TestCase):
+
+    def setUp(self):
+        self.event_bus = EventBus()
+
+    def tearDown(self):
+        for subscription in list(self.event_bus.subscriptions):
+            self.event_bus.unsubscribe(subscription, timeout = 10)
+
+    def test_events_are_handled_in_order_by_type(self):
+        ticks = []
+        bars = []
+        self.event_bus.subscribe(ticks.extend, [TickEvent])
+        self.event_bus.subscribe(bars.extend, [BarClosedEvent])
+        self.assertTrue(self.event_bus.wants(TickEvent))
+        self.assertFalse(self.event_bus.wants(MaUpdatedEvent))
+        events = [TickEvent("sh000300", "2018-03-05 10:00:%02d" % i, float(i), None) for i in range(100)]
+        for event in events:
+            self.event_bus.publish(event)
+        self.event_bus.publish(BarClosedEvent("sh000300", "5min", "2018-03-05 10:00:00", {"close": 1.0}))
+        self.event_bus.publish(MaUpdatedEvent("sh000300", "5min", True, {5: 1.0}))
+        self.assertTrue(self.event_bus.flush(timeout = 10))
+        self.assertEqual(ticks, events)
+        self.assertEqual([bar.close for bar in bars], ["2018-03-05 10:00:00"])
+
+    def test_slow_subscriber_drops_oldest_events(self):
+        released = threading.Event()
+        handled = []
+        def slow_handler(events):
+            released.wait(10)
+            handled.extend(events)
+        subscription = self.event_bus.subscribe(slow_handler, queue_size = 4, batch_size = 1)
+        for i in range(20):
+            self.event_bus.publish(TickEvent("sh000300", str(i), float(i), None))
+        released.set()
+        self.assertTrue(self.event_bus.flush(timeout = 10))
+        # The first event was taken by the handler before the queue filled up, the last ones stayed queued.
+        self.assertEqual([event.time for event in handled[-4:]], ["16", "17", "18", "19"])
+        self.assertEqual(subscription.dropped + len(handled), 20)
+        self.assertGreater(subscription.dropped, 0)
+
+    def test_failing_handler_keeps_subscription(self):
+        handled = []
+        def failing_handler(events):
+            handled.extend(events)
+            raise Exception("failed")
+        self.event_bus.subscribe(failing_handler, batch_size = 1)
+        with contextlib.redirect_stdout(io.StringIO()):
+            for i in range(3):
+                self.event_bus.publish(TickEvent("sh000300", str(i), float(i), None))
+            self.assertTrue(self.event_bus.flush(timeout = 10))
+        self.assertEqual(len(handled), 3)
+
+class EventConsoleTest(unittest.TestCase):
+
+    def test_batch_prints_latest_events(self):
+        stream = io.StringIO()
+        EventConsole(stream).handle([
+            TickEvent("sh000300", "2018-03-05 10:00:00", 1.0, None),
+            MaUpdatedEvent("sh000300", "5min", True, {20: 2.0, 5: None}),
+            TickEvent("sh000300", "2018-03-05 10:00:03", 1.5, None),
+            AlertEvent("sh000300", "5min", 5, "cross_above", 1.5, 1.25),
+            AlertEvent("sh000300", "5min", 5, "cross_above", 1.5, 1.25),
+            AlertEvent("sh000300", "day", None, "bullish", 1.5, None),
+            ])
+        self.assertEqual(stream.getvalue().splitlines(), [
+            "sh000300 realtime price at 2018-03-05 10:00:03:\t1.5",
+            "sh000300 realtime MA at interval 5min:\t5 None, 20 2.000",
+            "sh000300 alert: cross_above MA (5min, 5) 1.250 at 1.5",
+            "sh000300 alert: cross_above MA (5min, 5) 1.250 at 1.5",
+            "sh000300 alert: moving averages at interval day turn bullish at 1.5",
+            ])
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,95 @@
+from FakePriceDataLoader import FakePriceDataLoaderChina
+from HistDataBackfill import HistDataBackfill
+from PriceStore import PriceStore
+from RateLimiter import RateLimiter
+from SyntheticPriceData import SyntheticPriceData
+from TradingDateTime import trading_date_time
+
+import PriceDataLoader
+
+import contextlib
+import datetime
+import io
+import os
+import shutil
+import tempfile
+import unittest
+
+def setUpModule():
+    trading_date_time.setChinaTradingDates(SyntheticPriceData.trading_dates("2017-01-01", "2030-12-31"))
+
+class BackfillPriceDataLoaderChina(FakePriceDataLoaderChina):
+    """ A fake data source which fails for failing_code, with price data saved in price stores like the real loader. """
+    has_saved_data = PriceDataLoader.PriceDataLoaderChina.has_saved_data
+    save_csv = PriceDataLoader.PriceDataLoaderChina.save_csv
+
+    def __init__(self, start_datetime, csv_base_name, failing_code):
+        FakePriceDataLoaderChina.__init__(self, start_datetime, csv_base_name)
+        self.failing_code = failing_code
+
+    def get_k_data(self, code = None, start = '', end = '', ktype = 'D', autype = 'qfq', index = False, retry_count = 3, pause = 0.001):
+        if code == self.failing_code:
+            raise Exception("timeout")
+        return FakePriceDataLoaderChina.get_k_data(self, code, start, end, ktype, autype, index, retry_count, pause)
+
+class HistDataBackfillTest(unittest.TestCase):
+
+    INTERVALS = ["5min", "day"]
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.csv_base_name = os.path.join(self.directory, "synthetic")
+        self.csv_base_name_format = os.path.join(self.directory, "%s")
+        self.previous_loader = PriceDataLoader.price_data_loader_china
+        SyntheticPriceData("2018-03-01", "2018-03-09").save(self.csv_base_name)
+
+    def tearDown(self):
+        PriceDataLoader.price_data_loader_china = self.previous_loader
+        shutil.rmtree(self.directory)
+
+    def install_loader(self, failing_code = None):
+        loader = BackfillPriceDataLoaderChina(datetime.datetime(2018, 3, 7, 10, 0, 0), self.csv_base_name, failing_code)
+        PriceDataLoader.price_data_loader_china = loader
+        return loader
+
+    def test_results_are_saved_as_they_are_ready(self):
+        loader = self.install_loader()
+        results = []
+        backfill = HistDataBackfill(max_workers = 4, max_processes = 0)
+        downloaded = backfill.run(["sh000001", "sz000001"], HistDataBackfillTest.INTERVALS, self.csv_base_name_format,
+            on_result = lambda code, interval, data: results.append((code, interval)))
+        self.assertEqual(sorted(results), [(code, interval) for code in ["sh000001", "sz000001"] for interval in HistDataBackfillTest.INTERVALS])
+        for interval in HistDataBackfillTest.INTERVALS:
+            expected = loader.get_fake_price_data_for_interval(interval)
+            self.assertEqual(list(downloaded["sh000001"][interval].index), list(expected.index))
+            saved = PriceStore(PriceStore.path_of_csv(HistDataBackfill.csv_path(self.csv_base_name_format, "sz000001", interval))).read(dates_as_strings = True)
+            self.assertEqual(list(saved.index), list(expected.index))
+        self.assertEqual(backfill.failures, [])
+
+    def test_saved_data_is_skipped(self):
+        self.install_loader()
+        backfill = HistDataBackfill(max_processes = 0)
+        backfill.run(["sh000001"], ["day"], self.csv_base_name_format)
+        downloaded = backfill.run(["sh000001", "sz000001"], HistDataBackfillTest.INTERVALS, self.csv_base_name_format, skip_saved = True)
+        self.assertEqual(sorted(downloaded["sh000001"].keys()), ["5min"])
+        self.assertEqual(sorted(downloaded["sz000001"].keys()), HistDataBackfillTest.INTERVALS)
+
+    def test_failures_are_recorded(self):
+        self.install_loader(failing_code = "sz000001")
+        backfill = HistDataBackfill(max_processes = 0)
+        with contextlib.redirect_stdout(io.StringIO()):
+            downloaded = backfill.run(["sh000001", "sz000001"], ["day"])
+        self.assertEqual(list(downloaded["sh000001"].keys()), ["day"])
+        self.assertEqual(downloaded["sz000001"], {})
+        self.assertEqual([(code, interval) for (code, interval, _) in backfill.failures], [("sz000001", "day")])
+
+class RateLimiterTest(unittest.TestCase):
+
+    def test_burst_then_rate(self):
+        rate_limiter = RateLimiter(rate = 1000.0, burst = 3)
+        self.assertEqual([rate_limiter.try_acquire() for _ in range(4)], [True, True, True, False])
+        rate_limiter.acquire()
+        self.assertFalse(rate_limiter.try_acquire(tokens = 3))
+
+if __name__ == "__main__":
+    unittest.main()
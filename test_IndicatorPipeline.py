@@ -0,0 +1,73 @@
+from Indicator import AverageTrueRange, BollingerBands, ExponentialMovingAverage, Macd, RollingHighLow
+from IndicatorPipeline import IndicatorPipeline
+from SyntheticPriceData import SyntheticPriceData
+from TradingDateTime import trading_date_time
+
+import numpy
+
+import contextlib
+import io
+import unittest
+
+def setUpModule():
+    trading_date_time.setChinaTradingDates(SyntheticPriceData.trading_dates("2017-01-01", "2030-12-31"))
+
+class IndicatorPipelineTest(unittest.TestCase):
+
+    def setUp(self):
+        self.data = SyntheticPriceData("2018-03-01", "2018-03-09").generate()["15min"]
+        self.indicators = [ExponentialMovingAverage(5), Macd(3, 6, 2), BollingerBands(20, 2.0), AverageTrueRange(14), RollingHighLow(10)]
+
+    def create_pipeline(self, data):
+        pipeline = IndicatorPipeline({"15min": self.indicators})
+        pipeline.load_price_data({"15min": data})
+        return pipeline
+
+    def test_values_match_batch_calculations(self):
+        values = self.create_pipeline(self.data).values("15min")
+        close, high, low = self.data["close"], self.data["high"], self.data["low"]
+        self.assertAlmostEqual(values["ema5"], close.ewm(span = 5, adjust = False).mean().iloc[-1])
+        macd = close.ewm(span = 3, adjust = False).mean() - close.ewm(span = 6, adjust = False).mean()
+        signal = macd.ewm(span = 2, adjust = False).mean()
+        numpy.testing.assert_allclose(values["macd3_6_2"], (macd.iloc[-1], signal.iloc[-1], macd.iloc[-1] - signal.iloc[-1]))
+        middle, deviation = close.iloc[-20:].mean(), close.iloc[-20:].std(ddof = 0)
+        numpy.testing.assert_allclose(values["boll20"], (middle, middle + 2 * deviation, middle - 2 * deviation))
+        true_range = numpy.maximum(high - low, numpy.maximum((high - close.shift()).abs(), (low - close.shift()).abs())).fillna(high - low).to_numpy()
+        atr = true_range[:14].mean()
+        for value in true_range[14:]:
+            atr += (value - atr) / 14
+        self.assertAlmostEqual(values["atr14"], atr)
+        self.assertEqual(values["hl10"], (high.iloc[-10:].max(), low.iloc[-10:].min()))
+
+    def test_appended_records_match_loaded_records(self):
+        pipeline = self.create_pipeline(self.data.iloc[:40])
+        for end in range(41, len(self.data.index) + 1, 7):
+            pipeline.append_price_records("15min", None, self.data.iloc[:end])
+        pipeline.append_price_records("15min", None, self.data)
+        loaded = self.create_pipeline(self.data).values("15min")
+        for name, value in pipeline.values("15min").items():
+            numpy.testing.assert_allclose(value, loaded[name], err_msg = name)
+
+    def test_realtime_values_leave_closed_state(self):
+        head = self.data.iloc[:-1]
+        pipeline = self.create_pipeline(head)
+        closed = pipeline.values("15min")
+        price = self.data["close"].iloc[-1]
+        pipeline.update_realtime({"15min": {"this_close": self.data.index[-1], "last_price": price}})
+        self.assertEqual(pipeline.values("15min"), closed)
+        provisional = head.copy()
+        provisional.loc[self.data.index[-1]] = {"open": price, "close": price, "high": price, "low": price, "volume": 0.0, "code": "000300"}
+        expected = self.create_pipeline(provisional).values("15min")
+        for name, value in expected.items():
+            numpy.testing.assert_allclose(pipeline.realtime_value("15min", name), value, err_msg = name)
+
+    def test_hole_restarts_indicators(self):
+        data = self.data.drop(self.data.index[-7])
+        with contextlib.redirect_stdout(io.StringIO()):
+            pipeline = self.create_pipeline(data)
+        # Indicators start again with the 6 records after the hole.
+        self.assertAlmostEqual(pipeline.value("15min", "ema5"), data["close"].iloc[-6:].ewm(span = 5, adjust = False).mean().iloc[-1])
+        self.assertIsNone(pipeline.value("15min", "hl10"))
+
+if __name__ == "__main__":
+    unittest.main()
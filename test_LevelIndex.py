@@ -0,0 +1,35 @@
+from LevelIndex import LevelIndex
+
+import unittest
+
+class LevelIndexTest(unittest.TestCase):
+
+    def setUp(self):
+        self.levels = LevelIndex()
+        for key, value in [(("day", 5), 10.0), (("day", 20), 12.0), (("60min", 20), 10.0), (("15min", 80), 11.0)]:
+            self.levels.update(key, value)
+
+    def test_nearest_levels_around_price(self):
+        self.assertEqual(self.levels.below(11.0, 2), [(10.0, ("60min", 20)), (10.0, ("day", 5))])
+        self.assertEqual(self.levels.above(11.0, 2), [(11.0, ("15min", 80)), (12.0, ("day", 20))])
+        self.assertEqual(self.levels.below(10.0), [])
+        self.assertEqual(self.levels.above(12.5), [])
+
+    def test_update_moves_level(self):
+        self.levels.update(("day", 5), 13.0)
+        self.levels.update(("day", 5), 13.0)
+        self.assertEqual(len(self.levels), 4)
+        self.assertEqual(self.levels.above(12.5), [(13.0, ("day", 5))])
+        self.assertEqual(self.levels.below(10.5, 4), [(10.0, ("60min", 20))])
+        self.levels.remove(("60min", 20))
+        self.levels.remove(("60min", 20))
+        self.assertEqual(self.levels.below(10.5), [])
+        self.assertEqual(self.levels.prices, sorted(self.levels.values.values()))
+
+    def test_levels_within_fraction(self):
+        self.assertEqual([key for _, key in self.levels.within(10.5, 0.06)], [("day", 5), ("60min", 20), ("15min", 80)])
+        self.assertEqual(self.levels.density(11.0, 0.1), 4)
+        self.assertEqual(self.levels.density(11.0, 0.01), 1)
+
+if __name__ == "__main__":
+    unittest.main()
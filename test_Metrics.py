@@ -0,0 +1,68 @@
+from Metrics import Metrics
+
+import json
+import unittest
+import urllib.request
+
+class MetricsTest(unittest.TestCase):
+
+    def setUp(self):
+        self.metrics = Metrics(buckets = (0.1, 1.0))
+
+    def test_counters_and_histograms(self):
+        self.metrics.increment("loader.calls")
+        self.metrics.increment("loader.calls", 2)
+        for seconds in [0.05, 0.5, 5.0]:
+            self.metrics.observe("loader.get_k_data", seconds)
+        snapshot = self.metrics.snapshot()
+        self.assertEqual(snapshot["counters"], {"loader.calls": 3})
+        histogram = snapshot["histograms"]["loader.get_k_data"]
+        self.assertEqual((histogram["count"], histogram["min"], histogram["max"]), (3, 0.05, 5.0))
+        self.assertAlmostEqual(histogram["mean"], 5.55 / 3)
+        self.assertEqual(histogram["buckets"], [[0.1, 1], [1.0, 1], [None, 1]])
+        self.metrics.reset()
+        self.assertEqual(self.metrics.snapshot()["counters"], {})
+
+    def test_timed_counts_errors(self):
+        @self.metrics.timed("merge")
+        def merge(fail):
+            if fail:
+                raise Exception("failed")
+            return 1
+        self.assertEqual(merge(False), 1)
+        with self.assertRaises(Exception):
+            merge(True)
+        snapshot = self.metrics.snapshot()
+        self.assertEqual(snapshot["histograms"]["merge"]["count"], 2)
+        self.assertEqual(snapshot["counters"], {"merge.errors": 1})
+
+    def test_disabled_metrics_are_not_updated(self):
+        self.metrics.enabled = False
+        self.metrics.increment("calls")
+        with self.metrics.timer("poll"):
+            pass
+        snapshot = self.metrics.snapshot()
+        self.assertEqual((snapshot["counters"], snapshot["histograms"]), ({}, {}))
+
+    def test_prometheus_text(self):
+        self.metrics.increment("polling.missed_intervals")
+        self.metrics.observe("sma.update_realtime", 0.5)
+        lines = self.metrics.prometheus_text().splitlines()
+        self.assertIn("tsrpcr_polling_missed_intervals 1", lines)
+        self.assertEqual([line for line in lines if line.startswith("tsrpcr_sma_update_realtime_seconds_bucket")], [
+            "tsrpcr_sma_update_realtime_seconds_bucket{le=\"0.1\"} 0",
+            "tsrpcr_sma_update_realtime_seconds_bucket{le=\"1.0\"} 1",
+            "tsrpcr_sma_update_realtime_seconds_bucket{le=\"+Inf\"} 1"])
+        self.assertIn("tsrpcr_sma_update_realtime_seconds_count 1", lines)
+
+    def test_serve(self):
+        self.metrics.increment("calls")
+        server = self.metrics.serve(port = 0)
+        try:
+            with urllib.request.urlopen("http://127.0.0.1:%d/metrics.json" % server.server_address[1], timeout = 10) as response:
+                self.assertEqual(json.loads(response.read())["counters"], {"calls": 1})
+        finally:
+            self.metrics.stop_serving()
+
+if __name__ == "__main__":
+    unittest.main()
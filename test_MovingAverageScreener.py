@@ -0,0 +1,79 @@
+from MovingAverageScreener import MovingAverageScreener
+from SyntheticPriceData import SyntheticPriceData
+from TradingDateTime import trading_date_time
+
+import numpy
+
+import os
+import shutil
+import tempfile
+import unittest
+
+def setUpModule():
+    trading_date_time.setChinaTradingDates(SyntheticPriceData.trading_dates("2017-01-01", "2030-12-31"))
+
+class MovingAverageScreenerTest(unittest.TestCase):
+
+    PARAMS = {"5": [("5min", 5), ("day", 3)], "20": [("5min", 20)]}
+    CODES = ["sh600000", "sh600001", "sh600002"]
+
+    def setUp(self):
+        self.screener = MovingAverageScreener(MovingAverageScreenerTest.PARAMS, slope_lookback = 3)
+        self.price_data = dict((code, SyntheticPriceData("2018-03-01", "2018-03-09", code, seed).generate())
+            for seed, code in enumerate(MovingAverageScreenerTest.CODES))
+
+    def test_distances_match_moving_averages(self):
+        ranking = self.screener.scan(self.price_data)
+        self.assertEqual(sorted(ranking.index), MovingAverageScreenerTest.CODES)
+        for code, price_data in self.price_data.items():
+            row = ranking.loc[code]
+            price = price_data["5min"]["close"].iloc[-1]
+            self.assertEqual(row["price"], price)
+            self.assertEqual(row["date"], price_data["5min"].index[-1])
+            self.assertFalse(row["stale"])
+            for interval, count in [("5min", 5), ("5min", 20), ("day", 3)]:
+                ma = price_data[interval]["close"].iloc[-count:].mean()
+                self.assertAlmostEqual(row["%s_%d" % (interval, count)], price / ma - 1)
+            self.assertTrue(-1 <= row["trend_strength"] <= 1)
+        strengths = ranking["trend_strength"].to_numpy()
+        self.assertTrue((numpy.diff(strengths) <= 0).all())
+
+    def test_resistance_is_lowest_line_above_price(self):
+        ranking = self.screener.scan(self.price_data)
+        for code, row in ranking.iterrows():
+            lines = dict((name, row["price"] / (row[name] + 1)) for name in self.screener.line_names)
+            above = [(ma, name) for name, ma in lines.items() if ma > row["price"]]
+            if above:
+                ma, name = min(above)
+                self.assertEqual(row["resistance_line"], name)
+                self.assertAlmostEqual(row["resistance"], ma)
+            else:
+                self.assertIsNone(row["resistance_line"])
+
+    def test_lines_after_hole_and_stale_codes(self):
+        price_data = self.price_data["sh600001"]
+        # A hole 10 records before the end leaves too few records for the 20 record line.
+        price_data["5min"] = price_data["5min"].drop(price_data["5min"].index[-11])
+        # A code whose data ends a day earlier.
+        self.price_data["sh600002"] = dict((interval, data[data.index < "2018-03-09"]) for interval, data in self.price_data["sh600002"].items())
+        ranking = self.screener.scan(self.price_data)
+        self.assertTrue(numpy.isnan(ranking.loc["sh600001", "5min_20"]))
+        self.assertFalse(numpy.isnan(ranking.loc["sh600001", "5min_5"]))
+        self.assertEqual(list(ranking["stale"][MovingAverageScreenerTest.CODES]), [False, False, True])
+
+    def test_saved_data_scan_matches_scan(self):
+        directory = tempfile.mkdtemp()
+        try:
+            csv_base_name_format = os.path.join(directory, "%s")
+            for seed, code in enumerate(MovingAverageScreenerTest.CODES):
+                SyntheticPriceData("2018-03-01", "2018-03-09", code, seed).save(csv_base_name_format % code)
+            saved = self.screener.scan_saved(MovingAverageScreenerTest.CODES + ["sh600003"], csv_base_name_format)
+        finally:
+            shutil.rmtree(directory)
+        ranking = self.screener.scan(self.price_data)
+        self.assertTrue(saved.drop("sh600003").equals(ranking))
+        self.assertTrue(saved.loc["sh600003", "stale"])
+        self.assertEqual(saved.index[-1], "sh600003")
+
+if __name__ == "__main__":
+    unittest.main()
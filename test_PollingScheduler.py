@@ -0,0 +1,75 @@
+from PollingScheduler import PollingScheduler
+from SyntheticPriceData import SyntheticPriceData
+from TradingDateTime import trading_date_time
+
+import PriceDataLoader
+
+import asyncio
+import datetime
+import unittest
+
+def setUpModule():
+    trading_date_time.setChinaTradingDates(SyntheticPriceData.trading_dates("2017-01-01", "2030-12-31"))
+
+class FakeClock(object):
+
+    def __init__(self, start):
+        self.start = start
+        self.started = datetime.datetime.now()
+
+    def get(self):
+        return self
+
+    def now(self):
+        return self.start + (datetime.datetime.now() - self.started)
+
+class LatePriceData(object):
+    """ History data whose closed records arrive after late_polls polls. Stops the scheduler after stop_polls polls. """
+
+    def __init__(self, late_polls, stop_polls):
+        self.late_polls = late_polls
+        self.stop_polls = stop_polls
+        self.polls = 0
+        self.scheduler = None
+
+    def update_hist_data(self, now):
+        self.polls += 1
+        if self.polls >= self.stop_polls:
+            self.scheduler.stop()
+
+    def missing_hist_data(self, now):
+        return ["5min"] if self.polls <= self.late_polls else []
+
+    def update_realtime(self):
+        pass
+
+class PollingSchedulerTest(unittest.TestCase):
+
+    def setUp(self):
+        self.loader = PriceDataLoader.price_data_loader_china
+
+    def tearDown(self):
+        PriceDataLoader.price_data_loader_china = self.loader
+
+    def run_scheduler(self, now, price_data, stop_when_updated = False):
+        PriceDataLoader.price_data_loader_china = FakeClock(now)
+        scheduler = PollingScheduler(price_data, hist_data_delay = 0, hist_data_retry_delay = 0.01, max_hist_data_retry_delay = 0.02,
+            on_hist_data_updated = (lambda: scheduler.stop()) if stop_when_updated else None)
+        price_data.scheduler = scheduler
+        asyncio.run(asyncio.wait_for(scheduler.run_async(), timeout = 10))
+
+    def test_retries_until_closed_records_arrive(self):
+        # A Saturday, so that the next close is far away and realtime polling sleeps.
+        price_data = LatePriceData(late_polls = 3, stop_polls = 10)
+        self.run_scheduler(datetime.datetime(2018, 3, 3, 10, 0, 1), price_data, stop_when_updated = True)
+        # Three late polls and the one which got the records.
+        self.assertEqual(price_data.polls, 4)
+
+    def test_retries_stop_at_next_close(self):
+        price_data = LatePriceData(late_polls = 100, stop_polls = 2)
+        self.run_scheduler(datetime.datetime(2018, 3, 5, 10, 34, 59, 995000), price_data)
+        # No retry fits before the next close, so the second poll is the one after it.
+        self.assertEqual(price_data.polls, 2)
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,158 @@
+from FakePriceDataLoader import FakePriceDataLoaderChina
+from PriceData import PriceData
+from SimpleMovingAverage import SimpleMovingAverage
+from SyntheticPriceData import SyntheticPriceData
+from TradingDateTime import trading_date_time
+
+import PriceDataLoader
+
+import contextlib
+import datetime
+import io
+import os
+import shutil
+import tempfile
+import unittest
+
+def setUpModule():
+    trading_date_time.setChinaTradingDates(SyntheticPriceData.trading_dates("2017-01-01", "2030-12-31"))
+
+class PriceDataTest(unittest.TestCase):
+    """ PriceData served by a FakePriceDataLoaderChina from synthetic price data. """
+
+    PARAMS = {"5": [("5min", 5), ("15min", 5)]}
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.csv_base_name = os.path.join(self.directory, "synthetic")
+        self.previous_loader = PriceDataLoader.price_data_loader_china
+        SyntheticPriceData("2018-03-01", "2018-03-09").save(self.csv_base_name)
+        self.loader = FakePriceDataLoaderChina(datetime.datetime(2018, 3, 7, 10, 0, 0), self.csv_base_name)
+        PriceDataLoader.price_data_loader_china = self.loader
+
+    def tearDown(self):
+        PriceDataLoader.price_data_loader_china = self.previous_loader
+        shutil.rmtree(self.directory)
+
+    def create_price_data(self, **kwargs):
+        with contextlib.redirect_stdout(io.StringIO()):
+            price_data = PriceData("sh000300", self.csv_base_name, self.loader.now(), **kwargs)
+            price_data.set_simple_moving_average(SimpleMovingAverage(PriceDataTest.PARAMS))
+        # Never save over the synthetic data.
+        price_data.csv_base_name = None
+        return price_data
+
+    def build_next_bar(self, price_data, close):
+        next_close = self.loader.dates["5min"][self.loader.fake_now_position + 1]
+        bar = {"open": close, "high": close, "low": close, "close": close, "volume": 1.0}
+        with contextlib.redirect_stdout(io.StringIO()):
+            price_data.append_built_bars([("5min", next_close, bar)])
+        return next_close
+
+    def test_built_records_are_provisional(self):
+        price_data = self.create_price_data()
+        last_close = price_data.price_data["5min"].index[-1]
+        next_close = self.build_next_bar(price_data, 1.0)
+        self.assertEqual(price_data.price_data["5min"].index[-1], next_close)
+        self.assertEqual(price_data.confirmed_data("5min").index[-1], last_close)
+        self.loader.advance()
+        self.assertIn("5min", price_data.missing_hist_data(self.loader.now()))
+
+    def test_downloaded_records_replace_provisional_ones(self):
+        price_data = self.create_price_data()
+        next_close = self.build_next_bar(price_data, 1.0)
+        self.assertAlmostEqual(price_data.sma.current_values("5min")[5], price_data.price_data["5min"]["close"].iloc[-5:].mean())
+        self.loader.advance()
+        with contextlib.redirect_stdout(io.StringIO()):
+            price_data.merge_hist_data("5min")
+        downloaded = self.loader.price_data["5min"].loc[:next_close]
+        self.assertEqual(price_data.price_data["5min"]["close"].iloc[-1], downloaded["close"].iloc[-1])
+        self.assertEqual(price_data.provisional_closes, {})
+        self.assertNotIn("5min", price_data.missing_hist_data(self.loader.now()))
+        self.assertAlmostEqual(price_data.sma.current_values("5min")[5], downloaded["close"].iloc[-5:].mean())
+
+    def test_aggregated_records_of_provisional_records_are_provisional(self):
+        price_data = self.create_price_data(aggregate_locally = True)
+        # Build up to the close of the current 15min interval.
+        while True:
+            next_close = self.build_next_bar(price_data, 1.0)
+            self.loader.advance()
+            if next_close[14:16] in ("00", "15", "30", "45"):
+                break
+        self.assertEqual(price_data.price_data["15min"].index[-1], next_close)
+        self.assertEqual(price_data.provisional_closes["15min"], next_close)
+        self.assertLess(price_data.confirmed_data("15min").index[-1], next_close)
+        with contextlib.redirect_stdout(io.StringIO()):
+            price_data.merge_hist_data("5min")
+        self.assertEqual(price_data.provisional_closes, {})
+        downloaded = self.loader.price_data["15min"]
+        self.assertEqual(price_data.price_data["15min"]["close"].iloc[-1], downloaded["close"].loc[next_close])
+        self.assertAlmostEqual(price_data.sma.current_values("15min")[5], downloaded["close"].loc[:next_close].iloc[-5:].mean())
+
+    def test_tail_merge_appends_new_records(self):
+        price_data = self.create_price_data()
+        stored = price_data.price_data["5min"]
+        for _ in range(3):
+            self.loader.advance()
+        downloaded = self.loader.get_fake_price_data_for_interval("5min")
+        merged = price_data.tail_merge_price_data(stored, downloaded.iloc[-60:])
+        self.assertEqual(list(merged.index), list(downloaded.index))
+        self.assertTrue(merged.iloc[-3:].equals(downloaded.iloc[-3:]))
+        self.assertIs(price_data.tail_merge_price_data(stored, stored.iloc[-10:]), stored)
+
+    def test_tail_merge_falls_back_to_full_merge(self):
+        price_data = self.create_price_data()
+        stored = price_data.price_data["5min"]
+        data = stored.iloc[-10:].copy()
+        with contextlib.redirect_stdout(io.StringIO()):
+            # A restated record.
+            data.iloc[-3, data.columns.get_loc("close")] += 1.0
+            self.assertIsNone(price_data.tail_merge_price_data(stored, data))
+            # A record missing from stored data.
+            self.assertIsNone(price_data.tail_merge_price_data(stored.drop(stored.index[-5]), stored.iloc[-10:]))
+            # Records out of order.
+            self.assertIsNone(price_data.tail_merge_price_data(stored, stored.iloc[-10:].iloc[::-1]))
+
+    def test_backfill_requests_minute_holes_once(self):
+        price_data = self.create_price_data()
+        # The data source only gives the last day of 5min records.
+        self.loader.k_data_window = 48
+        old, recent = "2018-03-02 10:00:00", "2018-03-06 14:00:00"
+        price_data.price_data["5min"] = price_data.price_data["5min"].drop([old, recent])
+        price_data.gap_index.build("5min", price_data.price_data["5min"].index)
+        requests = []
+        get_k_data = self.loader.get_k_data
+        def counting_get_k_data(**kwargs):
+            requests.append((kwargs["ktype"], kwargs["start"], kwargs["end"]))
+            return get_k_data(**kwargs)
+        self.loader.get_k_data = counting_get_k_data
+        with contextlib.redirect_stdout(io.StringIO()):
+            self.assertEqual(price_data.backfill_gaps(), 1)
+        self.assertEqual(requests, [("5", "2018-03-02", "2018-03-06")])
+        self.assertIn(recent, price_data.price_data["5min"].index)
+        self.assertEqual(price_data.gap_index.missing_closes("5min"), [old])
+        self.assertEqual(price_data.gap_index.unfillable("5min").tolist(), price_data.gap_index.gaps["5min"].tolist())
+        self.assertAlmostEqual(price_data.sma.current_values("5min")[5], price_data.price_data["5min"]["close"].iloc[-5:].mean())
+        with contextlib.redirect_stdout(io.StringIO()):
+            self.assertEqual(price_data.backfill_gaps(), 0)
+        self.assertEqual(len(requests), 1)
+
+    def test_failed_backfill_is_requested_again(self):
+        price_data = self.create_price_data()
+        recent = "2018-03-06 14:00:00"
+        price_data.price_data["5min"] = price_data.price_data["5min"].drop([recent])
+        price_data.gap_index.build("5min", price_data.price_data["5min"].index)
+        get_k_data = self.loader.get_k_data
+        def failing_get_k_data(**kwargs):
+            raise Exception("timeout")
+        self.loader.get_k_data = failing_get_k_data
+        with contextlib.redirect_stdout(io.StringIO()):
+            self.assertEqual(price_data.backfill_gaps(), 0)
+        self.assertEqual(len(price_data.gap_index.pending("5min")), 1)
+        self.loader.get_k_data = get_k_data
+        with contextlib.redirect_stdout(io.StringIO()):
+            self.assertEqual(price_data.backfill_gaps(), 1)
+        self.assertEqual(price_data.gap_index.missing_count("5min"), 0)
+
+if __name__ == "__main__":
+    unittest.main()
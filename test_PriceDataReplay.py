@@ -0,0 +1,52 @@
+from FakePriceDataLoader import FakePriceDataLoaderChina
+from PriceDataReplay import PriceDataReplay
+from SyntheticPriceData import SyntheticPriceData
+from TradingDateTime import trading_date_time
+
+import PriceDataLoader
+
+import datetime
+import os
+import shutil
+import tempfile
+import unittest
+
+def setUpModule():
+    trading_date_time.setChinaTradingDates(SyntheticPriceData.trading_dates("2017-01-01", "2030-12-31"))
+
+class PriceDataReplayTest(unittest.TestCase):
+
+    PARAMS = {"5": [("5min", 5), ("15min", 5), ("day", 5)], "20": [("5min", 20), ("60min", 20)]}
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.csv_base_name = os.path.join(self.directory, "synthetic")
+        SyntheticPriceData("2018-03-01", "2018-03-23").save(self.csv_base_name)
+        self.start_datetime = datetime.datetime(2018, 3, 12, 10, 0, 0)
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_cursor_moves_forward_and_back(self):
+        loader = FakePriceDataLoaderChina(self.start_datetime, self.csv_base_name)
+        dates = loader.dates["5min"]
+        for datetime_str in ["2018-03-12 10:00:00", "2018-03-12 10:02:00", "2018-03-13 14:00:00", "2018-03-12 09:35:00", "2030-01-01 09:35:00"]:
+            self.assertEqual(loader.cursor("5min", datetime_str), sum(1 for date in dates if date <= datetime_str))
+
+    def test_replay_matches_batch_averages(self):
+        replay = PriceDataReplay(self.csv_base_name, self.start_datetime, params = PriceDataReplayTest.PARAMS)
+        previous_loader = PriceDataLoader.price_data_loader_china
+        self.assertEqual(replay.run(steps = 200), 200)
+        self.assertIs(PriceDataLoader.price_data_loader_china, previous_loader)
+        loader = replay.loader
+        for interval, counts in [("5min", [5, 20]), ("15min", [5]), ("60min", [20]), ("day", [5])]:
+            closed = loader.get_fake_price_data_for_interval(interval)
+            self.assertEqual(replay.price_data.price_data[interval].index[-1], closed.index[-1])
+            values = replay.price_data.sma.current_values(interval)
+            for count in counts:
+                self.assertAlmostEqual(values[count], closed["close"].iloc[-count:].mean())
+        series = dict((interval_def, sma_series) for interval_def, sma_series in replay.price_data.sma.sma["5"])
+        self.assertEqual(series[("5min", 5)][-1][0], loader.fake_now_str)
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,91 @@
+from FakePriceDataLoader import FakePriceDataLoaderChina
+from PriceData import PriceData
+from PriceDataSnapshot import PriceDataSnapshot
+from SimpleMovingAverage import SimpleMovingAverage
+from SyntheticPriceData import SyntheticPriceData
+from TradingDateTime import trading_date_time
+
+import PriceDataLoader
+
+import contextlib
+import datetime
+import io
+import os
+import shutil
+import tempfile
+import threading
+import unittest
+
+def setUpModule():
+    trading_date_time.setChinaTradingDates(SyntheticPriceData.trading_dates("2017-01-01", "2030-12-31"))
+
+class PriceDataSnapshotTest(unittest.TestCase):
+
+    PARAMS = {"5": [("5min", 5), ("day", 5)]}
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.csv_base_name = os.path.join(self.directory, "synthetic")
+        self.previous_loader = PriceDataLoader.price_data_loader_china
+        SyntheticPriceData("2018-03-01", "2018-03-09").save(self.csv_base_name)
+        self.loader = FakePriceDataLoaderChina(datetime.datetime(2018, 3, 7, 10, 0, 0), self.csv_base_name)
+        PriceDataLoader.price_data_loader_china = self.loader
+        with contextlib.redirect_stdout(io.StringIO()):
+            self.price_data = PriceData("sh000300", self.csv_base_name, self.loader.now())
+            self.price_data.set_simple_moving_average(SimpleMovingAverage(PriceDataSnapshotTest.PARAMS))
+        # Never save over the synthetic data.
+        self.price_data.csv_base_name = None
+        self.snapshot = PriceDataSnapshot(os.path.join(self.directory, "snapshot"))
+
+    def tearDown(self):
+        PriceDataLoader.price_data_loader_china = self.previous_loader
+        shutil.rmtree(self.directory)
+
+    def load(self):
+        with contextlib.redirect_stdout(io.StringIO()):
+            return self.snapshot.load("sh000300", None, PriceDataSnapshotTest.PARAMS)
+
+    def test_round_trip_recreates_lock(self):
+        self.snapshot.save(self.price_data)
+        restored = self.load()
+        self.assertIsNotNone(restored)
+        self.assertIsNot(restored.lock, self.price_data.lock)
+        self.assertTrue(restored.lock.acquire(blocking = False))
+        restored.lock.release()
+        self.assertEqual(list(restored.price_data["5min"].index), list(self.price_data.price_data["5min"].index))
+        self.assertEqual(restored.sma.current_values("5min"), self.price_data.sma.current_values("5min"))
+
+    def test_snapshot_of_other_state_is_ignored(self):
+        with contextlib.redirect_stdout(io.StringIO()):
+            self.assertIsNone(self.snapshot.load("sh000300", None))
+            self.snapshot.save(self.price_data)
+            self.assertIsNone(self.snapshot.load("sz000001", None))
+            self.assertIsNone(self.snapshot.load("sh000300", None, {"5": [("5min", 5)]}))
+            self.assertIsNotNone(self.snapshot.load("sh000300", None))
+            with open(self.snapshot.path, "wb") as f:
+                f.write(b"truncated")
+            self.assertIsNone(self.snapshot.load("sh000300", None))
+
+    def test_save_waits_for_update_in_progress(self):
+        saved = threading.Event()
+        def save():
+            self.snapshot.save(self.price_data)
+            saved.set()
+        with self.price_data.lock:
+            thread = threading.Thread(target = save)
+            thread.start()
+            self.assertFalse(saved.wait(0.2))
+            self.assertFalse(os.path.exists(self.snapshot.path))
+            # An update which holds the lock is all in the snapshot.
+            next_close = self.loader.dates["5min"][self.loader.fake_now_position + 1]
+            bar = {"open": 1.0, "high": 1.0, "low": 1.0, "close": 1.0, "volume": 1.0}
+            with contextlib.redirect_stdout(io.StringIO()):
+                self.price_data.append_built_bars([("5min", next_close, bar)])
+        thread.join(10)
+        self.assertTrue(saved.is_set())
+        restored = self.load()
+        self.assertEqual(restored.price_data["5min"].index[-1], next_close)
+        self.assertEqual(restored.provisional_closes["5min"], next_close)
+
+if __name__ == "__main__":
+    unittest.main()
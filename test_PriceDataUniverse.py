@@ -0,0 +1,84 @@
+from PriceDataUniverse import PriceDataUniverse
+from SyntheticPriceData import SyntheticPriceData
+from TradingDateTime import trading_date_time
+
+import PriceDataLoader
+
+import pandas
+
+import contextlib
+import datetime
+import io
+import unittest
+
+def setUpModule():
+    trading_date_time.setChinaTradingDates(SyntheticPriceData.trading_dates("2017-01-01", "2030-12-31"))
+
+class QuotedPriceData(object):
+    """ Price data which records the quotes it gets. """
+
+    def __init__(self, code):
+        self.code = code
+        self.quotes = []
+
+    def update_realtime_with_quote(self, data):
+        self.quotes.append(data)
+
+class QuoteLoader(object):
+    """ get_realtime_quotes of the data source, which has no quote for codes in missing. """
+
+    def __init__(self, missing = ()):
+        self.missing = set(missing)
+        self.requests = []
+
+    def get(self):
+        return self
+
+    def get_realtime_quotes(self, symbols = None):
+        self.requests.append(list(symbols))
+        codes = [code[-6:] for code in symbols if code not in self.missing]
+        return pandas.DataFrame({"code": codes, "price": [float(code) for code in codes], "date": "2018-03-05", "time": "10:00:00"})
+
+class PriceDataUniverseTest(unittest.TestCase):
+
+    NOW = datetime.datetime(2018, 3, 5, 10, 0, 0)
+
+    def setUp(self):
+        self.previous_loader = PriceDataLoader.price_data_loader_china
+
+    def tearDown(self):
+        PriceDataLoader.price_data_loader_china = self.previous_loader
+
+    def create_universe(self, codes, batch_size):
+        universe = PriceDataUniverse(batch_size = batch_size)
+        for code in codes:
+            universe.add(QuotedPriceData(code))
+        return universe
+
+    def test_batches_separate_codes_of_same_digits(self):
+        universe = self.create_universe(["sh000001", "sz000001", "sh600000", "sz000002", "sh600001"], batch_size = 2)
+        batches = [sorted(batch.values()) for batch in universe.batches()]
+        self.assertEqual(batches, [["sh000001", "sh600000"], ["sz000001", "sz000002"], ["sh600001"]])
+        universe.remove("sh600000")
+        self.assertEqual(sum(len(batch) for batch in universe.batches()), 4)
+
+    def test_quotes_fan_out_to_their_codes(self):
+        universe = self.create_universe(["sh000001", "sz000001", "sh600000"], batch_size = 100)
+        loader = PriceDataLoader.price_data_loader_china = QuoteLoader(missing = ["sh600000"])
+        with contextlib.redirect_stdout(io.StringIO()):
+            missing = universe.update_realtime(PriceDataUniverseTest.NOW)
+        self.assertEqual(len(loader.requests), 2)
+        self.assertEqual(missing, ["sh600000"])
+        self.assertEqual([quote["price"] for quote in universe["sh000001"].quotes], [1.0])
+        self.assertEqual([quote["price"] for quote in universe["sz000001"].quotes], [1.0])
+        self.assertEqual(universe["sh600000"].quotes, [])
+
+    def test_no_request_after_close(self):
+        universe = self.create_universe(["sh000001"], batch_size = 100)
+        loader = PriceDataLoader.price_data_loader_china = QuoteLoader()
+        with contextlib.redirect_stdout(io.StringIO()):
+            self.assertEqual(universe.update_realtime(datetime.datetime(2018, 3, 5, 16, 0, 0)), [])
+        self.assertEqual(loader.requests, [])
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,86 @@
+from PriceStore import PriceStore
+
+import numpy
+import pandas
+
+import os
+import shutil
+import tempfile
+import unittest
+
+class PriceStoreTest(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.store = PriceStore(os.path.join(self.directory, "sh000300_5min.store"))
+        dates = ["2018-03-01 09:35:00", "2018-03-01 09:40:00", "2018-03-01 09:45:00", "2018-03-01 09:50:00"]
+        self.data = pandas.DataFrame({"close": [1.0, 2.0, 3.0, 4.0], "volume": [10.0, 20.0, numpy.nan, 40.0], "code": "000300"},
+            index = pandas.Index(dates, name = "date"), columns = ["close", "volume", "code"])
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_read_as_strings_round_trips(self):
+        self.store.write(self.data)
+        pandas.testing.assert_frame_equal(self.store.read(dates_as_strings = True), self.data)
+
+    def test_read_gives_datetime_index(self):
+        self.store.write(self.data)
+        index = self.store.read().index
+        self.assertIsInstance(index, pandas.DatetimeIndex)
+        self.assertEqual(index[-1], pandas.Timestamp("2018-03-01 09:50:00"))
+
+    def test_daily_dates(self):
+        data = pandas.DataFrame({"close": [1.0, 2.0]}, index = pandas.Index(["2018-03-01", "2018-03-02"], name = "date"))
+        self.store.write(data)
+        self.assertEqual(list(self.store.read(dates_as_strings = True).index), ["2018-03-01", "2018-03-02"])
+        self.assertEqual(list(PriceStore.date_strings(self.store.read_dates())), ["2018-03-01", "2018-03-02"])
+
+    def test_continued_records_are_appended(self):
+        self.store.write(self.data.iloc[:2])
+        date_file = os.path.join(self.store.path, PriceStore.DATE_FILE)
+        inode = os.stat(date_file).st_ino
+        self.store.write(self.data)
+        self.assertEqual(os.stat(date_file).st_ino, inode)
+        self.assertEqual(len(self.store), 4)
+        pandas.testing.assert_frame_equal(PriceStore(self.store.path).read(dates_as_strings = True), self.data)
+
+    def test_restated_tail_rewrites(self):
+        self.store.write(self.data.iloc[:3])
+        restated = self.data.copy()
+        restated.iloc[2, 0] = 3.5
+        self.store.write(restated)
+        pandas.testing.assert_frame_equal(self.store.read(dates_as_strings = True), restated)
+
+    def test_restated_record_before_tail_is_saved(self):
+        self.store.write(self.data.iloc[:3])
+        date_file = os.path.join(self.store.path, PriceStore.DATE_FILE)
+        inode = os.stat(date_file).st_ino
+        restated = self.data.copy()
+        restated.iloc[1, 0] = 99.0
+        self.store.write(restated)
+        # Records from the restated one are appended again rather than rewriting the store.
+        self.assertEqual(os.stat(date_file).st_ino, inode)
+        pandas.testing.assert_frame_equal(PriceStore(self.store.path).read(dates_as_strings = True), restated)
+
+    def test_fewer_records_drop_stored_ones(self):
+        self.store.write(self.data)
+        self.store.write(self.data.iloc[:2])
+        pandas.testing.assert_frame_equal(PriceStore(self.store.path).read(dates_as_strings = True), self.data.iloc[:2])
+        self.store.write(self.data)
+        pandas.testing.assert_frame_equal(PriceStore(self.store.path).read(dates_as_strings = True), self.data)
+
+    def test_wider_text_rewrites(self):
+        self.store.write(self.data.iloc[:2])
+        wider = self.data.copy()
+        wider["code"] = ["000300", "000300", "x" * 40, "000300"]
+        self.store.write(wider)
+        pandas.testing.assert_frame_equal(self.store.read(dates_as_strings = True), wider)
+
+    def test_tail_reads(self):
+        self.store.write(self.data)
+        self.assertEqual(list(self.store.read_column("close", 2)), [3.0, 4.0])
+        self.assertEqual(self.store.read_dates(1)[0], numpy.datetime64("2018-03-01T09:50:00"))
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,190 @@
+from FakePriceDataLoader import FakePriceDataLoaderChina
+from PriceData import PriceData
+from SimpleMovingAverage import SimpleMovingAverage
+from SyntheticPriceData import SyntheticPriceData
+from TradingDateTime import trading_date_time
+
+import PriceDataLoader
+
+import numpy
+
+import contextlib
+import datetime
+import io
+import os
+import shutil
+import tempfile
+import unittest
+
+def setUpModule():
+    trading_date_time.setChinaTradingDates(SyntheticPriceData.trading_dates("2017-01-01", "2030-12-31"))
+
+class MovingAverageSeriesTest(unittest.TestCase):
+
+    def setUp(self):
+        self.data = SyntheticPriceData("2018-03-01", "2018-03-09").generate()["15min"]
+        self.sma = SimpleMovingAverage({"5": [("15min", 5)]})
+
+    def assertSeriesEqual(self, sma_series, expected):
+        self.assertEqual(list(sma_series.dates), list(expected.index))
+        numpy.testing.assert_allclose(sma_series.values, expected.to_numpy())
+
+    def test_all_counts_match_rolling_means(self):
+        series = self.sma.calculate_moving_averages("15min", [1, 5, 20], self.data)
+        for count in [1, 5, 20]:
+            self.assertSeriesEqual(series[count], self.data["close"].rolling(count).mean().dropna())
+
+    def test_extended_series_match_full_calculation(self):
+        head = self.data.iloc[:30]
+        series = self.sma.calculate_moving_averages("15min", [5, 20], head)
+        series = self.sma.calculate_moving_averages("15min", [5, 20, 40], self.data, series, head.index[-1])
+        for count in [5, 20, 40]:
+            self.assertSeriesEqual(series[count], self.data["close"].rolling(count).mean().dropna())
+
+    def test_series_start_after_last_hole(self):
+        data = self.data.drop(self.data.index[20])
+        with contextlib.redirect_stdout(io.StringIO()):
+            series = self.sma.calculate_moving_averages("15min", [5, 40], data)
+        self.assertSeriesEqual(series[5], data["close"].iloc[20:].rolling(5).mean().dropna())
+        self.assertEqual(len(series[40]), len(data.index) - 20 - 39)
+
+    def test_series_keep_retention_records(self):
+        sma = SimpleMovingAverage({"5": [("15min", 5)]}, retention = 10)
+        series = sma.calculate_moving_averages("15min", [5, 20], self.data.iloc[:50])
+        series = sma.calculate_moving_averages("15min", [5, 20], self.data, series, self.data.index[49])
+        for count in [5, 20]:
+            self.assertSeriesEqual(series[count], self.data["close"].rolling(count).mean().iloc[-10:])
+
+    def test_invalid_count_is_skipped(self):
+        with contextlib.redirect_stdout(io.StringIO()):
+            series = self.sma.calculate_moving_averages("15min", [0, 5], self.data)
+        self.assertEqual(len(series[0]), 0)
+        self.assertEqual(len(series[5]), len(self.data.index) - 4)
+
+class LazyMovingAverageTest(unittest.TestCase):
+
+    PARAMS = {"5": [("15min", 5), ("day", 5)], "10": [("15min", 5), ("15min", 10)]}
+
+    def setUp(self):
+        self.price_data = SyntheticPriceData("2018-03-01", "2018-03-09").generate()
+        self.head = dict((interval, data.iloc[:-3]) for interval, data in self.price_data.items())
+
+    def test_lines_are_calculated_on_request(self):
+        lazy = SimpleMovingAverage(LazyMovingAverageTest.PARAMS, lazy = True)
+        lazy.load_price_data(self.head)
+        eager = SimpleMovingAverage(LazyMovingAverageTest.PARAMS)
+        eager.load_price_data(self.head)
+        self.assertTrue(all(sma_series is None for lines in lazy.sma.values() for _, sma_series in lines))
+        self.assertEqual(lazy.current_values("15min"), eager.current_values("15min"))
+        _, sma_series = lazy.line("5", 0)
+        self.assertEqual(list(sma_series), list(eager.sma["5"][0][1]))
+        # Lines of the same interval and count share the series.
+        self.assertIs(lazy.sma["10"][0][1], sma_series)
+        self.assertIsNone(lazy.sma["10"][1][1])
+
+    def test_requested_lines_are_kept_up_to_date(self):
+        lazy = SimpleMovingAverage(LazyMovingAverageTest.PARAMS, lazy = True)
+        lazy.load_price_data(self.head)
+        lazy.line("5", 0)
+        lazy.price_data = self.price_data
+        lazy.append_price_records("15min", self.head["15min"].index[-1], self.price_data["15min"])
+        self.assertIsNone(lazy.sma["10"][1][1])
+        eager = SimpleMovingAverage(LazyMovingAverageTest.PARAMS)
+        eager.load_price_data(self.price_data)
+        for ma, index in [("5", 0), ("10", 1)]:
+            sma_series, expected = lazy.line(ma, index)[1], eager.sma[ma][index][1]
+            self.assertEqual(list(sma_series.dates), list(expected.dates))
+            numpy.testing.assert_allclose(sma_series.values, expected.values)
+
+class SimpleMovingAverageTest(unittest.TestCase):
+
+    PARAMS = {"5": [("5min", 5), ("5min", 20)]}
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.csv_base_name = os.path.join(self.directory, "synthetic")
+        self.previous_loader = PriceDataLoader.price_data_loader_china
+        SyntheticPriceData("2018-03-01", "2018-03-09").save(self.csv_base_name)
+        self.loader = FakePriceDataLoaderChina(datetime.datetime(2018, 3, 7, 10, 0, 0), self.csv_base_name)
+        PriceDataLoader.price_data_loader_china = self.loader
+        with contextlib.redirect_stdout(io.StringIO()):
+            self.price_data = PriceData("sh000300", self.csv_base_name, self.loader.now())
+            self.price_data.set_simple_moving_average(SimpleMovingAverage(SimpleMovingAverageTest.PARAMS))
+        # Never save over the synthetic data.
+        self.price_data.csv_base_name = None
+        self.sma = self.price_data.sma
+        self.data = self.price_data.price_data["5min"]
+        self.closes = self.data["close"].to_numpy()
+
+    def tearDown(self):
+        PriceDataLoader.price_data_loader_china = self.previous_loader
+        shutil.rmtree(self.directory)
+
+    """ Realtime data of the interval update_count closes after the last record, at price. """
+    def realtime_data(self, update_count, price):
+        this_ordinal = trading_date_time.intervalCloseOrdinal("5min", self.data.index[-1]) + update_count
+        realtime = {"this_close": trading_date_time.intervalCloseFromOrdinal("5min", this_ordinal), "last_price": price}
+        if update_count > 1:
+            realtime["prev_close_price"] = self.closes[-1] - 1.0
+        return realtime
+
+    """ Closes of the windows at the current close: the known closes with the current close at price. """
+    def current_closes(self, update_count, price):
+        if update_count == 0:
+            return numpy.append(self.closes[:-1], price)
+        if update_count == 1:
+            return numpy.append(self.closes, price)
+        return numpy.append(self.closes, [self.closes[-1] - 1.0, price])
+
+    def test_projection_to_current_close_is_realtime_average(self):
+        for update_count in (0, 1, 2):
+            realtime = self.realtime_data(update_count, self.closes[-1] + 5.0)
+            self.sma.update_realtime({"5min": realtime})
+            for count in (5, 20):
+                projected = self.sma.calculate_realtime_moving_average("5min", count, self.data, [], realtime, time_to_predict = realtime["this_close"])
+                self.assertIsNotNone(projected, "update_count %d" % update_count)
+                self.assertAlmostEqual(projected, self.sma.realtime_moving_average("5min", count))
+                current_close = self.closes[-1] if update_count == 0 else realtime["last_price"]
+                self.assertAlmostEqual(projected, self.current_closes(update_count, current_close)[-count:].mean())
+
+    def test_projection_to_later_close(self):
+        for update_count in (0, 1, 2):
+            realtime = self.realtime_data(update_count, self.closes[-1] + 5.0)
+            later = trading_date_time.intervalCloseFromOrdinal("5min", trading_date_time.intervalCloseOrdinal("5min", realtime["this_close"]) + 2)
+            dates, averages = self.sma.project_realtime_moving_averages("5min", [5], self.data, realtime, later, future_price = [1.0, 2.0])
+            self.assertEqual(dates[0], realtime["this_close"])
+            self.assertEqual(dates[-1], later)
+            current_close = self.closes[-1] if update_count == 0 else realtime["last_price"]
+            self.assertAlmostEqual(averages[-1, 0], numpy.append(self.current_closes(update_count, current_close), [1.0, 2.0])[-5:].mean())
+
+    def test_levels_follow_realtime_averages(self):
+        self.assertEqual(len(self.sma.levels), 2)
+        realtime = self.realtime_data(1, self.closes[-1] + 50.0)
+        self.sma.update_realtime({"5min": realtime})
+        values = self.sma.current_values("5min", realtime = True)
+        supports, resistances = self.sma.nearest_levels(realtime["last_price"])
+        self.assertEqual(sorted(supports), sorted((values[count], ("5min", count)) for count in (5, 20)))
+        self.assertEqual(resistances, [])
+
+    def test_crossing_prices_are_of_current_close(self):
+        for update_count in (0, 1, 2):
+            realtime = self.realtime_data(update_count, self.closes[-1])
+            crossing = self.sma.realtime_crossing_prices("5min", [5, 20], self.data, realtime)
+            for i, count in enumerate((5, 20)):
+                price = crossing[0, i]
+                self.assertAlmostEqual(self.current_closes(update_count, price)[-count:].mean(), price, msg = "update_count %d" % update_count)
+
+    def test_stale_realtime_data_projects_from_last_record(self):
+        # Realtime data of three closes before the last record.
+        realtime = self.realtime_data(-3, self.closes[-1] + 5.0)
+        self.sma.update_realtime({"5min": realtime})
+        dates, averages = self.sma.project_realtime_moving_averages("5min", [5, 20], self.data, realtime, self.data.index[-1])
+        self.assertEqual(list(dates), [self.data.index[-1]])
+        for i, count in enumerate((5, 20)):
+            self.assertAlmostEqual(averages[0, i], self.sma.realtime_moving_average("5min", count))
+            self.assertAlmostEqual(averages[0, i], self.closes[-count:].mean())
+        crossing = self.sma.realtime_crossing_prices("5min", [5], self.data, realtime)
+        self.assertAlmostEqual(self.current_closes(0, crossing[0, 0])[-5:].mean(), crossing[0, 0])
+
+if __name__ == "__main__":
+    unittest.main()
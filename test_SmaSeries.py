@@ -0,0 +1,54 @@
+from SmaSeries import SmaSeries
+
+import numpy
+
+import unittest
+
+class SmaSeriesTest(unittest.TestCase):
+
+    DATES = ["2018-03-05 09:35:00", "2018-03-05 09:40:00", "2018-03-05 09:45:00", "2018-03-05 09:50:00"]
+
+    def test_records_round_trip(self):
+        sma_series = SmaSeries(SmaSeriesTest.DATES[:2], [1.0, 2.0])
+        sma_series.append(SmaSeriesTest.DATES[2], 3.0)
+        self.assertEqual(list(sma_series), list(zip(SmaSeriesTest.DATES[:3], [1.0, 2.0, 3.0])))
+        self.assertEqual(sma_series[-1], (SmaSeriesTest.DATES[2], 3.0))
+        self.assertEqual(list(sma_series[1:].dates), SmaSeriesTest.DATES[1:3])
+        with self.assertRaises(IndexError):
+            sma_series[3]
+        daily = SmaSeries(["2018-03-05", "2018-03-06"], [1.0, 2.0])
+        self.assertEqual(daily.unit, "D")
+        self.assertEqual(daily[0], ("2018-03-05", 1.0))
+
+    def test_arrays_grow_and_are_read_only(self):
+        sma_series = SmaSeries()
+        dates = numpy.datetime_as_string(numpy.datetime64("2018-03-05T09:35:00") + numpy.arange(1000) * 300, unit = "s")
+        for i in range(0, 1000, 10):
+            sma_series.extend([date.replace("T", " ") for date in dates[i:i + 10]], numpy.arange(i, i + 10, dtype = numpy.float64))
+        self.assertEqual(len(sma_series), 1000)
+        numpy.testing.assert_array_equal(sma_series.values, numpy.arange(1000))
+        self.assertTrue((numpy.diff(sma_series.timestamps) == 300).all())
+        with self.assertRaises(ValueError):
+            sma_series.values[0] = 1.0
+
+    def test_retention_keeps_last_records(self):
+        sma_series = SmaSeries(retention = 3)
+        for i, date in enumerate(SmaSeriesTest.DATES):
+            sma_series.append(date, float(i))
+        self.assertEqual(list(sma_series.dates), SmaSeriesTest.DATES[1:])
+        sma_series.extend(SmaSeriesTest.DATES, [0.0, 1.0, 2.0, 3.0])
+        self.assertEqual(len(sma_series), 3)
+        self.assertEqual(sma_series[0], (SmaSeriesTest.DATES[1], 1.0))
+
+    def test_prepend_and_truncate(self):
+        sma_series = SmaSeries(SmaSeriesTest.DATES[2:], [3.0, 4.0])
+        sma_series.prepend(SmaSeriesTest.DATES[:2], [1.0, 2.0])
+        self.assertEqual(list(sma_series.values), [1.0, 2.0, 3.0, 4.0])
+        sma_series.truncate(SmaSeriesTest.DATES[1])
+        self.assertEqual(list(sma_series), list(zip(SmaSeriesTest.DATES[:2], [1.0, 2.0])))
+        retained = SmaSeries(SmaSeriesTest.DATES[2:], [3.0, 4.0], retention = 3)
+        retained.prepend(SmaSeriesTest.DATES[:2], [1.0, 2.0])
+        self.assertEqual(list(retained.values), [2.0, 3.0, 4.0])
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,52 @@
+from StreamingSma import StreamingSma
+from SyntheticPriceData import SyntheticPriceData
+from TradingDateTime import trading_date_time
+
+import contextlib
+import io
+import unittest
+
+def setUpModule():
+    trading_date_time.setChinaTradingDates(SyntheticPriceData.trading_dates("2017-01-01", "2030-12-31"))
+
+class StreamingSmaTest(unittest.TestCase):
+
+    def setUp(self):
+        self.data = SyntheticPriceData("2018-03-01", "2018-03-09").generate()["15min"]
+        self.dates = self.data.index.to_numpy(dtype = object)
+        self.closes = self.data["close"].to_numpy()
+
+    def test_push_matches_batch_averages(self):
+        streaming = StreamingSma("15min", [5, 20])
+        streaming.load(self.dates[:30], self.closes[:30])
+        for date, close in zip(self.dates[30:], self.closes[30:]):
+            streaming.push(date, close)
+        for count in [5, 20]:
+            self.assertAlmostEqual(streaming.moving_average(count), self.closes[-count:].mean())
+
+    def test_hole_restarts_window(self):
+        streaming = StreamingSma("15min", [5])
+        streaming.load(self.dates[:10], self.closes[:10])
+        with contextlib.redirect_stdout(io.StringIO()):
+            streaming.push(self.dates[12], self.closes[12])
+        self.assertEqual(streaming.size, 1)
+        self.assertIsNone(streaming.moving_average(5))
+
+    def test_realtime_uses_previous_close_price(self):
+        streaming = StreamingSma("15min", [5])
+        streaming.load(self.dates[:10], self.closes[:10])
+        realtime = streaming.update_realtime({"this_close": self.dates[11], "last_price": 3100.0, "prev_close_price": 3000.0})
+        self.assertAlmostEqual(realtime[5], (self.closes[7:10].sum() + 3000.0 + 3100.0) / 5)
+
+    def test_missing_data_is_reported_once_per_gap(self):
+        streaming = StreamingSma("15min", [5])
+        streaming.load(self.dates[:10], self.closes[:10])
+        output = io.StringIO()
+        with contextlib.redirect_stdout(output):
+            for price in [3000.0, 3001.0, 3002.0]:
+                streaming.update_realtime({"this_close": self.dates[13], "last_price": price, "prev_close_price": 2999.0})
+        self.assertEqual(output.getvalue().count("Missing data"), 1)
+        self.assertEqual(streaming.realtime_sma, {})
+
+if __name__ == "__main__":
+    unittest.main()
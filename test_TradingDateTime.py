@@ -0,0 +1,136 @@
+from SyntheticPriceData import SyntheticPriceData
+from TradingDateTime import TradingDateTime, trading_date_time
+
+import TradingDateTime as trading_date_time_module
+
+import numpy
+import pandas
+
+import contextlib
+import datetime
+import io
+import os
+import shutil
+import tempfile
+import unittest
+
+def setUpModule():
+    trading_date_time.setChinaTradingDates(SyntheticPriceData.trading_dates("2017-01-01", "2030-12-31"))
+
+class TradingDateTimeTest(unittest.TestCase):
+
+    def test_interval_close_of_datetime(self):
+        self.assertEqual(trading_date_time.intervalCloseOfDatetime("5min", "2018-03-05 09:25:00"), "2018-03-05 09:35:00")
+        self.assertEqual(trading_date_time.intervalCloseOfDatetime("5min", "2018-03-05 10:00:00"), "2018-03-05 10:00:00")
+        self.assertEqual(trading_date_time.intervalCloseOfDatetime("5min", "2018-03-05 10:00:01"), "2018-03-05 10:05:00")
+        self.assertEqual(trading_date_time.intervalCloseOfDatetime("60min", "2018-03-05 11:20:00"), "2018-03-05 11:30:00")
+        self.assertEqual(trading_date_time.intervalCloseOfDatetime("30min", "2018-03-05 12:10:00"), "2018-03-05 11:30:00")
+        self.assertEqual(trading_date_time.intervalCloseOfDatetime("day", "2018-03-05 10:00:00"), "2018-03-05")
+
+    def test_interval_close_of_datetime_matches_datetime_arithmetic(self):
+        for minute_interval in TradingDateTime.GRID_MINUTE_INTERVALS:
+            for minute in range(9 * 60, 15 * 60 + 1, 7):
+                now = datetime.datetime(2018, 3, 5, minute // 60, minute % 60, 30)
+                expected = trading_date_time.closeTimeOfCurrentMinuteIntervalChina(minute_interval, now, check_opening = False)
+                self.assertEqual(trading_date_time.intervalCloseOfDatetime("%dmin" % minute_interval, now.strftime(TradingDateTime.DATETIME_STRFTIME)),
+                    expected.strftime(TradingDateTime.DATETIME_STRFTIME))
+
+    def test_ordinals_are_dense_across_lunch_and_days(self):
+        self.assertEqual(trading_date_time.barsPerDay("5min"), 48)
+        self.assertEqual(trading_date_time.barsPerDay("day"), 1)
+        for interval, first, second in [
+                ("5min", "2018-03-05 11:30:00", "2018-03-05 13:05:00"),
+                ("5min", "2018-03-02 15:00:00", "2018-03-05 09:35:00"),
+                ("60min", "2018-03-05 11:30:00", "2018-03-05 14:00:00"),
+                ("day", "2018-03-02", "2018-03-05")]:
+            ordinal = trading_date_time.intervalCloseOrdinal(interval, first)
+            self.assertEqual(trading_date_time.intervalCloseOrdinal(interval, second), ordinal + 1)
+            self.assertEqual(trading_date_time.intervalCloseFromOrdinal(interval, ordinal), first)
+            self.assertEqual(trading_date_time.nextIntervalClose(interval, first), second)
+            self.assertEqual(trading_date_time.previousIntervalClose(interval, second), first)
+
+    def test_off_grid_datetimes_have_no_ordinal(self):
+        for interval, datetime_str in [("5min", "2018-03-05 10:02:00"), ("5min", "2018-03-04 10:00:00"), ("30min", "2018-03-05 09:35:00"), ("day", "2018-03-04")]:
+            self.assertIsNone(trading_date_time.intervalCloseOrdinal(interval, datetime_str))
+        self.assertIsNone(trading_date_time.intervalCloseFromOrdinal("5min", -1))
+
+    def test_vectorized_ordinals_match_scalar_ordinals(self):
+        dates = trading_date_time.intervalClosesFromOrdinals("15min", numpy.arange(1000, 1100))
+        dates = numpy.asarray(list(dates) + ["2018-03-05 10:02:00", "2018-03-04 10:00:00"], dtype = object)
+        ordinals = trading_date_time.intervalCloseOrdinals("15min", dates)
+        self.assertEqual(list(ordinals[:100]), list(range(1000, 1100)))
+        self.assertEqual(list(ordinals[100:]), [-1, -1])
+        self.assertEqual([trading_date_time.intervalCloseOrdinal("15min", date) for date in dates[:100]], list(range(1000, 1100)))
+
+    def test_few_ordinals_match_vectorized_ordinals(self):
+        for interval, dates in [
+                ("5min", ["2018-03-05 09:35:00", "2018-03-05 11:30:00", "2018-03-05 13:05:00", "2018-03-05 10:02:00", "2018-03-04 10:00:00"]),
+                ("day", ["2018-03-05", "2018-03-06", "2018-03-04", "2018-03-05 15:00:00"])]:
+            padded = dates * (TradingDateTime.SCALAR_ORDINALS_SIZE // len(dates) + 1)
+            vectorized = trading_date_time.intervalCloseOrdinals(interval, numpy.asarray(padded, dtype = object))[:len(dates)]
+            few = trading_date_time.intervalCloseOrdinals(interval, numpy.asarray(dates, dtype = object))
+            self.assertEqual(few.dtype, numpy.int64)
+            self.assertEqual(list(few), list(vectorized))
+            self.assertEqual(few[-1], -1)
+
+class FakeTushare(object):
+    """ trade_cal of the data source, which fails without dates. """
+
+    def __init__(self, dates = None):
+        self.dates = dates
+        self.calls = 0
+
+    def trade_cal(self):
+        self.calls += 1
+        if self.dates is None:
+            raise Exception("no network")
+        return pandas.DataFrame({"calendarDate": self.dates, "isOpen": [1] * len(self.dates)})
+
+class TradingDatesSnapshotTest(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.path = os.path.join(self.directory, "china_trading_dates.csv")
+        self.import_tushare = trading_date_time_module.import_tushare
+
+    def tearDown(self):
+        trading_date_time_module.import_tushare = self.import_tushare
+        shutil.rmtree(self.directory)
+
+    def use_tushare(self, dates = None):
+        tushare = FakeTushare(dates)
+        trading_date_time_module.import_tushare = lambda: tushare
+        return tushare
+
+    def test_snapshot_covering_today_is_used_without_download(self):
+        dates = SyntheticPriceData.trading_dates("2017-01-01", "2099-12-31")
+        TradingDateTime(self.path).saveTradingDatesSnapshot(dates)
+        tushare = self.use_tushare()
+        self.assertEqual(list(TradingDateTime(self.path).getChinaTradingDates()), dates)
+        self.assertEqual(tushare.calls, 0)
+
+    def test_passed_snapshot_is_downloaded_again(self):
+        TradingDateTime(self.path).saveTradingDatesSnapshot(SyntheticPriceData.trading_dates("2017-01-01", "2017-12-31"))
+        dates = SyntheticPriceData.trading_dates("2017-01-01", "2099-12-31")
+        tushare = self.use_tushare(dates)
+        calendar = TradingDateTime(self.path)
+        self.assertEqual(list(calendar.getChinaTradingDates()), dates)
+        self.assertEqual(list(TradingDateTime(self.path).loadTradingDatesSnapshot()), dates)
+        # Checked at most once per CALENDAR_CHECK_INTERVAL.
+        calendar.getChinaTradingDates()
+        self.assertEqual(tushare.calls, 1)
+        self.assertFalse(os.path.exists(self.path + ".tmp"))
+
+    def test_failed_download_keeps_snapshot_dates(self):
+        dates = SyntheticPriceData.trading_dates("2017-01-01", "2017-12-31")
+        TradingDateTime(self.path).saveTradingDatesSnapshot(dates)
+        tushare = self.use_tushare()
+        calendar = TradingDateTime(self.path)
+        with contextlib.redirect_stdout(io.StringIO()):
+            self.assertEqual(list(calendar.getChinaTradingDates()), dates)
+        self.assertEqual(tushare.calls, 1)
+        with self.assertRaises(Exception):
+            TradingDateTime(None).getChinaTradingDates()
+
+if __name__ == "__main__":
+    unittest.main()